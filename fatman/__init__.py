@@ -43,7 +43,9 @@ migrate = Migrate(app, db)
 ma = Marshmallow(app)
 
 resultfiles = UploadSet('results', extensions=ALL_EXTENSIONS)
-configure_uploads(app, (resultfiles,))
+# cold storage for artifacts of superseded tasks, see tasks.tier_superseded_artifacts
+coldfiles = UploadSet('cold', extensions=ALL_EXTENSIONS)
+configure_uploads(app, (resultfiles, coldfiles))
 
 # initialize Flask-Caching
 cache = Cache(app)
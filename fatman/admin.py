@@ -105,6 +105,16 @@ class StructureView(BaseDataView):
     column_list = ('id', 'name')
     column_searchable_list = ('name',)
     column_filters = ('name',)
+    # derived from the ase_structure, see Structure.update_descriptors
+    form_excluded_columns = (
+        'chemical_formula',
+        'natoms',
+        'elements',
+        'volume',
+        'pbc',
+        'net_initial_charge',
+        'initial_magnetic_moment',
+        )
 
 
 class StructureSetStructureView(BaseDataView):
@@ -34,7 +34,7 @@ from .models import (
 )
 
 from .utils import route_from
-from .tools import json2atoms, atoms2json
+from .tools import atoms2json
 from .tools.deltatest import calcDelta, eos
 from .tasks import (postprocess_result_file,
                     postprocess_result_files,
@@ -860,9 +860,11 @@ class Plot(Resource):
             E = []
             V = []
             for x in q:
-                atoms = json2atoms(x.task.structure.ase_structure)
-                natom = len(atoms.get_masses())
-                V.append(atoms.get_volume()/natom)
+                if x.task.structure.volume is None:  # without a cell, not a point of the E(V) curve
+                    continue
+
+                natom = x.task.structure.natoms
+                V.append(x.task.structure.volume/natom)
                 E.append(x.data['total_energy']/natom)
             x2 = np.array(V)
             y2 = np.array(E)
@@ -919,7 +921,7 @@ class StructureResource(Resource):
         else:
             raise ParameterError("exactly one of id or test parameter is required")
 
-        atoms = json2atoms(s.ase_structure)
+        atoms = s.get_atoms()
 
         if args['viewer']:
             from ase.io import cif
@@ -1,12 +1,15 @@
 
-import bz2
-from urllib.parse import urlsplit
-from os.path import basename
-from io import BytesIO, StringIO
+import os
+from os.path import basename, relpath
+import base64
+import json
+import uuid
+from io import BytesIO, StringIO, BufferedReader, SEEK_END
 import copy
 import collections
 import itertools
 import codecs
+import tarfile
 
 import flask
 from flask import make_response, request, url_for, Response
@@ -18,12 +21,13 @@ from webargs.flaskparser import (
     abort,
     )
 from werkzeug.exceptions import HTTPException
-from sqlalchemy import and_, or_, cast, distinct, literal
-from sqlalchemy.orm import contains_eager, joinedload, aliased
+from sqlalchemy.exc import OperationalError
+from sqlalchemy import and_, or_, cast, distinct, literal, select, func, tuple_, String
+from sqlalchemy.orm import contains_eager, joinedload, selectinload, aliased, load_only
 from sqlalchemy.orm.attributes import flag_modified
-from sqlalchemy.dialects.postgresql import JSONB, array
+from sqlalchemy.dialects.postgresql import JSONB, ARRAY, array, aggregate_order_by
 
-from ase import io as ase_io, data as ase_data
+from ase import io as ase_io
 import numpy as np
 
 from . import app, db, resultfiles, apiauth, capp, calculation_finished
@@ -33,6 +37,7 @@ from .models import (
     CalculationDefaultSettings,
     Structure,
     StructureSet,
+    StructureSetStructure,
     BasisSet,
     BasisSetFamily,
     CalculationBasisSet,
@@ -49,18 +54,31 @@ from .models import (
     Command,
     TestResult2,
     TestResult2Collection,
+    TestResult2Calculation,
+    UploadSession,
+    current_output_artifacts,
+    results_folder,
+    artifact_path,
+    upload_compression,
+    add_output_artifact,
     )
-from .tools import json2atoms, atoms2json, mergedicts
+from .tools import atoms2json, mergedicts
 from .tools.generators import generate_CP2K_inputs
 from .tools.slurm import generate_slurm_batch_script
 from .tools.webargs import nested_parser
 from .tools.deltatest import calcDelta, ATOMIC_ELEMENTS
+from .tools.compression import CODECS, CompressingReader, read_range
+from .tools.structures import bounding_box_cell, read_frames
+from .tools.tarstream import generate_tar, tar_size
 
 from .tasks import (
     generate_calculation_results,
     generate_all_calculation_results,
     generate_test_result,
     generate_all_test_results,
+    generate_artifact_index,
+    collect_artifact_garbage,
+    commit_upload_session,
     )
 
 from .schemas import (
@@ -85,6 +103,7 @@ from .schemas import (
     CodeSchema,
     DeltatestComparisonSchema,
     TestListSchema,
+    UploadSessionSchema,
 
     BoolValuedDict,
     )
@@ -97,6 +116,9 @@ DEFAULT_HIDE_TAGS = [
     'superseded',
     ]
 
+# chunk size when streaming decompressed artifacts
+ARTIFACT_CHUNK_SIZE = 1024*1024
+
 
 # dict of possible calculation task state transitions:
 TASK_STATES = {
@@ -136,37 +158,114 @@ class ArtifactDownloadResource(Resource):
     def __init__(self, mode='download'):
         self._content_dispo = 'attachment' if mode == 'download' else 'inline'
 
-    def get(self, aid):
+    @use_kwargs({'raw': fields.Boolean(missing=False)}, location='querystring')
+    def get(self, aid, raw):
         artifact = Artifact.query.get_or_404(aid)
 
-        scheme, nwloc, path, _, _ = urlsplit(artifact.path)
-
-        if scheme == 'fkup' and nwloc == 'results':
-            # Artifact.name contains a full path, including possible subdirs
-            filename = basename(artifact.name)
-
-            compressed = artifact.mdata.get('compressed', None)
-            if compressed == 'bz2':
-                with bz2.BZ2File(resultfiles.path(path[1:])) as infile:
-                    response = make_response(infile.read())
-                    response.headers["Content-Disposition"] = "{}; filename={}".format(
-                        self._content_dispo, filename)
-                    response.headers["Content-Type"] = "text/plain"
-                    return response
-
-            elif compressed is None:
-                with open(resultfiles.path(path[1:]), 'rb') as infile:
-                    response = make_response(infile.read())
-                    response.headers["Content-Disposition"] = "{}; filename={}".format(self._content_dispo, filename)
-                    response.headers["Content-Type"] = "text/plain"
-                    return response
+        # Artifact.name contains a full path, including possible subdirs
+        filename = basename(artifact.name)
+        compressed = artifact.mdata.get('compressed', None)
+
+        try:
+            if compressed is None and not artifact.inline:
+                response = self._send_file(artifact)
+            elif raw and compressed in CODECS:
+                # the stored data as a compressed file, for clients explicitly asking for it
+                response = self._send_file(artifact)
+                response.mimetype = 'application/octet-stream'
+                filename += CODECS[compressed].extensions[0]
+            elif request.range is None and compressed in CODECS and self._accepts_encoding(
+                    CODECS[compressed].content_encoding):
+                # pass the stored data through, leaving the decompression to the client
+                response = self._send_file(artifact)
+                response.headers['Content-Encoding'] = CODECS[compressed].content_encoding
             else:
-                app.logger.error("unknown compression scheme found: %s", compressed)
-                abort(500)
+                response = self._stream(artifact)
+        except RuntimeError as exc:
+            app.logger.error("%s can not be opened: %s", artifact, exc)
+            abort(500)
+
+        if compressed is not None:
+            response.vary.add('Accept-Encoding')
+
+        response.headers["Content-Disposition"] = "{}; filename={}".format(self._content_dispo, filename)
+        return response
+
+    @staticmethod
+    def _accepts_encoding(encoding):
+        """Whether the client explicitly accepts the given content encoding (wildcards are not considered)"""
+
+        return encoding is not None and any(
+            value == encoding and quality > 0 for value, quality in request.accept_encodings)
+
+    @staticmethod
+    def _send_file(artifact):
+        """Hand the stored files off to the web server or let the WSGI server send them"""
+
+        if artifact.inline:
+            # small enough to be sent in one go, without byte ranges
+            return Response(artifact.content, mimetype='text/plain')
+
+        filepath = artifact.filepath
+        location = app.config['ARTIFACT_ACCEL_REDIRECT_LOCATION']
+        relfilepath = relpath(filepath, resultfiles.config.destination)
+
+        # the location serves only the results, not the cold storage
+        if location and not relfilepath.startswith(os.pardir):
+            response = Response(mimetype='text/plain')
+            response.headers['X-Accel-Redirect'] = "{}/{}".format(location.rstrip('/'), relfilepath)
+            return response
+
+        # uses X-Sendfile if USE_X_SENDFILE is set, the file wrapper of the WSGI server (sendfile) otherwise,
+        # and supports byte ranges
+        return flask.send_file(filepath, mimetype='text/plain', conditional=True)
+
+    @staticmethod
+    def _stream(artifact):
+        """
+        Stream the decompressed content in chunks.
+
+        Supports a single byte range (also suffix ranges) if the decompressed size is known
+        from the index or the metadata, a complete response is sent otherwise. Without an index
+        the content up to the start of the range is decompressed and discarded.
+        """
+
+        size = artifact.content_size()
+
+        start, stop = 0, size
+        byte_range = request.range
+
+        if (byte_range is not None and size is not None
+                and byte_range.units == 'bytes' and len(byte_range.ranges) == 1):
+            byte_range = byte_range.range_for_length(size)
+
+            if byte_range is None:
+                response = Response(status=416)
+                response.headers['Content-Range'] = "bytes */{}".format(size)
+                return response
+
+            start, stop = byte_range
+        else:
+            byte_range = None
+
+        infile = artifact.open(workers=app.config['ARTIFACT_DECOMPRESSION_WORKERS'])
 
-        app.logger.warning("{} contains unknown path '{path}'".format(
-            artifact, **artifact.__dict__))
-        abort(500)
+        def generate():
+            # closes the file also when the client disconnects
+            with infile:
+                yield from read_range(infile, start, stop, ARTIFACT_CHUNK_SIZE)
+
+        response = Response(generate(), mimetype='text/plain')
+
+        if size is not None:
+            response.headers['Accept-Ranges'] = 'bytes'
+            response.content_length = stop - start
+
+        if byte_range is not None:
+            response.status_code = 206
+            response.headers['Content-Range'] = "bytes {}-{}/{}".format(start, stop - 1, size)
+
+        return response
 
 
 class BasisSetListResource(Resource):
@@ -237,6 +336,84 @@ class Pseudopotential2Resource(Resource):
         return schema.jsonify((Pseudopotential.query.get_or_404(pid)))
 
 
+def filter_calculations(calcs, filter_args):
+    """
+    Apply the filters of the calculation list to a query on calculations,
+    which must be joined with their latest task (as Task2) already.
+    """
+
+    if filter_args['collection']:
+        calcs = calcs.join(Calculation.collection).filter(CalculationCollection.name == filter_args['collection'])
+
+    if filter_args['test']:
+        calcs = calcs.join(Calculation.test).filter(Test.name == filter_args['test'])
+
+    if filter_args['structure']:
+        calcs = calcs.join(Calculation.structure).filter(Structure.name.contains(filter_args['structure']))
+
+    if filter_args['code']:
+        calcs = calcs.join(Calculation.code).filter(Code.name == filter_args['code'])
+
+    if filter_args['status']:
+        calcs = calcs.join(Task2.status).filter(TaskStatus.name == filter_args['status'])
+
+    if filter_args['basis_set_family']:
+        calcs = (calcs
+                 .join(Calculation.basis_sets)
+                 .join(BasisSetFamily)
+                 .filter(BasisSetFamily.name == filter_args['basis_set_family']))
+
+    if filter_args['hide_tags']:
+        calcs = calcs.filter(~and_(
+            Calculation.mdata.has_key('tags'),
+            Calculation.mdata['tags'].has_any(array(filter_args['hide_tags']))))
+
+    return calcs
+
+
+def delete_calculations(calc_ids):
+    """
+    Delete the calculations selected by the given query on Calculation.id using
+    set-based statements, together with their tasks (via the database cascades).
+
+    Aborts with a 409 if any of them is part of a test result or its current task
+    has not ended. The artifacts left behind get removed by collect_artifact_garbage.
+
+    Returns:
+        the number of deleted calculations
+    """
+
+    # selecting from the subquery keeps the calculation table in it from being correlated in the DELETE
+    selected = select([calc_ids.subquery().c.id])
+
+    with_testresults = [cid for cid, in (db.session.query(distinct(TestResult2Calculation.c.calculation_id))
+                                         .filter(TestResult2Calculation.c.calculation_id.in_(selected))
+                                         .limit(10))]
+
+    if with_testresults:
+        abort(409, message="calculations are part of test results, e.g. {}".format(
+            ", ".join(str(cid) for cid in with_testresults)))
+
+    # the current task is the latest one, see CalculationListResource.get
+    t2 = aliased(Task2)
+    running = [cid for cid, in (db.session.query(Calculation.id)
+                                .join(Task2)
+                                .outerjoin(t2, and_(Calculation.id == t2.calculation_id, Task2.ctime < t2.ctime))
+                                .filter(t2.id == None)
+                                .join(Task2.status)
+                                .filter(~TaskStatus.name.in_(END_TASK_STATES))
+                                .filter(Calculation.id.in_(selected))
+                                .limit(10))]
+
+    if running:
+        abort(409, message="the current task of calculations has not ended yet, e.g. {}".format(
+            ", ".join(str(cid) for cid in running)))
+
+    return (Calculation.query
+            .filter(Calculation.id.in_(selected))
+            .delete(synchronize_session=False))
+
+
 class CalculationCollectionListResource(Resource):
     def get(self):
         schema = CalculationCollectionSchema(many=True)
@@ -259,6 +436,23 @@ class CalculationCollectionResource(Resource):
         schema = CalculationCollectionSchema()
         return schema.jsonify((CalculationCollection.query.get_or_404(ccid)))
 
+    @apiauth.login_required
+    def delete(self, ccid):
+        coll = CalculationCollection.query.get_or_404(ccid)
+
+        if TestResult2Collection.query.filter_by(autogenerated_for_id=coll.id).count():
+            abort(409, message="test result collections have been generated for this collection")
+
+        delete_calculations(db.session.query(Calculation.id).filter(Calculation.collection_id == coll.id))
+        db.session.delete(coll)
+        db.session.commit()
+
+        # remove the artifacts of the deleted tasks in the background
+        async_result = collect_artifact_garbage.delay(scan=False)
+
+        return Response(status=202, headers={
+            'Location': api.url_for(ActionResource, aid=async_result.id, _external=True)})
+
 
 class CalculationListResource(Resource):
     calculation_list_args = {
@@ -296,31 +490,7 @@ class CalculationListResource(Resource):
                  .outerjoin(t2, and_(Calculation.id == t2.calculation_id, Task2.ctime < t2.ctime))
                  .filter(t2.id == None))
 
-        if filter_args['collection']:
-            calcs = calcs.join(Calculation.collection).filter(CalculationCollection.name == filter_args['collection'])
-
-        if filter_args['test']:
-            calcs = calcs.join(Calculation.test).filter(Test.name == filter_args['test'])
-
-        if filter_args['structure']:
-            calcs = calcs.join(Calculation.structure).filter(Structure.name.contains(filter_args['structure']))
-
-        if filter_args['code']:
-            calcs = calcs.join(Calculation.code).filter(Code.name == filter_args['code'])
-
-        if filter_args['status']:
-            calcs = calcs.join(Task2.status).filter(TaskStatus.name == filter_args['status'])
-
-        if filter_args['basis_set_family']:
-            calcs = (calcs
-                     .join(Calculation.basis_sets)
-                     .join(BasisSetFamily)
-                     .filter(BasisSetFamily.name == filter_args['basis_set_family']))
-
-        if filter_args['hide_tags']:
-            calcs = calcs.filter(~and_(
-                Calculation.mdata.has_key('tags'),
-                Calculation.mdata['tags'].has_any(array(filter_args['hide_tags']))))
+        calcs = filter_calculations(calcs, filter_args)
 
         # can't use Flask-Marshmallow's paginate() here since it will cause a refetch for the complete set
         calc_total_count = calcs.count()
@@ -353,6 +523,31 @@ class CalculationListResource(Resource):
 
         return response
 
+    @apiauth.login_required
+    @use_kwargs({k: v for k, v in calculation_list_args.items() if k not in ('page', 'per_page')},
+                location='querystring')
+    def delete(self, **filter_args):
+        # refuse to delete everything by accident, hiding tags is not a selection
+        if not any(v for k, v in filter_args.items() if k != 'hide_tags'):
+            abort(400, message="at least one filter must be specified")
+
+        t2 = aliased(Task2)
+        calc_ids = (db.session.query(Calculation.id)
+                    .join(Task2)
+                    .outerjoin(t2, and_(Calculation.id == t2.calculation_id, Task2.ctime < t2.ctime))
+                    .filter(t2.id == None))
+
+        count = delete_calculations(filter_calculations(calc_ids, filter_args))
+        db.session.commit()
+
+        # remove the artifacts of the deleted tasks in the background
+        async_result = collect_artifact_garbage.delay(scan=False)
+
+        return Response(status=202, headers={
+            'Location': api.url_for(ActionResource, aid=async_result.id, _external=True),
+            'X-total-count': count,
+            })
+
     calculation_args = {
         'collection': fields.Str(
             required=True,
@@ -404,8 +599,7 @@ class CalculationListResource(Resource):
         structure = (Structure.query
                      .filter(Structure.name == structure, Structure.replaced_by_id == None)
                      .one())
-        atoms = json2atoms(structure.ase_structure)
-        kinds = set(atoms.get_chemical_symbols())
+        kinds = set(structure.elements)
 
         pseudos = (PseudopotentialFamily.query
                    .filter_by(name=pseudo_family)
@@ -537,7 +731,8 @@ class CalculationListActionResource(Resource):
     @use_kwargs(CalculationListActionSchema)
     def post(self, generateResults):
         if generateResults:
-            async_result = generate_all_calculation_results.delay(generateResults['update'])
+            async_result = generate_all_calculation_results.delay(
+                generateResults['update'], incremental=generateResults['incremental'])
 
             return Response(status=202, headers={
                 'Location': api.url_for(ActionResource, aid=async_result.id, _external=True)})
@@ -550,7 +745,8 @@ class CalculationActionResource(Resource):
     @use_kwargs(CalculationListActionSchema)
     def post(self, cid, generateResults):
         if generateResults:
-            async_result = generate_calculation_results.delay(cid, generateResults['update'])
+            async_result = generate_calculation_results.delay(
+                cid, generateResults['update'], generateResults['incremental'])
 
             return Response(status=202, headers={
                 'Location': api.url_for(ActionResource, aid=async_result.id, _external=True)})
@@ -581,7 +777,7 @@ class CalculationPreviewResource(Resource):
                 calc.settings['input'],
                 bsets,
                 [(p.id, p.element, p.family.name, p.core_electrons, p.pseudo) for p in calc.pseudos],
-                json2atoms(calc.structure.ase_structure),
+                calc.structure.get_atoms(),
                 "AUTOGENERATED by FATMAN for preview",
                 )
         else:
@@ -836,9 +1032,6 @@ class Task2Resource(Resource):
                        .one())
 
             artifacts = {}
-            # we put all files in one task-subfolder
-            # to avoid hitting a max-file-per-dir limit
-            basepath = "fkup://results/{t.id}/".format(t=task)
 
             if calc.code.name == 'CP2K':
                 bsets = []
@@ -854,13 +1047,13 @@ class Task2Resource(Resource):
                     task.calculation.settings['input'],
                     bsets,
                     [(p.id, p.element, p.family.name, p.core_electrons, p.pseudo) for p in calc.pseudos],
-                    json2atoms(calc.structure.ase_structure),
+                    calc.structure.get_atoms(),
                     "AUTOGENERATED by FATMAN for Task {t.id}".format(t=task),
                     task_rt_settings.get('input', {})
                     )
 
                 for name, bytebuf in inputs.items():
-                    artifacts[name] = Artifact(name=name, path=basepath+"{id}")
+                    artifacts[name] = Artifact(name=name, path=artifact_path(task, len(bytebuf.getbuffer())))
                     artifacts[name].save(bytebuf)
 
             else:
@@ -923,8 +1116,6 @@ class Task2Resource(Resource):
             # A client could in principal generate this file instead based on the exported data,
             # but we decided to do it on the server for archival purposes.
             if runner == "slurm":
-                artifacts['runner.slurm'] = Artifact(name="run.sh", path=basepath+"{id}")
-
                 bytebuf = BytesIO()
                 generate_slurm_batch_script(
                     name=task.settings['name'],
@@ -934,6 +1125,7 @@ class Task2Resource(Resource):
                     srun_args=task.settings['machine'].get('runner_args', {}).get('srun'),
                     output=bytebuf)
                 bytebuf.seek(0)
+                artifacts['runner.slurm'] = Artifact(name="run.sh", path=artifact_path(task, len(bytebuf.getbuffer())))
                 artifacts['runner.slurm'].save(bytebuf)
 
             elif task.settings['machine']['runner'] == "direct":
@@ -977,6 +1169,7 @@ class Task2Resource(Resource):
 class Task2UploadResource(Resource):
     upload_args = {
         'name': fields.Str(required=True),
+        'compressed': fields.Str(missing=None, validate=lambda c: c in CODECS),
         }
     file_args = {
         'data': fields.Field(required=True)
@@ -985,44 +1178,322 @@ class Task2UploadResource(Resource):
     @apiauth.login_required
     @use_kwargs(upload_args)
     @use_kwargs(file_args, location='files')
-    def post(self, tid, name, data):
+    def post(self, tid, name, compressed, data):
         task = (Task2.query
                 .options(joinedload('calculation'))
                 .get_or_404(tid))
 
-        basepath = "fkup://results/{t.id}/".format(t=task)
-        artifact = Artifact(name=name, path=basepath+"{id}")
-        artifact.save(data)
+        # uploaded files are spooled by werkzeug, the size can be determined without reading them
+        stream = data.stream
+        pos = stream.tell()
+        size = stream.seek(0, SEEK_END)
+        stream.seek(pos)
+
+        if compressed is None:
+            compressed = upload_compression(name, size)
+
+            if compressed is not None:
+                # compress while storing the upload, without reading it completely into memory
+                data = BufferedReader(CompressingReader(stream, compressed))
 
-        db.session.add(Task2Artifact(artifact=artifact, task=task,
-                                     linktype="output"))
+        artifact = add_output_artifact(task, name, compressed, data, size)
         db.session.commit()
 
+        if compressed == 'bz2':
+            # index the blocks once to get random access for all future reads
+            generate_artifact_index.delay(artifact.id)
+
         schema = ArtifactSchema()
         return schema.jsonify(artifact)
 
 
+def tar_response(members, filename, size=None):
+    """Stream a tar archive generated on the fly from the given members, with one member open at a time"""
+
+    response = Response(flask.stream_with_context(generate_tar(members, ARTIFACT_CHUNK_SIZE)),
+                        mimetype='application/x-tar')
+    response.content_length = size
+    response.headers["Content-Disposition"] = "attachment; filename={}".format(filename)
+    return response
+
+
+class Task2InputsTarResource(Resource):
+    def get(self, tid):
+        task = (Task2.query
+                .options(selectinload('infiles'))
+                .get_or_404(tid))
+
+        workers = app.config['ARTIFACT_DECOMPRESSION_WORKERS']
+
+        try:
+            members = [a.tar_member(mtime=int(task.ctime.timestamp()), workers=workers)
+                       for a in sorted(task.infiles, key=lambda a: a.name)]
+        except RuntimeError as exc:
+            app.logger.error("input artifacts of %s can not be opened: %s", task, exc)
+            abort(500)
+
+        # without a Content-Length if the size of an input is not known without decompressing it
+        return tar_response(members, "fatman.{}.inputs.tar".format(task.id), tar_size(members))
+
+
+def collection_output_members(collection_id, names=None):
+    """
+    Generate the tar members for the current output artifacts of a collection, named <calculation id>/<name>.
+    Artifacts which can not be opened are skipped.
+    """
+
+    workers = app.config['ARTIFACT_DECOMPRESSION_WORKERS']
+
+    for calc_id, artifact in current_output_artifacts(collection_id, names):
+        try:
+            yield artifact.tar_member("{}/{}".format(calc_id, artifact.name), workers=workers)
+        except (RuntimeError, OSError) as exc:
+            app.logger.error("%s of calculation %s can not be opened, skipping: %s", artifact, calc_id, exc)
+
+
+class CalculationCollectionOutputsTarResource(Resource):
+    export_args = {
+        'artifact': fields.DelimitedList(fields.Str(), required=False, missing=None),
+        }
+
+    @use_kwargs(export_args, location='querystring')
+    def get(self, ccid, artifact):
+        coll = CalculationCollection.query.get_or_404(ccid)
+
+        # the size is unknown in advance since the artifacts are fetched while sending
+        return tar_response(collection_output_members(coll.id, artifact), "{}.outputs.tar".format(coll.name))
+
+
+class UploadSessionListResource(Resource):
+    """
+    Resumable uploads of output artifacts: a session gets created here, the chunks are then sent
+    numbered from 0 using PUT .../sessions/<sid>/chunks/<num> (with an optional sha256 of the chunk
+    in the query string) and the upload is completed with a POST of the sha256 of the content
+    to the session. The session lists the received chunks to resume an interrupted upload,
+    and the state of the commit.
+    """
+
+    session_args = {
+        'name': fields.Str(required=True),
+        'compressed': fields.Str(missing=None, validate=lambda c: c in CODECS),
+        }
+
+    @apiauth.login_required
+    @use_kwargs(session_args)
+    def post(self, tid, name, compressed):
+        task = Task2.query.get_or_404(tid)
+
+        session = UploadSession(task, name, compressed)
+        db.session.add(session)
+        db.session.commit()
+
+        schema = UploadSessionSchema()
+        return make_response(schema.jsonify(session), 201, {
+            'Location': api.url_for(UploadSessionResource, tid=tid, sid=session.id, _external=True)})
+
+
+class UploadSessionResource(Resource):
+    commit_args = {
+        'sha256': fields.Str(required=True, validate=lambda h: len(h) == 64),
+        }
+
+    def get(self, tid, sid):
+        session = UploadSession.query.filter_by(id=sid, task_id=tid).first_or_404()
+
+        schema = UploadSessionSchema()
+        return schema.jsonify(session)
+
+    @apiauth.login_required
+    @use_kwargs(commit_args)
+    def post(self, tid, sid, sha256):
+        """
+        Commit the upload: the concatenated chunks get verified and stored as an output artifact
+        of the task by a background task, the session shows the outcome (see UploadSession.state)
+        """
+
+        try:
+            # chunks being received hold a shared lock, see UploadChunkResource
+            session = (UploadSession.query
+                       .filter_by(id=sid, task_id=tid)
+                       .with_for_update(nowait=True)
+                       .first_or_404())
+        except OperationalError:
+            abort(409, message="chunks are still being received or the upload is being committed")
+
+        if session.state in ('committing', 'committed'):
+            abort(409, message="the upload is {} already".format(session.state))
+
+        chunks = session.chunks()
+
+        if not chunks:
+            abort(409, message="no chunks uploaded")
+
+        if chunks[-1][0] != len(chunks) - 1:
+            missing = sorted(set(range(chunks[-1][0])) - set(num for num, _ in chunks))
+            abort(409, message="chunks missing: {}".format(missing))
+
+        session.state = 'committing'
+        session.message = None
+        db.session.commit()
+
+        commit_upload_session.delay(session.id, sha256)
+
+        schema = UploadSessionSchema()
+        return make_response(schema.jsonify(session), 202, {
+            'Location': api.url_for(UploadSessionResource, tid=tid, sid=session.id, _external=True)})
+
+    @apiauth.login_required
+    def delete(self, tid, sid):
+        session = UploadSession.query.filter_by(id=sid, task_id=tid).first_or_404()
+
+        db.session.delete(session)
+        db.session.commit()
+        session.discard()
+
+        return Response(status=204)  # return completely empty
+
+
+class UploadChunkResource(Resource):
+    chunk_args = {
+        'sha256': fields.Str(missing=None, validate=lambda h: len(h) == 64),
+        }
+
+    @apiauth.login_required
+    @use_kwargs(chunk_args, location='querystring')
+    def put(self, tid, sid, num, sha256):
+        # the shared lock keeps the upload from being committed while the chunk is received
+        session = (UploadSession.query
+                   .filter_by(id=sid, task_id=tid)
+                   .with_for_update(read=True)
+                   .first_or_404())
+
+        if session.state in ('committing', 'committed'):
+            abort(409, message="the upload is {} already".format(session.state))
+
+        # the request body is streamed to the storage, not buffered
+        try:
+            size = session.save_chunk(num, request.stream, sha256)
+        except ValueError as exc:
+            abort(400, message=str(exc))
+
+        return {'number': num, 'size': size}
+
+
+def structure_listing():
+    """
+    Query the projection of structures used in listings (see StructureListSchema),
+    ordered by name and ID, without loading the ase_structure or any relationship
+    """
+
+    set_names = (select([func.array_agg(aggregate_order_by(StructureSet.name, StructureSet.name))])
+                 .where(and_(StructureSetStructure.c.structure_id == Structure.id,
+                             StructureSetStructure.c.set_id == StructureSet.id))
+                 .as_scalar())
+
+    return (db.session.query(
+        Structure.id,
+        Structure.name,
+        Structure.replaced_by_id,
+        Structure.chemical_formula,
+        Structure.natoms,
+        func.coalesce(set_names, cast(array([], type_=String), ARRAY(String))).label('sets'))
+            .order_by(Structure.name, Structure.id))
+
+
+def encode_cursor(name, sid):
+    """The opaque cursor pointing after the given structure in the structure listing"""
+    return base64.urlsafe_b64encode(json.dumps([name, str(sid)]).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        name, sid = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        return name, uuid.UUID(sid)
+    except (ValueError, TypeError):
+        raise ValidationError("invalid cursor")
+
+
+def prepare_structure(struct, pbc=None, cell=None, charges=None, magmoms=None, cubic_cell=False, center=False):
+    """Apply the upload options to a structure read from a geometry file, generating a cell if there is none"""
+
+    if pbc is not None:
+        struct.set_pbc(pbc)
+
+    if cell is not None:
+        struct.set_cell(cell)
+
+    if charges is not None:
+        struct.set_initial_charges(charges)
+
+    if magmoms is not None:
+        struct.set_initial_magnetic_moments(magmoms)
+
+    if not struct.get_cell().any():
+        # if no cell is defined until here (either inside the format or by an explicit cell argument),
+        # we generate a cell based on the moleculare boundary box with a buffer of 2.5 Å,
+        # resp. 5 for non-pbc on each side
+        # So, for the periodic case the buffers "overlap" between images compared to the non-periodic case.
+        # This results in each side of the box being > 5 Å for the periodic,
+        # respectively > 10 Å for the non-periodic case
+
+        if (pbc is None) or pbc:
+            buf_size = 5.
+        else:
+            buf_size = 10.
+
+        struct.set_cell(bounding_box_cell(struct, buf_size, cubic_cell), scale_atoms=False)
+
+        # Finally, we center the atom in the cell (with the cell starting at 0/0/0)
+        # to also accomodate for non-periodic calculations and cases where we do not want
+        # the code to auto-center the coordinates in the box.
+        struct.center()
+
+    # also center if explictly requested by the user
+    if center:
+        struct.center()
+
+
 class StructureListResource_v2(Resource):
     filter_args = {
         'include_replaced': fields.Boolean(required=False, missing=False),
-        'limit': fields.Integer(required=False, missing=-1),
+        'limit': fields.Integer(required=False, missing=-1),  # page size, -1 for all
+        'after': fields.Str(required=False, missing=None, validate=decode_cursor),  # cursor from the next link
+        'name_prefix': fields.Str(required=False, missing=None),
+        'sets': fields.DelimitedList(fields.Str(validate=must_exist_in_db(StructureSet, 'name')), missing=None),
         }
 
     @use_kwargs(filter_args, location='querystring')
-    def get(self, include_replaced, limit):
-        query = (Structure.query
-                 .join(Structure.sets)
-                 .options(contains_eager(Structure.sets))
-                )
+    def get(self, include_replaced, limit, after, name_prefix, sets):
+        query = structure_listing()
 
         if not include_replaced:
             query = query.filter(Structure.replaced_by_id == None)
 
+        if name_prefix:
+            query = query.filter(Structure.name.startswith(name_prefix, autoescape=True))
+
+        if sets:
+            query = query.filter(Structure.sets.any(StructureSet.name.in_(sets)))
+
+        if after:
+            # keyset pagination: continue after the last structure of the previous page
+            query = query.filter(tuple_(Structure.name, Structure.id) > tuple_(*decode_cursor(after)))
+
         if limit > 0:
             query = query.limit(limit)
 
+        structures = query.all()
+
         schema = StructureListSchema(many=True)
-        return schema.jsonify(query.all())
+        response = schema.jsonify(structures)
+
+        if limit > 0 and len(structures) == limit:
+            args = {k: v for k, v in request.args.items() if k != 'after'}
+            response.headers['Link'] = '<{}>; rel="next"'.format(
+                url_for('structurelistresource_v2', _external=True,
+                        after=encode_cursor(structures[-1].name, structures[-1].id), **args))
+
+        return response
 
     structure_args = {
         'name': fields.Str(required=True),
@@ -1067,79 +1538,135 @@ class StructureListResource_v2(Resource):
 
         struct = ase_io.read(codecs.getreader('utf-8')(geometry), format=gformat)
 
-        if pbc is not None:
-            struct.set_pbc(pbc)
+        prepare_structure(struct, pbc, cell, charges, magmoms, cubic_cell, center)
+
+        ase_structure = atoms2json(struct)
+
+        structure = Structure(name=name, sets=sets,
+                              ase_structure=ase_structure)
+        db.session.add(structure)
+
+        if existing_structure:
+            existing_structure.replaced_by = structure
 
-        if cell is not None:
-            struct.set_cell(cell)
+        db.session.commit()
 
-        if charges is not None:
-            struct.set_initial_charges(charges)
+        schema = StructureSchema()
+        return schema.jsonify(structure)
 
-        if magmoms is not None:
-            struct.set_initial_magnetic_moments(magmoms)
 
-        if not struct.get_cell().any():
-            # if no cell is defined until here (either inside the format or by an explicit cell argument),
-            # we generate a cell based on the moleculare boundary box,
-            # where the molecule boundary box is defined as the minimal/maximal coordinates
-            # over all atoms minus/plus their respective VdW radii plus a buffer of 2.5 Å,
-            # resp. 5 for non-pbc on each side
-            # So, for the periodic case the buffers "overlap" between images compared to the non-periodic case.
-            # This results in each side of the box being > 5 Å for the periodic,
-            # respectively > 10 Å for the non-periodic case
+class StructureBulkResource(Resource):
+    """Upload many structures at once, as frames of an (ext)xyz file or files in a tar archive"""
 
-            if (pbc is None) or pbc:
-                buf_size = 5.
-            else:
-                buf_size = 10.
+    bulk_args = {
+        'sets': fields.DelimitedList(fields.Str(validate=must_exist_in_db(StructureSet, 'name')), missing=[]),
+        'pbc': fields.Boolean(required=False, missing=None),
+        'gformat': fields.Str(required=False, missing='extxyz', data_key='format'),  # 'tar' for an archive
+        'cubic_cell': fields.Boolean(required=False, missing=False),
+        'center': fields.Boolean(required=False, missing=False),
+        'replace_existing': fields.Boolean(required=False, missing=False),
+        'skip_invalid': fields.Boolean(required=False, missing=False),  # store the valid frames nevertheless
+        }
+    file_args = {
+        'geometries': fields.Field(required=True)
+        }
 
-            # The VdW radius if available, otherwise the covalent radius
-            radii = [ase_data.vdw_radii[n]
-                     if not np.isnan(ase_data.vdw_radii[n])
-                     else ase_data.covalent_radii[n]
-                     for n in struct.get_atomic_numbers()]
+    @staticmethod
+    def _set_names(value):
+        # a comma-separated string or a list if parsed as such from the extended XYZ comment line
+        if isinstance(value, str):
+            return [name for name in value.split(',') if name]
 
-            radii_pos = list(zip(radii, struct.get_positions()))
+        return [str(name) for name in value]
 
-            cell = [
-                max(pos[i] + rad for rad, pos in radii_pos)
-                - min(pos[i] - rad for rad, pos in radii_pos)
-                + buf_size
-                for i in range(3)
-                ]
+    @apiauth.login_required
+    @use_kwargs(bulk_args, location='form')
+    @use_kwargs(file_args, location='files')
+    def post(self, sets, pbc, gformat, cubic_cell, center, replace_existing, skip_invalid, geometries):
+        frames = []
+        errors = []
+
+        def error(num, name, message):
+            errors.append({'frame': num, 'name': name, 'message': message})
+
+        try:
+            for num, struct, options in read_frames(geometries, gformat):
+                if isinstance(struct, Exception):
+                    error(num, options.get('name'), "reading the geometry failed: {}".format(struct))
+                elif not options.get('name'):
+                    error(num, None, "the frame has no name")
+                elif not len(struct):
+                    error(num, options['name'], "the frame contains no atoms")
+                else:
+                    options['name'] = str(options['name'])  # could have been parsed as a number
+                    frames.append((num, struct, options))
+        except (tarfile.TarError, ValueError) as exc:
+            abort(400, message="reading the archive failed: {}".format(exc))
 
-            # and round up to nearest full Angstrom
-            cell = np.ceil(cell)
+        # fetch the existing structures and the sets referenced by the frames in one go each
+        names = [options['name'] for _, _, options in frames]
+        existing = {s.name: s for s in (Structure.query
+                                        .options(load_only('id', 'name'))
+                                        .filter(Structure.name.in_(names), Structure.replaced_by_id == None))}
 
-            # if a cubic box is requested, use the largest coordinate
-            if cubic_cell:
-                cell = [max(cell)] * 3
+        frame_sets = {name for _, _, options in frames for name in self._set_names(options.get('sets', ''))}
+        structure_sets = {s.name: s for s in StructureSet.query.filter(StructureSet.name.in_(set(sets) | frame_sets))}
 
-            struct.set_cell(cell, scale_atoms=False)
+        structures = []
+        seen = set()
 
-            # Finally, we center the atom in the cell (with the cell starting at 0/0/0)
-            # to also accomodate for non-periodic calculations and cases where we do not want
-            # the code to auto-center the coordinates in the box.
-            struct.center()
+        for num, struct, options in frames:
+            name = options['name']
 
-        # also center if explictly requested by the user
-        if center:
-            struct.center()
+            if name in seen:
+                error(num, name, "a previous frame has the same name")
+                continue
 
-        ase_structure = atoms2json(struct)
+            seen.add(name)
 
-        structure = Structure(name=name, sets=sets,
-                              ase_structure=ase_structure)
-        db.session.add(structure)
+            if name in existing and not replace_existing:
+                error(num, name, "a structure with this name already exists and replace_existing is not true")
+                continue
 
-        if existing_structure:
-            existing_structure.replaced_by = structure
+            set_names = self._set_names(options.get('sets', '')) or sets
+            unknown = [n for n in set_names if n not in structure_sets]
+
+            if unknown:
+                error(num, name, "unknown structure sets: {}".format(", ".join(unknown)))
+                continue
 
+            try:
+                prepare_structure(struct, pbc,
+                                  cubic_cell=options.get('cubic_cell', cubic_cell),
+                                  center=options.get('center', center))
+                structure = Structure(name=name, sets=[structure_sets[n] for n in set_names],
+                                      ase_structure=atoms2json(struct))
+            except (ValueError, TypeError, IndexError) as exc:
+                error(num, name, "preparing the structure failed: {}".format(exc))
+                continue
+
+            if name in existing:
+                existing[name].replaced_by = structure
+
+            structures.append(structure)
+
+        errors.sort(key=lambda e: e['frame'])
+
+        if errors and not skip_invalid:
+            db.session.rollback()
+            return make_response(flask.jsonify({'structures': [], 'errors': errors}), 422)
+
+        # all structures in one transaction, the unique name constraint is deferred until the commit
+        db.session.add_all(structures)
+        db.session.flush()
+        ids = [s.id for s in structures]
         db.session.commit()
 
-        schema = StructureSchema()
-        return schema.jsonify(structure)
+        schema = StructureListSchema(many=True)
+        return make_response(flask.jsonify({
+            'structures': schema.dump(structure_listing().filter(Structure.id.in_(ids)).all()),
+            'errors': errors,
+            }), 201)
 
 
 class StructureResource_v2(Resource):
@@ -1176,7 +1703,7 @@ class StructureDownloadResource(Resource):
         fileending, formatter = self.SUPPORTED_MIMETYPES[selected_mimetype]
 
         structure = Structure.query.get_or_404(sid)
-        asestruct = json2atoms(structure.ase_structure)
+        asestruct = structure.get_atoms()
 
         if 'key_value_pairs' in asestruct.info:
             # it seems Python ASE is unable to handle nested dicts in
@@ -1230,10 +1757,8 @@ class StructureSetStructureListResource(Resource):
         # validate the name
         StructureSet.query.filter_by(name=name).one()
 
-        query = (Structure.query
-                 .join(Structure.sets)
-                 .options(contains_eager(Structure.sets))
-                 .filter(StructureSet.name == name)
+        query = (structure_listing()
+                 .filter(Structure.sets.any(StructureSet.name == name))
                  .filter(Structure.replaced_by_id == None))
 
         schema = StructureListSchema(many=True)
@@ -1492,7 +2017,8 @@ class CalculationActionResource(Resource):
     @use_kwargs(CalculationListActionSchema)
     def post(self, cid, generateResults):
         if generateResults:
-            async_result = generate_calculation_results.delay(cid, generateResults['update'])
+            async_result = generate_calculation_results.delay(
+                cid, generateResults['update'], generateResults['incremental'])
 
             return Response(status=202, headers={
                 'Location': api.url_for(ActionResource, aid=async_result.id, _external=True)})
@@ -1713,6 +2239,7 @@ api = Api(app, prefix='/api/v2')
 api.add_resource(CalculationCollectionListResource, '/calculationcollections')
 api.add_resource(CalculationCollectionResource,
                  '/calculationcollections/<uuid:ccid>')
+api.add_resource(CalculationCollectionOutputsTarResource, '/calculationcollections/<uuid:ccid>/outputs.tar')
 api.add_resource(CalculationListResource, '/calculations')
 api.add_resource(CalculationListActionResource, '/calculations/action')
 api.add_resource(CalculationResource, '/calculations/<uuid:cid>')
@@ -1722,6 +2249,10 @@ api.add_resource(Task2ListResource, '/calculations/<uuid:cid>/tasks', endpoint='
 api.add_resource(Task2ListResource, '/tasks')
 api.add_resource(Task2Resource, '/tasks/<uuid:tid>')
 api.add_resource(Task2UploadResource, '/tasks/<uuid:tid>/uploads')
+api.add_resource(Task2InputsTarResource, '/tasks/<uuid:tid>/inputs.tar')
+api.add_resource(UploadSessionListResource, '/tasks/<uuid:tid>/uploads/sessions')
+api.add_resource(UploadSessionResource, '/tasks/<uuid:tid>/uploads/sessions/<uuid:sid>')
+api.add_resource(UploadChunkResource, '/tasks/<uuid:tid>/uploads/sessions/<uuid:sid>/chunks/<int:num>')
 api.add_resource(ArtifactListResource, '/artifacts')
 api.add_resource(ArtifactResource, '/artifacts/<uuid:aid>')
 api.add_resource(ArtifactDownloadResource, '/artifacts/<uuid:aid>/download', resource_class_kwargs={'mode': 'download'})
@@ -1731,6 +2262,7 @@ api.add_resource(StructureSetResource, '/structuresets/<string:name>')
 api.add_resource(StructureSetStructureListResource, '/structuresets/<string:name>/structures')
 api.add_resource(StructureSetCalculationsListResource, '/structuresets/<string:name>/calculations')
 api.add_resource(StructureListResource_v2, '/structures')
+api.add_resource(StructureBulkResource, '/structures/bulk')
 api.add_resource(StructureResource_v2, '/structures/<uuid:sid>')
 api.add_resource(StructureDownloadResource, '/structures/<uuid:sid>/download')
 api.add_resource(BasisSetListResource, '/basissets')
@@ -16,3 +16,30 @@ def createconfig():
 
     with open('fatman.cfg', 'a') as cfg:
         cfg.write("SECRET_KEY = {}\n".format(urandom(24)))
+
+
+@app.cli.command('migrate-artifact-layout')
+@click.option('--batch-size', type=int, default=500, show_default=True,
+              help="Number of artifacts to move per transaction")
+def migrate_artifact_layout_command(batch_size):
+    """Move artifacts to the fanned out directory layout"""
+
+    from .tasks import migrate_artifact_layout
+
+    click.echo("Moved {} artifacts".format(migrate_artifact_layout(batch_size)))
+
+
+@app.cli.command('collect-artifact-garbage')
+@click.option('--batch-size', type=int, default=1000, show_default=True,
+              help="Number of artifacts to delete per transaction")
+@click.option('--scan/--no-scan', default=True, show_default=True,
+              help="Scan the storage for files not referenced by any artifact")
+@click.option('--dry-run', is_flag=True, help="Only count what would be deleted")
+def collect_artifact_garbage_command(batch_size, scan, dry_run):
+    """Delete unlinked artifacts and orphaned artifact files"""
+
+    from .tasks import collect_artifact_garbage
+
+    counts = collect_artifact_garbage(batch_size, scan, dry_run)
+    click.echo("{} {artifacts} artifacts, {blobs} blobs and {files} orphaned files".format(
+        "Found" if dry_run else "Deleted", **counts))
@@ -8,6 +8,47 @@ DEBUG = False
 # File-Upload defaults
 UPLOADED_RESULTS_DEST = '/var/empty'
 UPLOADED_RESULTS_ALLOW = ['md', 'json', 'xml', 'zip', 'tar', 'tgz', 'gz', 'tbz2', 'bz2', 'xz']
+UPLOADED_COLD_DEST = '/var/empty'
+
+# Number of threads used to decompress the blocks of indexed bz2 artifacts (None: no parallel decompression)
+ARTIFACT_DECOMPRESSION_WORKERS = None
+
+# Compression scheme (bz2, gzip, xz or zstd if available) applied when storing uploaded artifacts which
+# are not compressed yet and have at least ARTIFACT_COMPRESSION_MIN_SIZE bytes (None: store them as they are)
+ARTIFACT_COMPRESSION = None
+ARTIFACT_COMPRESSION_MIN_SIZE = 64*1024
+
+# Store artifacts content-addressed (blob://<sha256>), keeping files with identical content only once
+ARTIFACT_DEDUPLICATION = False
+
+# Store artifacts smaller than this many bytes inline in the database (db://) instead of in files (0: never)
+ARTIFACT_INLINE_SIZE_LIMIT = 0
+
+# Internal (nginx) location serving UPLOADED_RESULTS_DEST, to hand off downloads of uncompressed
+# artifacts via X-Accel-Redirect (None: send them from the application, see also USE_X_SENDFILE)
+ARTIFACT_ACCEL_REDIRECT_LOCATION = None
+
+# Tiering of the output artifacts of superseded tasks (not the current task of their calculation)
+# last modified at least ARTIFACT_TIERING_MIN_AGE days ago: recompress them using ARTIFACT_TIERING_CODEC
+# (None: keep their compression) and move them to UPLOADED_COLD_DEST if ARTIFACT_TIERING_COLD is set
+ARTIFACT_TIERING_CODEC = 'xz'
+ARTIFACT_TIERING_COLD = False
+ARTIFACT_TIERING_MIN_AGE = 30
+
+# Garbage collection of artifacts (see tasks.collect_artifact_garbage): number of threads scanning
+# the storage and the minimal age in hours of files not referenced by any artifact to get removed
+ARTIFACT_GC_WORKERS = 4
+ARTIFACT_GC_MIN_AGE = 24
+
+# Number of decoded structures (ASE Atoms objects) to keep in memory per process (0: no caching)
+STRUCTURE_ATOMS_CACHE_SIZE = 256
+
+# Number of calculations per task when (re-)generating all calculation results,
+# 0 for one task per calculation (the default), e.g. 200 to enable the batch mode
+CALCULATION_RESULTS_BATCH_SIZE = 0
+# Number of processes used by each of those tasks to parse the outputs (None: parse serially),
+# the pool is started from within the (prefork) Celery worker process
+CALCULATION_RESULTS_PROCESSES = None
 
 # Flask-Security defaults
 SECURITY_PASSWORD_HASH = 'pbkdf2_sha512'
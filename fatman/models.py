@@ -12,21 +12,32 @@ try:
 except ImportError:
     from urlparse import urlsplit
 from os import path
+import os
+import io
+import hashlib
+import collections
+import tempfile
+import shutil
 
 from flask_security import UserMixin, RoleMixin
 
-from sqlalchemy import text, and_, or_, select, func
+from sqlalchemy import text, and_, or_, select, func, event
 from sqlalchemy import Column, ForeignKey, UniqueConstraint, CheckConstraint, Index
-from sqlalchemy import Integer, String, Boolean, DateTime, Text, Enum
-from sqlalchemy.dialects.postgresql import UUID, JSONB, ExcludeConstraint
-from sqlalchemy.orm import column_property
+from sqlalchemy import Integer, BigInteger, String, Boolean, DateTime, Text, Enum, LargeBinary, Float
+from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY, ExcludeConstraint, insert
+from sqlalchemy.orm import column_property, deferred, validates
 from sqlalchemy.sql.expression import null
 from sqlalchemy.sql.functions import coalesce
 from sqlalchemy.ext.hybrid import hybrid_property
 
 from werkzeug.datastructures import FileStorage
 
-from . import resultfiles
+from . import app, resultfiles, coldfiles
+from .tools import json2atoms, atoms_descriptors
+from .tools.atomscache import AtomsCache
+from .tools.bz2blocks import IndexedBZ2File, build_index
+from .tools.compression import open_compressed, get_codec, CompressingReader, COMPRESSED_EXTENSIONS
+from .tools.tarstream import TarMember
 
 # Flask-SQLAlchemy wraps only a part of all the attributes from SQLAlchemy.ORM
 # and is missing the PostgreSQL-specific types. To make the model definitions
@@ -43,6 +54,12 @@ dynamic_loader = db.dynamic_loader
 
 # some shorthands
 
+# the upload sets available as locations for fkup:// artifacts
+UPLOAD_SETS = {
+    'results': resultfiles,
+    'cold': coldfiles,
+    }
+
 
 def UUIDPKColumn():
     """Constructs a Primary Key UUID Column"""
@@ -89,12 +106,25 @@ class User(Base, UserMixin):
         return self.email
 
 
+# structures are immutable (changes replace them), hence their decoded form can be cached by ID
+atoms_cache = AtomsCache(app.config['STRUCTURE_ATOMS_CACHE_SIZE'])
+
+
 class Structure(Base):
     id = UUIDPKColumn()
     name = Column(String, nullable=False)
     # ase_structure = Column(JSONB, nullable=False)
     ase_structure = Column(Text, nullable=False)
 
+    # descriptors derived from ase_structure when setting it, to avoid decoding it, see tools.atoms_descriptors
+    chemical_formula = Column(String, nullable=False)
+    natoms = Column(Integer, nullable=False)
+    elements = Column(ARRAY(String), nullable=False)  # sorted, each element once
+    volume = Column(Float)  # in Å^3, NULL if the cell does not span a volume
+    pbc = Column(ARRAY(Boolean), nullable=False)
+    net_initial_charge = Column(Float, nullable=False)
+    initial_magnetic_moment = Column(Float, nullable=False)
+
     replaced_by_id = Column(UUID(as_uuid=True), ForeignKey('structure.id'))
     replaced_by = relationship("Structure", remote_side=[id], lazy='joined', join_depth=2)
 
@@ -110,6 +140,24 @@ class Structure(Base):
 
         return self.name
 
+    def get_atoms(self):
+        """Get the structure as Atoms object, the decoded structures are cached (see atoms_cache)"""
+
+        if self.id is None:  # not flushed yet, no key to cache it under
+            return json2atoms(self.ase_structure)
+
+        return atoms_cache.get(self.id, lambda: json2atoms(self.ase_structure))
+
+    @validates('ase_structure')
+    def update_descriptors(self, _, ase_structure):
+        for key, value in atoms_descriptors(json2atoms(ase_structure)).items():
+            setattr(self, key, value)
+
+        if self.id is not None:
+            atoms_cache.evict(self.id)
+
+        return ase_structure
+
     __table_args__ = (
         # ensure that the name is unique amongst non-replaced structures,
         # and defer constraint to end of transaction to be able to replace
@@ -119,6 +167,8 @@ class Structure(Base):
             using='btree',
             where=replaced_by_id == null(),
             deferrable=True, initially='DEFERRED'),
+        # for the keyset pagination of the structure listing
+        Index('ix_structure_name_id', name, id),
         )
 
 
@@ -631,8 +681,9 @@ class Task2Artifact(Base):
 
     task_id = Column(UUID(as_uuid=True), ForeignKey('task2.id', ondelete='CASCADE'),
                      primary_key=True)
+    # indexed separately to find unlinked artifacts, see tasks.collect_artifact_garbage
     artifact_id = Column(UUID(as_uuid=True), ForeignKey('artifact.id'),
-                         primary_key=True)
+                         primary_key=True, index=True)
     linktype = Column(Enum("input", "output", name="artifact_link_type"),
                       nullable=False)
 
@@ -640,12 +691,184 @@ class Task2Artifact(Base):
     task = relationship("Task2")
 
 
+class Blob(Base):
+    """
+    Content-addressed storage for artifact files: files with identical content are
+    stored only once, keyed by their SHA-256, and referenced as blob://<sha256>.
+
+    The refcount is maintained when saving and deleting artifacts, blobs which
+    are no longer referenced are removed by the delete_unreferenced_blobs task.
+    """
+
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    refcount = Column(Integer, nullable=False, default=0)
+    ctime = Column(DateTime, nullable=False, default=dt.now)
+
+    def __repr__(self):
+        return "<Blob(sha256='{}', refcount={})>".format(self.sha256, self.refcount)
+
+    @staticmethod
+    def filepath(sha256):
+        """The path to the stored file, fanned out over two directory levels"""
+        return resultfiles.path(path.join('blobs', sha256[:2], sha256[2:4], sha256))
+
+    @classmethod
+    def store(cls, buf):
+        """
+        Store the content of a binary file object if not present yet and add a reference to it.
+
+        Returns:
+            the SHA-256 of the content
+        """
+
+        blobdir = resultfiles.path('blobs')
+        os.makedirs(blobdir, exist_ok=True)
+
+        sha256 = hashlib.sha256()
+        size = 0
+
+        # hash while writing to a temporary file on the same filesystem, to be renamed afterwards
+        with tempfile.NamedTemporaryFile(dir=blobdir, prefix='.tmp', delete=False) as tmpfile:
+            try:
+                for chunk in iter(lambda: buf.read(1024*1024), b''):
+                    sha256.update(chunk)
+                    size += len(chunk)
+                    tmpfile.write(chunk)
+            except Exception:
+                os.unlink(tmpfile.name)
+                raise
+
+        digest = sha256.hexdigest()
+
+        try:
+            # the row lock taken here keeps delete_unreferenced_blobs from removing the file
+            # until the end of our transaction, hence the file must only be checked afterwards
+            db.session.execute(
+                insert(cls.__table__)
+                .values(sha256=digest, size=size, refcount=1, ctime=dt.now())
+                .on_conflict_do_update(index_elements=['sha256'],
+                                       set_={'refcount': cls.__table__.c.refcount + 1}))
+
+            filepath = cls.filepath(digest)
+
+            if path.exists(filepath):
+                os.unlink(tmpfile.name)
+            else:
+                os.makedirs(path.dirname(filepath), exist_ok=True)
+                os.replace(tmpfile.name, filepath)
+        except Exception:
+            if path.exists(tmpfile.name):
+                os.unlink(tmpfile.name)
+            raise
+
+        return digest
+
+
+def results_folder(task_id):
+    """
+    The folder for the artifacts of a task in the results upload set,
+    fanned out over two levels to keep the number of entries per directory low.
+    """
+
+    tid = str(task_id)
+    return "{}/{}/{}".format(tid[:2], tid[2:4], tid)
+
+
+def artifact_path(task, size=None):
+    """The storage path for new artifacts of the given task, given the size of the content if known"""
+
+    if size is not None and size < app.config['ARTIFACT_INLINE_SIZE_LIMIT']:
+        # small artifacts are stored in the database, see Artifact.save()
+        return "db://"
+
+    if app.config['ARTIFACT_DEDUPLICATION']:
+        # the path gets completed with the content hash when saving, see Artifact.save()
+        return "blob://"
+
+    # we put all files in one task-subfolder, with the task-subfolders fanned out
+    # over two more levels to avoid hitting a max-file-per-dir limit
+    return "fkup://results/{}/{{id}}".format(results_folder(task.id))
+
+
+def upload_compression(name, size):
+    """The compression scheme to apply to an upload received uncompressed, according to the configured policy"""
+
+    if app.config['ARTIFACT_COMPRESSION'] is None or name.lower().endswith(COMPRESSED_EXTENSIONS):
+        return None
+
+    if size < app.config['ARTIFACT_COMPRESSION_MIN_SIZE']:
+        return None
+
+    return app.config['ARTIFACT_COMPRESSION']
+
+
+def add_output_artifact(task, name, compressed, data, size):
+    """Store the data read from the given file object as output artifact of the task, size being the uploaded size"""
+
+    artifact = Artifact(name=name, path=artifact_path(task, size), metadata={'compressed': compressed})
+    artifact.save(data)
+
+    if isinstance(getattr(data, 'raw', None), CompressingReader):
+        # compressed while storing, the decompressed size is known without reading the file again
+        artifact.mdata = dict(artifact.mdata, content_size=data.raw.size)
+
+    db.session.add(Task2Artifact(artifact=artifact, task=task,
+                                 linktype="output"))
+
+    return artifact
+
+
+def artifact_filepath(artifact_path):
+    """The path to the stored file given the path of an artifact, see Artifact.filepath"""
+
+    scheme, nwloc, fullpath, _, _ = urlsplit(artifact_path)
+
+    if scheme == 'fkup' and nwloc in UPLOAD_SETS:
+        return UPLOAD_SETS[nwloc].path(fullpath[1:])
+
+    if scheme == 'blob' and nwloc:
+        return Blob.filepath(nwloc)
+
+    if scheme == 'db':
+        raise RuntimeError("artifact is stored inline, there is no file")
+
+    raise RuntimeError("unknown scheme '{}' or location '{}'".format(
+        scheme, nwloc))
+
+
+def open_artifact_file(source, metadata, mode='rb', workers=None):
+    """
+    Open the stored content of an artifact (the path to the file or the inline content)
+    given its metadata, see Artifact.open().
+    Does not require a database session, making it usable in pool processes.
+    """
+
+    compressed = metadata.get('compressed', None)
+
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    if compressed is None:
+        fhandle = open(source, 'rb') if isinstance(source, str) else source
+    elif compressed == 'bz2' and 'bz2_index' in metadata:
+        fhandle = io.BufferedReader(IndexedBZ2File(source, metadata['bz2_index'], workers))
+    else:
+        fhandle = open_compressed(source, compressed)
+
+    if mode == 'rt':
+        return io.TextIOWrapper(fhandle)
+
+    return fhandle
+
+
 class Artifact(Base):
     id = UUIDPKColumn()
     name = Column(String(255), nullable=False)
     path = Column(String(255), nullable=False)
     mdata = Column('metadata', JSONB, default={}, nullable=False)
     # ^^ "metadata" is an SQLAlchemy reserved word
+    content = deferred(Column(LargeBinary))  # for artifacts stored inline (db://)
 
     def __repr__(self):
         return "<Artifact(id='{}', name='{}')>".format(self.id, self.name)
@@ -658,11 +881,24 @@ class Artifact(Base):
         self.mdata = metadata
 
     def save(self, buf):
-        """Save a byte-stream to the storage specified in path"""
+        """
+        Save a byte-stream to the storage specified in path.
+
+        For the content-addressed storage (a path of 'blob://') the path
+        gets completed with the SHA-256 of the content, with 'db://' the
+        content is stored inline in the database.
+        """
 
         scheme, nwloc, fullpath, _, _ = urlsplit(self.path)
 
-        if scheme == 'fkup' and nwloc == 'results':
+        if scheme == 'db':
+            self.content = buf.read()
+        elif scheme == 'blob' and not nwloc:
+            sha256 = Blob.store(buf)
+            self.path = "blob://{}".format(sha256)
+            # the hash of the stored file, see content_hash()
+            self.mdata = dict(self.mdata, sha256=sha256)
+        elif scheme == 'fkup' and nwloc == 'results':
             folder, filename = path.split(fullpath)
             storage = FileStorage(buf, filename=filename)
             resultfiles.save(storage, folder=folder[1:])
@@ -670,6 +906,396 @@ class Artifact(Base):
             raise RuntimeError("unknown scheme '{}' or location '{}'".format(
                 scheme, nwloc))
 
+    @property
+    def filepath(self):
+        """The path to the stored (possibly compressed) file"""
+        return artifact_filepath(self.path)
+
+    @property
+    def inline(self):
+        """Whether the artifact is stored inline in the database"""
+        return urlsplit(self.path).scheme == 'db'
+
+    @property
+    def source(self):
+        """The stored (possibly compressed) content: the inline content or the path to the file"""
+        return self.content if self.inline else self.filepath
+
+    def open_stored(self):
+        """Open the stored (possibly compressed) content for binary reading"""
+        return io.BytesIO(self.content) if self.inline else open(self.filepath, 'rb')
+
+    def open(self, mode='rb', workers=None):
+        """
+        Open the decompressed content for reading, in binary ('rb') or text mode ('rt').
+
+        Indexed bz2 artifacts can be seeked without decompressing everything
+        and are decompressed using the given number of worker threads.
+        """
+
+        return open_artifact_file(self.source, self.mdata, mode, workers)
+
+    def content_size(self):
+        """The size of the decompressed content if known without decompressing it, None otherwise"""
+
+        if self.mdata.get('compressed', None) is None:
+            return len(self.content) if self.inline else path.getsize(self.filepath)
+
+        # recorded when the content got compressed by us
+        if 'content_size' in self.mdata:
+            return self.mdata['content_size']
+
+        if 'bz2_index' in self.mdata:
+            return self.mdata['bz2_index']['size']
+
+        return None
+
+    def tar_member(self, name=None, mtime=0, workers=None):
+        """
+        The decompressed content as a member for a tar archive generated with tools.tarstream,
+        the size of it is left unknown rather than decompressing the content just to determine it
+        """
+
+        return TarMember(self.name if name is None else name, self.content_size(), mtime,
+                         lambda: self.open(workers=workers))
+
+    def read_tail(self, nbytes):
+        """Read the last nbytes of the decompressed content, fast for uncompressed and indexed artifacts"""
+
+        with self.open() as fhandle:
+            if self.mdata.get('compressed', None) is None or 'bz2_index' in self.mdata:
+                size = fhandle.seek(0, io.SEEK_END)
+                fhandle.seek(max(0, size - nbytes))
+                return fhandle.read()
+
+            # seeking in a compressed stream decompresses everything up to the position,
+            # read through it once instead, keeping only the chunks covering the tail
+            chunks = collections.deque()
+            length = 0
+
+            for chunk in iter(lambda: fhandle.read(1024*1024), b''):
+                chunks.append(chunk)
+                length += len(chunk)
+
+                while chunks and length - len(chunks[0]) >= nbytes:
+                    length -= len(chunks.popleft())
+
+            tail = b''.join(chunks)
+            return tail[len(tail)-nbytes:] if nbytes < len(tail) else tail
+
+    def content_hash(self):
+        """The SHA-256 of the stored content, computed once and kept in the metadata"""
+
+        if 'sha256' not in self.mdata:
+            sha256 = hashlib.sha256()
+
+            with self.open_stored() as fhandle:
+                for chunk in iter(lambda: fhandle.read(1024*1024), b''):
+                    sha256.update(chunk)
+
+            self.mdata = dict(self.mdata, sha256=sha256.hexdigest())
+
+        return self.mdata['sha256']
+
+    def move_to_tier(self, compressed=None, cold=False, workers=None):
+        """
+        Recompress the stored file with the given codec (None: keep the current compression)
+        and/or move it to the cold storage. The change is recorded in the metadata.
+
+        The file is written under a new path, keeping the old one readable until
+        the change is committed.
+
+        Returns:
+            the path of the old file, to be removed after committing
+        """
+
+        scheme, nwloc, fullpath, _, _ = urlsplit(self.path)
+
+        if scheme != 'fkup':
+            raise RuntimeError("only artifacts stored in the upload sets can be moved")
+
+        current = self.mdata.get('compressed', None)
+
+        if compressed is None or compressed == current:
+            compressed = current
+        else:
+            # the extension distinguishes the recompressed file from the original one
+            fullpath += get_codec(compressed).extensions[0]
+
+        location = 'cold' if cold else nwloc
+        newpath = "fkup://{}{}".format(location, fullpath)
+
+        if newpath == self.path:
+            raise RuntimeError("artifact is already stored as requested")
+
+        oldfile = self.filepath
+        newfile = UPLOAD_SETS[location].path(fullpath[1:])
+        os.makedirs(path.dirname(newfile), exist_ok=True)
+
+        sha256 = hashlib.sha256()
+        compressor = None
+
+        with tempfile.NamedTemporaryFile(dir=path.dirname(newfile), prefix='.tmp', delete=False) as tmpfile:
+            try:
+                if compressed == current:
+                    source = self.open_stored()
+                else:
+                    compressor = CompressingReader(self.open(workers=workers), compressed)
+                    source = io.BufferedReader(compressor)
+
+                with source:
+                    for chunk in iter(lambda: source.read(1024*1024), b''):
+                        sha256.update(chunk)
+                        tmpfile.write(chunk)
+            except Exception:
+                os.unlink(tmpfile.name)
+                raise
+
+        os.replace(tmpfile.name, newfile)
+
+        mdata = dict(self.mdata)
+
+        if compressed != current:
+            mdata.pop('bz2_index', None)
+            mdata['content_size'] = compressor.size
+
+        mdata.update({
+            'compressed': compressed,
+            'sha256': sha256.hexdigest(),
+            'tier': {
+                'location': location,
+                'original_path': self.path,
+                'original_compressed': current,
+                'mtime': dt.now().isoformat(),
+                },
+            })
+
+        self.path = newpath
+        self.mdata = mdata
+
+        return oldfile
+
+    def build_index(self, workers=None):
+        """Build and store the block index for a bz2 compressed artifact"""
+
+        if self.mdata.get('compressed', None) != 'bz2':
+            raise RuntimeError("artifact is not bz2 compressed")
+
+        with self.open_stored() as fhandle:
+            index = build_index(fhandle, workers)
+
+        # assign a new dict to get the change to the JSONB column tracked
+        self.mdata = dict(self.mdata, bz2_index=index)
+
+
+@event.listens_for(Artifact, 'after_delete')
+def release_artifact_blob(mapper, connection, artifact):
+    """Drop the reference to the blob when deleting an artifact in the content-addressed storage"""
+
+    scheme, sha256, _, _, _ = urlsplit(artifact.path)
+
+    if scheme == 'blob' and sha256:
+        blobs = Blob.__table__
+        connection.execute(blobs.update()
+                           .where(blobs.c.sha256 == sha256)
+                           .values(refcount=blobs.c.refcount - 1))
+
+
+def current_output_artifacts(collection_id, names=None, batch_size=100):
+    """
+    Iterate over the output artifacts of the current task of all calculations in a collection
+    using a server-side cursor, ordered by calculation and artifact name.
+
+    Args:
+        collection_id: the CalculationCollection ID
+        names: only include artifacts with the given names
+        batch_size: the number of artifacts fetched at once
+
+    Returns:
+        an iterator over tuples of the calculation ID and the artifact
+    """
+
+    # the current task is the latest one, see Calculation.current_task
+    current = (db.session.query(Task2.id, Task2.calculation_id)
+               .join(Calculation)
+               .filter(Calculation.collection_id == collection_id)
+               .order_by(Task2.calculation_id, Task2.ctime.desc())
+               .distinct(Task2.calculation_id)
+               .subquery())
+
+    query = (db.session.query(current.c.calculation_id, Artifact)
+             .join(Task2Artifact, and_(Task2Artifact.task_id == current.c.id,
+                                       Task2Artifact.linktype == 'output'))
+             .join(Artifact, Artifact.id == Task2Artifact.artifact_id)
+             .order_by(current.c.calculation_id, Artifact.name))
+
+    if names:
+        query = query.filter(Artifact.name.in_(names))
+
+    # stream_results gives a server-side (named) cursor with psycopg2
+    return iter(query
+                .execution_options(stream_results=True)
+                .yield_per(batch_size))
+
+
+class UploadSession(Base):
+    """
+    A resumable upload of an output artifact for a task: the content is sent in numbered chunks,
+    which are kept in a temporary directory until the upload gets committed as an artifact.
+
+    The state is 'receiving' while chunks are sent, 'committing' while the content gets verified
+    and stored by a task (see tasks.commit_upload_session), 'committed' when the artifact is stored
+    and 'failed' if the verification failed (with the reason in the message, chunks may be re-sent).
+    """
+
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    task_id = Column(UUID(as_uuid=True), ForeignKey('task2.id', ondelete='CASCADE'),
+                     nullable=False)
+    task = relationship("Task2")
+    name = Column(String(255), nullable=False)
+    compressed = Column(String(16))
+    ctime = Column(DateTime, nullable=False, default=dt.now)
+    state = Column(String(16), nullable=False, default='receiving')
+    message = Column(Text)
+    artifact_id = Column(UUID(as_uuid=True), ForeignKey('artifact.id', ondelete='SET NULL'))
+    artifact = relationship("Artifact")
+
+    def __repr__(self):
+        return "<UploadSession(id='{}', name='{}')>".format(self.id, self.name)
+
+    def __init__(self, task, name, compressed=None):
+        # the ID is needed for the chunk directory before flushing
+        self.id = uuid.uuid4()
+        self.task = task
+        self.name = name
+        self.compressed = compressed
+        self.state = 'receiving'
+
+    @property
+    def chunkdir(self):
+        return resultfiles.path(path.join('uploads', str(self.id)))
+
+    def chunks(self):
+        """The sorted list of the numbers and sizes of the received chunks"""
+
+        try:
+            names = os.listdir(self.chunkdir)
+        except FileNotFoundError:
+            return []
+
+        # skip temporary files of chunks still being received
+        return sorted((int(n), path.getsize(path.join(self.chunkdir, n))) for n in names if n.isdigit())
+
+    def save_chunk(self, num, stream, sha256=None):
+        """
+        Save a chunk by streaming it to a temporary file first, such that
+        incomplete chunks are never used and a chunk can be re-sent.
+
+        Returns:
+            the size of the chunk
+
+        Raises:
+            ValueError: if the SHA-256 of the received data does not match the given one
+        """
+
+        os.makedirs(self.chunkdir, exist_ok=True)
+
+        digest = hashlib.sha256()
+        size = 0
+
+        with tempfile.NamedTemporaryFile(dir=self.chunkdir, prefix='.tmp', delete=False) as tmpfile:
+            try:
+                for data in iter(lambda: stream.read(1024*1024), b''):
+                    digest.update(data)
+                    size += len(data)
+                    tmpfile.write(data)
+            except Exception:
+                os.unlink(tmpfile.name)
+                raise
+
+        if sha256 is not None and digest.hexdigest() != sha256.lower():
+            os.unlink(tmpfile.name)
+            raise ValueError("checksum mismatch for chunk {}: received data has SHA-256 {}".format(
+                num, digest.hexdigest()))
+
+        os.replace(tmpfile.name, path.join(self.chunkdir, str(num)))
+
+        return size
+
+    def open(self):
+        """Open the concatenated chunks for reading, see ChunksReader"""
+        return ChunksReader([path.join(self.chunkdir, str(num)) for num, _ in self.chunks()])
+
+    def sha256(self):
+        """The SHA-256 hex digest of the concatenated chunks"""
+
+        with self.open() as reader:
+            for _ in iter(lambda: reader.read(1024*1024), b''):
+                pass
+
+            return reader.sha256.hexdigest()
+
+    def discard(self):
+        """Remove the received chunks"""
+        shutil.rmtree(self.chunkdir, ignore_errors=True)
+
+
+class ChunksReader(io.RawIOBase):
+    """Reader for the concatenated content of the given files, computing the SHA-256 while reading"""
+
+    def __init__(self, filenames):
+        super().__init__()
+
+        self.sha256 = hashlib.sha256()
+        self._filenames = list(filenames)
+        self._fhandle = None
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        while self._fhandle or self._filenames:
+            if self._fhandle is None:
+                self._fhandle = open(self._filenames.pop(0), 'rb')
+
+            count = self._fhandle.readinto(buf)
+
+            if count:
+                self.sha256.update(buf[:count])
+                return count
+
+            self._fhandle.close()
+            self._fhandle = None
+
+        return 0
+
+    def close(self):
+        if self._fhandle is not None:
+            self._fhandle.close()
+            self._fhandle = None
+
+        super().close()
+
+
+class ParsedOutput(Base):
+    """
+    Cache of the data parsed from output artifacts, to skip re-parsing
+    unchanged files with an unchanged parser.
+    """
+
+    content_hash = Column(String(64), primary_key=True)
+    code_id = Column(UUID(as_uuid=True),
+                     ForeignKey('code.id'),
+                     primary_key=True)
+    code = relationship("Code")
+    parser_version = Column(Integer, primary_key=True)
+    data = Column(JSONB, nullable=False)
+    ctime = Column(DateTime, nullable=False, default=dt.now)
+
+    def __repr__(self):
+        return "<ParsedOutput(content_hash='{}', parser_version={})>".format(
+            self.content_hash, self.parser_version)
+
 
 class TestResult2(Base):
     id = UUIDPKColumn()
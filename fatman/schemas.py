@@ -2,7 +2,6 @@
 import collections
 
 from webargs import fields
-from marshmallow import pre_dump
 
 from . import ma
 from .models import (
@@ -20,8 +19,6 @@ from .models import (
     TestResult2Collection,
     )
 
-from .tools import json2atoms
-
 
 # Custom fields:
 
@@ -66,7 +63,11 @@ class ArtifactSchema(ma.SQLAlchemyAutoSchema):
         'view': ma.AbsoluteURLFor('artifactviewresource', aid='<id>'),
         })
 
-    metadata = fields.Dict(attribute='mdata')
+    metadata = fields.Method('get_metadata')
+
+    def get_metadata(self, obj):
+        # the bz2 block index is for internal use and can get large
+        return {k: v for k, v in obj.mdata.items() if k != 'bz2_index'}
 
     class Meta:
         model = Artifact
@@ -107,6 +108,7 @@ class CalculationCollectionSchema(ma.SQLAlchemyAutoSchema):
     _links = ma.Hyperlinks({
         'self': ma.AbsoluteURLFor('calculationcollectionresource', ccid='<id>'),
         'collection': ma.AbsoluteURLFor('calculationcollectionlistresource'),
+        'outputs': ma.AbsoluteURLFor('calculationcollectionoutputstarresource', ccid='<id>'),
         })
 
     class Meta:
@@ -205,7 +207,7 @@ class CalculationSchema(CalculationListSchema):
 
 class CalculationListActionSchema(ma.Schema):
     generateResults = fields.Nested(
-        {'update': fields.Boolean(missing=False)},
+        {'update': fields.Boolean(missing=False), 'incremental': fields.Boolean(missing=False)},
         strict=True)
 
     class Meta:
@@ -224,6 +226,8 @@ class Task2ListSchema(ma.Schema):
         'self': ma.AbsoluteURLFor('task2resource', tid='<id>'),
         'collection': ma.AbsoluteURLFor('task2listresource'),
         'uploads': ma.AbsoluteURLFor('task2uploadresource', tid='<id>'),
+        'uploadsessions': ma.AbsoluteURLFor('uploadsessionlistresource', tid='<id>'),
+        'inputs': ma.AbsoluteURLFor('task2inputstarresource', tid='<id>'),
         'calculation': ma.AbsoluteURLFor('calculationresource', cid='<calculation_id>'),
         })
 
@@ -238,6 +242,26 @@ class Task2Schema(Task2ListSchema, ma.SQLAlchemyAutoSchema):
         model = Task2
 
 
+class UploadSessionSchema(ma.Schema):
+    id = fields.UUID()
+    name = fields.Str()
+    compressed = fields.Str()
+    ctime = fields.DateTime()
+    chunks = fields.Method('get_chunks')
+    state = fields.Str()
+    message = fields.Str()
+    artifact = fields.Nested(ArtifactSchema)  # the stored artifact once committed
+
+    _links = ma.Hyperlinks({
+        'self': ma.AbsoluteURLFor('uploadsessionresource', tid='<task_id>', sid='<id>'),
+        'task': ma.AbsoluteURLFor('task2resource', tid='<task_id>'),
+        })
+
+    def get_chunks(self, obj):
+        # the chunks already received, to know where to resume
+        return [{'number': num, 'size': size} for num, size in obj.chunks()]
+
+
 class BaseStructureSchema(ma.SQLAlchemyAutoSchema):
     calculations = fields.Nested(CalculationListSchema, many=True,
                                  exclude=('structure', ))
@@ -266,42 +290,47 @@ class BaseStructureSchema(ma.SQLAlchemyAutoSchema):
 
 
 class StructureSchema(BaseStructureSchema):
-    @pre_dump
+    # the chemical formula, net charge and the other descriptors are stored columns,
+    # the ase_structure only gets decoded if the per-atom data is requested
+    _atoms_obj = None
+
     def parse_ase_struct(self, obj):
         # we can't assign to obj since it is a SQLA model
-        self._atoms = json2atoms(obj.ase_structure)
-        return obj
+        if obj is not self._atoms_obj:
+            self._atoms = obj.get_atoms()
+            self._atoms_obj = obj
 
-    def get_chemical_formula(self, _):
-        return self._atoms.get_chemical_formula()
+        return self._atoms
 
-    def get_chemical_symbols(self, _):
-        return self._atoms.get_chemical_symbols()
+    def get_chemical_symbols(self, obj):
+        return self.parse_ase_struct(obj).get_chemical_symbols()
 
-    def get_initial_charges(self, _):
-        return self._atoms.get_initial_charges().tolist()
+    def get_initial_charges(self, obj):
+        return self.parse_ase_struct(obj).get_initial_charges().tolist()
 
-    def get_net_initial_charge(self, _):
-        return sum(self._atoms.get_initial_charges().tolist())
+    def get_atomic_numbers(self, obj):
+        return self.parse_ase_struct(obj).get_atomic_numbers().tolist()
 
-    def get_atomic_numbers(self, _):
-        return self._atoms.get_atomic_numbers().tolist()
-
-    chemical_formula = fields.Method('get_chemical_formula')
     chemical_symbols = fields.Method('get_chemical_symbols')
     initial_charges = fields.Method('get_initial_charges')
-    net_initial_charge = fields.Method('get_net_initial_charge')
     atomic_numbers = fields.Method('get_atomic_numbers')
 
 
-class StructureListSchema(BaseStructureSchema):
-    class Meta:
-        model = Structure
-        exclude = (
-            'calculations',
-            'ase_structure',
-            'default_settings',
-            )
+class StructureListSchema(ma.Schema):
+    """The projection of structures used in listings, dumped from rows rather than model instances"""
+
+    id = fields.UUID()
+    name = fields.Str()
+    sets = fields.List(fields.Str())
+    chemical_formula = fields.Str()
+    natoms = fields.Int()
+    replaced_by = fields.Function(lambda obj: {'id': str(obj.replaced_by_id)} if obj.replaced_by_id else None)
+
+    _links = ma.Hyperlinks({
+        'self': ma.AbsoluteURLFor('structureresource_v2', sid='<id>'),
+        'collection': ma.AbsoluteURLFor('structurelistresource_v2'),
+        'download': ma.AbsoluteURLFor('structuredownloadresource', sid='<id>'),
+        })
 
 
 class StructureSetSchema(ma.SQLAlchemyAutoSchema):
@@ -1,16 +1,23 @@
 
 import bz2
 from collections import OrderedDict
-from urllib.parse import urlsplit
+import copy
 import datetime as dt
+import io
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
 
 from ase.units import kcal, mol
 
+from billiard.pool import Pool
 from celery.utils.log import get_task_logger
 from celery import group
 
-from sqlalchemy import and_
-from sqlalchemy.orm import joinedload, contains_eager, aliased
+from sqlalchemy import and_, tuple_, bindparam, Text
+from sqlalchemy.orm import joinedload, selectinload, contains_eager, aliased, load_only
+from sqlalchemy.dialects.postgresql import insert, JSONB, ARRAY
 
 from . import capp, resultfiles, tools, db, cache
 from .models import (
@@ -22,15 +29,26 @@ from .models import (
     Task2,
     Calculation,
     TaskStatus,
+    Artifact,
+    Task2Artifact,
+    Blob,
+    ParsedOutput,
     TestResult2,
     TestResult2Collection,
     TestResult2Calculation,
+    UploadSession,
     BasisSet,
     Pseudopotential,
+    open_artifact_file,
+    artifact_filepath,
+    results_folder,
+    upload_compression,
+    add_output_artifact,
+    UPLOAD_SETS,
     )
+from .tools.compression import CompressingReader
 
 from .tools import (
-    json2atoms,
     parsers,
     checks,
     nodehours_from_job_data,
@@ -144,6 +162,12 @@ def calculate_deltatest(self, tid, rid, trid=None):
                         result.id, test.name, method.id, rid)
             return False
 
+        if result.task.structure.volume is None:
+            logger.info(("cell of the structure for %s does not span a volume to calculate %s value"
+                         " for Method %s from result %s, skipping"),
+                        result.id, test.name, method.id, rid)
+            return False
+
     lock_id = '{}-lock-{}-method-{}'.format(self.name, test.name, method.id)
     if not cache.cache.add(lock_id, True, 60*60):
         # another task is already calculating the deltavalue for this result
@@ -158,11 +182,11 @@ def calculate_deltatest(self, tid, rid, trid=None):
         natom = 0
 
         for result in results:
-            struct = json2atoms(result.task.structure.ase_structure)
-            natom = len(struct.get_atomic_numbers())
+            struct = result.task.structure
+            natom = struct.natoms
 
             energies.append(result.data['total_energy']/natom)
-            volumes.append(struct.get_volume()/natom)
+            volumes.append(struct.volume/natom)
 
         v, e, B0, B1, R = deltatest_ev_curve(volumes, energies)
 
@@ -319,8 +343,126 @@ def postprocess_result(rid, update=False):
         return False
 
 
+def _get_result_artifact(calc, task):
+    """Get the output artifact of the task to be parsed for the calculation results"""
+
+    if calc.code.name == 'CP2K':
+        resultfile_name = 'calc.out'
+    else:
+        logger.error("calculation %s: no parser available (yet) for code %s",
+                     calc.id, calc.code.name)
+        return None
+
+    try:
+        # the artifacts are already loaded via lazy='joined', can't use task.outfiles for querying
+        return [a for a in task.outfiles if a.name == resultfile_name][0]
+    except IndexError:
+        logger.info("calculation %s: no artifact with name '%s' linked to task %s",
+                    calc.id, resultfile_name, task.id)
+        return None
+
+
+def _parse_artifact_file(source, metadata, code, sections=None):
+    """
+    Parse an output artifact given its stored content (see Artifact.source), to be run in a pool process.
+
+    Returns:
+        A tuple of the parsed data and None, or None and an error message
+    """
+
+    try:
+        with open_artifact_file(source, metadata, 'rt') as fhandle:
+            return parsers.get_data_from_output(fhandle, code, sections), None
+    except (parsers.OutputParseError, RuntimeError, OSError) as exc:
+        return None, str(exc)
+
+
+def _outdated_sections(calc, content_hash):
+    """
+    Get the sections which are missing in the calculation results or were extracted by an older parser.
+
+    Returns:
+        the list of sections or None if the results have to be regenerated completely: when they were
+        extracted from a different output (see content_hash) or the parser has no versioned sections
+    """
+
+    section_versions = parsers.SECTION_VERSIONS[calc.code.name]
+
+    if not section_versions or calc.results.get('content_hash') != content_hash:
+        return None
+
+    versions = calc.results.get('parser_versions', {})
+
+    return [section for section, version in section_versions.items()
+            if versions.get(section) != version]
+
+
+def _complete_results(calc, data, content_hash):
+    """
+    Generate the calculation results from the data parsed from the output with the given content hash
+    by adding the hash, the parser versions and the checks
+    """
+
+    results = copy.deepcopy(data)
+    results['content_hash'] = content_hash
+    results['parser_versions'] = dict(parsers.SECTION_VERSIONS[calc.code.name])
+
+    try:
+        results['checks'] = checks.generate_checks_dict(results, calc.code.name, calc.test.name)
+    except NotImplementedError:
+        logger.error("no data checking implemented for code: %s", calc.code.name)
+
+    return results
+
+
+def _results_patch(calc, data, sections):
+    """
+    Merge the newly extracted sections into the existing calculation results.
+
+    Returns:
+        A dict with the changed top-level keys and a list of the keys to remove
+    """
+
+    results = copy.deepcopy(calc.results)
+
+    for section in sections:
+        if section in data:
+            results[section] = data[section]
+        else:
+            results.pop(section, None)
+
+    results = _complete_results(calc, results, calc.results['content_hash'])
+
+    patch = {k: v for k, v in results.items() if calc.results.get(k) != v}
+    removed = [k for k in calc.results if k not in results]
+
+    return patch, removed
+
+
+def _apply_results_patches(patches):
+    """
+    Apply partial updates to the results of multiple calculations in one statement.
+
+    Args:
+        patches: list of tuples of the calculation ID, the changed keys and the keys to remove
+    """
+
+    if not patches:
+        return
+
+    table = Calculation.__table__
+    stmt = (table.update()
+            .where(table.c.id == bindparam('calc_id'))
+            .values(results=(table.c.results
+                             .op('||')(bindparam('patch', type_=JSONB))
+                             .op('-')(bindparam('removed', type_=ARRAY(Text))))))
+
+    db.session.execute(stmt, [{'calc_id': cid, 'patch': patch, 'removed': removed}
+                              for cid, patch, removed in patches])
+
+
 @capp.task
-def generate_calculation_results(calc_id, update=False):
+def generate_calculation_results(calc_id, update=False, incremental=False):
     """
     Parse the outputs attached to the first succeeded task for the given calculation,
     if the calculation does not have any results yet.
@@ -328,6 +470,10 @@ def generate_calculation_results(calc_id, update=False):
     Args:
         update: update the results if they already exist, careful: test results
                 based on this calculation are not automatically updated!
+        incremental: for existing results extract only the sections which are missing
+                     or were extracted by an older version of the parser and update
+                     only those (all if they were extracted from a different output),
+                     skipping the write if nothing changed
     """
     calc = (Calculation.query
             .with_for_update(of=Calculation)
@@ -338,7 +484,9 @@ def generate_calculation_results(calc_id, update=False):
         logger.error("calculation %s: not found")
         return False
 
-    if calc.results_available and not update:
+    incremental = incremental and calc.results_available
+
+    if calc.results_available and not (update or incremental):
         logger.info("calculation %s: has already a result and update=False, skipping", calc.id)
         return False
 
@@ -354,69 +502,277 @@ def generate_calculation_results(calc_id, update=False):
 
     logger.info("calculation %s: taking results from task %s", calc.id, task.id)
 
-    if calc.code.name == 'CP2K':
-        resultfile_name = 'calc.out'
-    else:
-        logger.error("calculation %s: no parser available (yet) for code %s",
-                     calc.id, task.calculation.code.name)
+    artifact = _get_result_artifact(calc, task)
+
+    if artifact is None:
         return False
 
     try:
-        # the artifacts are already loaded via lazy='joined', can't use task.outfiles for querying
-        artifact = [a for a in task.outfiles if a.name == resultfile_name][0]
-    except IndexError:
-        logger.info("calculation %s: no artifact with name '%s' linked to task %s",
-                    calc.id, resultfile_name, task.id)
+        content_hash = artifact.content_hash()
+    except (RuntimeError, OSError) as exc:
+        logger.error("calculation %s: can not open artifact %s: %s", calc.id, artifact.id, exc)
         return False
 
-    scheme, nwloc, path, _, _ = urlsplit(artifact.path)
+    # None means all sections (a complete parse)
+    sections = None
 
-    results = None
+    if incremental:
+        sections = _outdated_sections(calc, content_hash)
 
-    if scheme == 'fkup' and nwloc == 'results':
-        filepath = resultfiles.path(path[1:])
+        if sections == []:
+            logger.info("calculation %s: results are up to date, skipping", calc.id)
+            return False
 
-        # Artifact.name contains a full path, including possible subdirs
-        compressed = artifact.mdata.get('compressed', None)
+    try:
+        fhandle = artifact.open('rt', workers=capp.conf.ARTIFACT_DECOMPRESSION_WORKERS)
+    except (RuntimeError, OSError) as exc:
+        logger.error("calculation %s: can not open artifact %s: %s", calc.id, artifact.id, exc)
+        return False
 
-        if compressed is None:
-            with open(filepath, 'r') as fhandle:
-                results = parsers.get_data_from_output(fhandle, calc.code.name)
-        elif compressed == 'bz2':
-            with bz2.open(filepath, mode='rt') as fhandle:
-                results = parsers.get_data_from_output(fhandle, calc.code.name)
-        else:
-            logger.error("unsupported compression scheme found: %s", compressed)
-            return False
+    parser_version = parsers.PARSER_VERSIONS[calc.code.name]
+    parsed = ParsedOutput.query.get((content_hash, calc.code_id, parser_version))
 
-        try:
-            results['checks'] = checks.generate_checks_dict(results, calc.code.name, calc.test.name)
-        except NotImplementedError:
-            logger.error("no data checking implemented for code: %s", calc.code.name)
+    if parsed is not None:
+        logger.info("calculation %s: using cached data for artifact %s", calc.id, artifact.id)
+        fhandle.close()
+        data = parsed.data
+    elif sections is not None:
+        logger.info("calculation %s: extracting sections %s", calc.id, ", ".join(sections))
 
+        with fhandle:
+            data = parsers.get_data_from_output(fhandle, calc.code.name, sections)
     else:
-        logger.error("unsupported storage scheme found: %s", scheme)
-        return False
+        with fhandle:
+            data = parsers.get_data_from_output(fhandle, calc.code.name)
+
+        # the same output may be parsed concurrently by another task
+        db.session.execute(insert(ParsedOutput.__table__)
+                           .values(content_hash=content_hash, code_id=calc.code_id,
+                                   parser_version=parser_version, data=data, ctime=dt.datetime.now())
+                           .on_conflict_do_nothing())
+
+    if sections is not None:
+        patch, removed = _results_patch(calc, data, sections)
+
+        if not patch and not removed:
+            logger.info("calculation %s: results unchanged", calc.id)
+            return False
+
+        _apply_results_patches([(calc.id, patch, removed)])
+        db.session.commit()
+
+        return True
 
-    if not results:
+    if not data:
         logger.error("calculation %s: no parseable data found in artifact %s",
                      calc.id, artifact.id)
         return False
 
+    results = _complete_results(calc, data, content_hash)
+
+    if incremental and results == calc.results:
+        logger.info("calculation %s: results unchanged", calc.id)
+        return False
+
     calc.results = results
     db.session.commit()
 
     return True
 
 
+@capp.task
+def generate_calculation_results_batch(calc_ids, update=False, incremental=False):
+    """
+    Generate the results for a batch of calculations.
+
+    Unlike generate_calculation_results the outputs not found in the cache are parsed
+    on a local process pool and the results are written back in a single bulk update.
+    The calculations are only locked for that update, calculations locked by another
+    transaction at that point are skipped.
+
+    Args:
+        calc_ids: The calculation IDs
+        update: update the results if they already exist
+        incremental: update only missing or outdated sections of existing results,
+                     see generate_calculation_results
+
+    Returns:
+        The number of updated calculations
+    """
+
+    # reading and parsing the outputs may take a while, the rows get locked only for writing the results
+    calcs = (Calculation.query
+             .options(joinedload('code'))
+             .filter(Calculation.id.in_(calc_ids))
+             .all())
+
+    if not (update or incremental):
+        calcs = [c for c in calcs if not c.results_available]
+
+    # the latest successfully finished task for each calculation
+    tasks = (Task2.query
+             .join(Task2.status)
+             .filter(TaskStatus.name == 'done')
+             .filter(Task2.calculation_id.in_([c.id for c in calcs]))
+             .options(selectinload('outfiles'))
+             .order_by(Task2.calculation_id, Task2.mtime.desc())
+             .distinct(Task2.calculation_id))
+    tasks = {t.calculation_id: t for t in tasks}
+
+    jobs = []
+
+    for calc in calcs:
+        task = tasks.get(calc.id)
+
+        if task is None:
+            logger.info("calculation %s: no successfully finished task found, skipping", calc.id)
+            continue
+
+        artifact = _get_result_artifact(calc, task)
+
+        if artifact is None:
+            continue
+
+        try:
+            key = (artifact.content_hash(), calc.code_id, parsers.PARSER_VERSIONS[calc.code.name])
+        except (RuntimeError, OSError) as exc:
+            logger.error("calculation %s: can not open artifact %s: %s", calc.id, artifact.id, exc)
+            continue
+
+        # None means all sections (a complete parse)
+        sections = None
+
+        if incremental and calc.results_available:
+            sections = _outdated_sections(calc, key[0])
+
+            if sections == []:
+                logger.info("calculation %s: results are up to date, skipping", calc.id)
+                continue
+
+            if sections is not None:
+                sections = tuple(sections)
+
+        jobs.append((calc, artifact, key, sections))
+
+    cached = {}
+
+    if jobs:
+        pkey = tuple_(ParsedOutput.content_hash, ParsedOutput.code_id, ParsedOutput.parser_version)
+        for parsed in ParsedOutput.query.filter(pkey.in_([key for _, _, key, _ in jobs])):
+            cached[(parsed.content_hash, parsed.code_id, parsed.parser_version)] = parsed.data
+
+    # parse each file only once for the same sections, even if used by multiple calculations
+    toparse = OrderedDict(((key, sections), (artifact.source, artifact.mdata, calc.code.name, sections))
+                          for calc, artifact, key, sections in jobs if key not in cached)
+
+    processes = capp.conf.CALCULATION_RESULTS_PROCESSES
+
+    if processes and len(toparse) > 1:
+        # billiard (Celery's fork of multiprocessing) permits children of the daemonic prefork workers
+        pool = Pool(processes)
+
+        try:
+            parsed = pool.starmap(_parse_artifact_file, toparse.values())
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        parsed = [_parse_artifact_file(*args) for args in toparse.values()]
+
+    extracted = {}
+    outputs = []
+
+    for (key, sections), (data, error) in zip(toparse, parsed):
+        if error is not None:
+            logger.error("parsing artifact with hash %s failed: %s", key[0], error)
+            continue
+
+        extracted[(key, sections)] = data
+
+        # only complete parses go to the cache
+        if sections is None:
+            outputs.append({'content_hash': key[0], 'code_id': key[1], 'parser_version': key[2],
+                            'data': data, 'ctime': dt.datetime.now()})
+
+    if outputs:
+        # the same output may be parsed concurrently by another task
+        db.session.execute(insert(ParsedOutput.__table__).values(outputs).on_conflict_do_nothing())
+
+    db.session.commit()
+
+    jobs = [job for job in jobs if job[2] in cached or (job[2], job[3]) in extracted]
+
+    # reload the results of the calculations under the lock, they may have changed in the meantime
+    locked = set()
+
+    if jobs:
+        locked = {calc.id for calc in (Calculation.query
+                                       .with_for_update(of=Calculation, skip_locked=True)
+                                       .options(joinedload('code'), joinedload('test'))
+                                       .populate_existing()
+                                       .filter(Calculation.id.in_([calc.id for calc, _, _, _ in jobs])))}
+
+    updates = []
+    patches = []
+
+    for calc, artifact, key, sections in jobs:
+        data = cached.get(key, extracted.get((key, sections)))
+
+        if calc.id not in locked:
+            logger.info("calculation %s: locked by another transaction, skipping", calc.id)
+            continue
+
+        if not (update or incremental) and calc.results_available:
+            logger.info("calculation %s: results were generated in the meantime, skipping", calc.id)
+            continue
+
+        if sections is not None:
+            outdated = _outdated_sections(calc, key[0]) if calc.results_available else None
+
+            if outdated is None or not set(outdated) <= set(sections):
+                logger.info("calculation %s: results were changed in the meantime, skipping", calc.id)
+                continue
+
+            patch, removed = _results_patch(calc, data, sections)
+
+            if patch or removed:
+                patches.append((calc.id, patch, removed))
+            continue
+
+        if not data:
+            logger.error("calculation %s: no parseable data found in artifact %s",
+                         calc.id, artifact.id)
+            continue
+
+        results = _complete_results(calc, data, key[0])
+
+        if results == calc.results:
+            continue
+
+        updates.append({'id': calc.id, 'results': results})
+
+    db.session.bulk_update_mappings(Calculation, updates)
+    _apply_results_patches(patches)
+    db.session.commit()
+
+    logger.info("generated results for %d and updated results for %d of %d calculations",
+                len(updates), len(patches), len(calc_ids))
+
+    return len(updates) + len(patches)
+
+
 @capp.task(bind=True)
-def generate_all_calculation_results(self, update=False):
+def generate_all_calculation_results(self, update=False, batch_size=None, incremental=False):
     """
     Parse all calculation task outputs and generate the results
     if not already present.
 
     Args:
         update: rewrite the results even if they already exist
+        batch_size: number of calculations to process per task,
+                    defaults to CALCULATION_RESULTS_BATCH_SIZE, 0 for one task per calculation
+        incremental: update only missing or outdated sections of existing results,
+                     see generate_calculation_results
 
     Returns:
         A tuple of a list of calculation ids and a group task
@@ -432,7 +788,7 @@ def generate_all_calculation_results(self, update=False):
              .filter(TaskStatus.name == 'done')
              .order_by(Task2.mtime.desc()))
 
-    if not update:
+    if not (update or incremental):
         calcs = calcs.filter(Calculation.results_available == False)
 
     # execute the query to check whether we have anything to do
@@ -443,8 +799,486 @@ def generate_all_calculation_results(self, update=False):
         logger.info("no calculations found which require processing")
         return
 
+    if batch_size is None:
+        batch_size = capp.conf.CALCULATION_RESULTS_BATCH_SIZE
+
+    if batch_size:
+        # replace the task with a group task for batches of calculations
+        batches = [[c.id for c in calcs[i:i+batch_size]] for i in range(0, len(calcs), batch_size)]
+        raise self.replace(group(generate_calculation_results_batch.s(b, update, incremental) for b in batches))
+
     # replace the task with a group task for the single calculations
-    raise self.replace(group(generate_calculation_results.s(c.id, update) for c in calcs))
+    raise self.replace(group(generate_calculation_results.s(c.id, update, incremental) for c in calcs))
+
+
+@capp.task
+def generate_artifact_index(aid, update=False):
+    """
+    Build the block index of a bz2 compressed artifact,
+    permitting random access and parallel decompression of its content.
+
+    Args:
+        aid: The artifact ID
+        update: rebuild the index even if it already exists
+    """
+
+    artifact = Artifact.query.get(aid)
+
+    if artifact is None:
+        logger.error("artifact %s: not found", aid)
+        return False
+
+    if artifact.mdata.get('compressed', None) != 'bz2':
+        logger.info("artifact %s: not bz2 compressed, no index required", aid)
+        return False
+
+    if 'bz2_index' in artifact.mdata and not update:
+        logger.info("artifact %s: index already present", aid)
+        return False
+
+    try:
+        artifact.build_index(workers=capp.conf.ARTIFACT_DECOMPRESSION_WORKERS)
+    except (RuntimeError, ValueError, OSError) as exc:
+        logger.error("artifact %s: building the index failed: %s", aid, exc)
+        return False
+
+    db.session.commit()
+
+    return True
+
+
+@capp.task(bind=True)
+def generate_all_artifact_indexes(self, update=False):
+    """
+    Build the block indexes of all bz2 compressed artifacts
+    if not already present.
+
+    Args:
+        update: rebuild the indexes even if they already exist
+    """
+
+    aids = db.session.query(Artifact.id).filter(Artifact.mdata['compressed'].astext == 'bz2')
+
+    if not update:
+        aids = aids.filter(~Artifact.mdata.has_key('bz2_index'))
+
+    aids = aids.all()
+
+    if not aids:
+        # Celery does not like empty groups, end it here
+        logger.info("no artifacts found which require indexing")
+        return
+
+    raise self.replace(group(generate_artifact_index.s(a.id, update) for a in aids))
+
+
+@capp.task
+def delete_unreferenced_blobs():
+    """
+    Delete the blobs of the content-addressed artifact storage
+    which are no longer referenced by any artifact.
+    """
+
+    # skip blobs currently getting a new reference, see Blob.store()
+    blobs = (Blob.query
+             .filter(Blob.refcount <= 0)
+             .with_for_update(skip_locked=True)
+             .all())
+
+    for blob in blobs:
+        try:
+            os.unlink(Blob.filepath(blob.sha256))
+        except FileNotFoundError:
+            logger.warning("blob %s: file already removed", blob.sha256)
+
+        db.session.delete(blob)
+
+    db.session.commit()
+
+    logger.info("deleted %d unreferenced blobs", len(blobs))
+    return len(blobs)
+
+
+def _list_files(dirpath):
+    """List the files below the given directory with the time of their last change"""
+
+    files = []
+
+    for root, _, filenames in os.walk(dirpath):
+        for filename in filenames:
+            filepath = os.path.join(root, filename)
+
+            try:
+                stat = os.lstat(filepath)
+            except FileNotFoundError:
+                continue
+
+            files.append((filepath, max(stat.st_mtime, stat.st_ctime)))
+
+    return files
+
+
+def _known_files():
+    """The paths of all files referenced by artifacts, blobs and (legacy) results"""
+
+    known = set()
+
+    for apath, in (db.session.query(Artifact.path)
+                   .filter(Artifact.path.like('fkup://%'))
+                   .yield_per(10000)):
+        try:
+            known.add(artifact_filepath(apath))
+        except RuntimeError:
+            pass
+
+    known.update(Blob.filepath(sha256) for sha256, in db.session.query(Blob.sha256).yield_per(10000))
+    known.update(resultfiles.path(filename) for filename, in (db.session.query(Result.filename)
+                                                             .filter(Result.filename != None)
+                                                             .yield_per(10000)))
+
+    return known
+
+
+@capp.task
+def collect_artifact_garbage(batch_size=1000, scan=True, dry_run=False):
+    """
+    Delete the artifacts which are no longer linked to any task (left behind when deleting
+    calculations in bulk) together with their files, the blobs no longer referenced and,
+    if scan is set, the files in the results and cold storage no artifact refers to
+    (left over from failed uploads or interrupted moves) which have not been changed
+    within the last ARTIFACT_GC_MIN_AGE hours.
+
+    With dry_run nothing gets deleted, only the numbers are determined.
+
+    Returns:
+        a dict with the number of deleted artifacts, blobs and orphaned files
+    """
+
+    counts = {'artifacts': 0, 'blobs': 0, 'files': 0}
+
+    unlinked = (Artifact.query
+                .options(load_only('id', 'path'))
+                .filter(~db.session.query(Task2Artifact)
+                        .filter(Task2Artifact.artifact_id == Artifact.id)
+                        .exists()))
+
+    if dry_run:
+        counts['artifacts'] = unlinked.count()
+    else:
+        while True:
+            # artifacts are created and linked in the same transaction,
+            # hence uncommitted new ones are not visible here
+            artifacts = unlinked.with_for_update(skip_locked=True).limit(batch_size).all()
+
+            if not artifacts:
+                break
+
+            filepaths = [artifact.filepath for artifact in artifacts if artifact.path.startswith('fkup://')]
+
+            # deleting them via the session releases their blobs, see models.release_artifact_blob
+            for artifact in artifacts:
+                db.session.delete(artifact)
+
+            db.session.commit()
+
+            for filepath in filepaths:
+                try:
+                    os.unlink(filepath)
+                except FileNotFoundError:
+                    logger.warning("artifact file %s: already removed", filepath)
+
+            counts['artifacts'] += len(artifacts)
+            logger.info("deleted %d unlinked artifacts", counts['artifacts'])
+
+        counts['blobs'] = delete_unreferenced_blobs()
+
+    if not scan:
+        return counts
+
+    cutoff = (dt.datetime.now() - dt.timedelta(hours=capp.conf.ARTIFACT_GC_MIN_AGE)).timestamp()
+
+    # list the files first: files added in between belong to artifacts which are then known
+    dirpaths = []
+
+    for uploadset in UPLOAD_SETS.values():
+        rootdir = uploadset.path('')
+
+        if not os.path.isdir(rootdir):
+            continue
+
+        for entry in os.scandir(rootdir):
+            # chunks of upload sessions get removed by delete_stale_upload_sessions
+            if entry.is_dir(follow_symlinks=False) and not (uploadset is resultfiles and entry.name == 'uploads'):
+                dirpaths.append(entry.path)
+
+    with ThreadPoolExecutor(capp.conf.ARTIFACT_GC_WORKERS) as executor:
+        files = [f for dirfiles in executor.map(_list_files, dirpaths) for f in dirfiles]
+
+    known = _known_files()
+
+    for filepath, mtime in files:
+        if mtime >= cutoff or filepath in known:
+            continue
+
+        counts['files'] += 1
+
+        if dry_run:
+            logger.info("orphaned file %s", filepath)
+            continue
+
+        try:
+            os.unlink(filepath)
+        except FileNotFoundError:
+            pass
+
+    logger.info("%s %d orphaned files", "found" if dry_run else "deleted", counts['files'])
+    return counts
+
+
+# artifacts stored in the flat results/<task id>/<artifact id> layout
+FLAT_LAYOUT_PATTERN = r'^fkup://results/[0-9a-f-]{36}/[^/]+$'
+
+
+@capp.task
+def migrate_artifact_layout(batch_size=500):
+    """
+    Move the artifacts stored in the flat layout to the fanned out one (see models.results_folder)
+    and rewrite their paths, committing after each batch.
+
+    This can run while the application is serving: a file is hard-linked at the new location
+    and the old one gets removed only once the new path has been committed.
+
+    Returns:
+        the number of moved artifacts
+    """
+
+    moved = 0
+    failed = set()
+
+    while True:
+        query = (Artifact.query
+                 .filter(Artifact.path.op('~')(FLAT_LAYOUT_PATTERN))
+                 .with_for_update(skip_locked=True)
+                 .limit(batch_size))
+
+        if failed:
+            query = query.filter(~Artifact.id.in_(failed))
+
+        artifacts = query.all()
+
+        if not artifacts:
+            break
+
+        oldfiles = []
+
+        for artifact in artifacts:
+            oldfile = artifact.filepath
+            tid, name = urlsplit(artifact.path).path[1:].split('/')
+            newpath = "fkup://results/{}/{}".format(results_folder(tid), name)
+            newfile = resultfiles.path(urlsplit(newpath).path[1:])
+
+            os.makedirs(os.path.dirname(newfile), exist_ok=True)
+
+            try:
+                os.link(oldfile, newfile)
+            except FileExistsError:
+                # left over from an interrupted run
+                if not os.path.samefile(oldfile, newfile):
+                    logger.error("artifact %s: %s exists already with a different content", artifact.id, newfile)
+                    failed.add(artifact.id)
+                    continue
+            except OSError as exc:
+                logger.error("artifact %s: can not link %s: %s", artifact.id, oldfile, exc)
+                failed.add(artifact.id)
+                continue
+
+            artifact.path = newpath
+            oldfiles.append(oldfile)
+
+        db.session.commit()
+
+        for oldfile in oldfiles:
+            os.unlink(oldfile)
+
+            try:
+                # remove the task folder once empty
+                os.rmdir(os.path.dirname(oldfile))
+            except OSError:
+                pass
+
+        moved += len(oldfiles)
+        logger.info("moved %d artifacts to the fanned out layout, %d failed", moved, len(failed))
+
+    return moved
+
+
+@capp.task
+def tier_superseded_artifacts(batch_size=100):
+    """
+    Recompress and/or move the output artifacts of superseded tasks to the cold storage
+    according to the ARTIFACT_TIERING_* settings, committing after each batch.
+    The artifacts remain readable, their original storage is recorded in the metadata.
+
+    Returns:
+        the number of moved artifacts
+    """
+
+    codec = capp.conf.ARTIFACT_TIERING_CODEC
+    cold = capp.conf.ARTIFACT_TIERING_COLD
+
+    if codec is None and not cold:
+        logger.info("no tiering policy configured")
+        return 0
+
+    # the current task is the latest one, see Calculation.current_task
+    current = (db.session.query(Task2.id)
+               .order_by(Task2.calculation_id, Task2.ctime.desc())
+               .distinct(Task2.calculation_id))
+
+    cutoff = dt.datetime.now() - dt.timedelta(days=capp.conf.ARTIFACT_TIERING_MIN_AGE)
+
+    moved = 0
+    failed = set()
+
+    while True:
+        # blobs may be shared with current tasks and inline artifacts are small, skip them
+        query = (Artifact.query
+                 .join(Task2Artifact, and_(Task2Artifact.artifact_id == Artifact.id,
+                                           Task2Artifact.linktype == 'output'))
+                 .join(Task2, Task2.id == Task2Artifact.task_id)
+                 .filter(Task2.mtime < cutoff)
+                 .filter(~Task2.id.in_(current.subquery()))
+                 .filter(Artifact.path.like('fkup://%'))
+                 .filter(~Artifact.mdata.has_key('tier'))
+                 .with_for_update(of=Artifact, skip_locked=True)
+                 .limit(batch_size))
+
+        if not cold:
+            # already stored with the requested codec, nothing to do for them
+            query = query.filter(Artifact.mdata['compressed'].astext.is_distinct_from(codec))
+
+        if failed:
+            query = query.filter(~Artifact.id.in_(failed))
+
+        artifacts = query.all()
+
+        if not artifacts:
+            break
+
+        oldfiles = []
+
+        for artifact in artifacts:
+            try:
+                oldfiles.append(artifact.move_to_tier(codec, cold,
+                                                      workers=capp.conf.ARTIFACT_DECOMPRESSION_WORKERS))
+            except (RuntimeError, ValueError, OSError) as exc:
+                logger.error("artifact %s: tiering failed: %s", artifact.id, exc)
+                failed.add(artifact.id)
+
+        db.session.commit()
+
+        for oldfile in oldfiles:
+            os.unlink(oldfile)
+
+        for artifact in artifacts:
+            if (artifact.id not in failed and artifact.mdata.get('compressed') == 'bz2'
+                    and 'bz2_index' not in artifact.mdata):
+                generate_artifact_index.delay(artifact.id)
+
+        moved += len(oldfiles)
+        logger.info("moved %d superseded artifacts, %d failed", moved, len(failed))
+
+    return moved
+
+
+@capp.task
+def commit_upload_session(sid, sha256):
+    """
+    Verify the SHA-256 of the content received by an upload session and store it as output artifact
+    of the task, compressing it if configured. The outcome is recorded in the state of the session.
+
+    Args:
+        sid: The upload session ID
+        sha256: The SHA-256 of the complete content as given by the client
+
+    Returns:
+        Whether the artifact got stored
+    """
+
+    session = UploadSession.query.with_for_update().get(sid)
+
+    if session is None or session.state != 'committing':
+        logger.error("upload session %s: not found or not being committed", sid)
+        return False
+
+    # the content is verified before it gets stored: a blob may be shared with other artifacts
+    digest = session.sha256()
+
+    if digest != sha256.lower():
+        session.state = 'failed'
+        session.message = "checksum mismatch: the uploaded content has SHA-256 {}".format(digest)
+        db.session.commit()
+
+        logger.info("upload session %s: %s", sid, session.message)
+        return False
+
+    compressed = session.compressed
+    size = sum(chunksize for _, chunksize in session.chunks())
+    data = io.BufferedReader(session.open())
+
+    if compressed is None:
+        compressed = upload_compression(session.name, size)
+
+        if compressed is not None:
+            data = io.BufferedReader(CompressingReader(data, compressed))
+
+    with data:
+        artifact = add_output_artifact(session.task, session.name, compressed, data, size)
+
+    session.state = 'committed'
+    session.message = None
+    session.artifact = artifact
+    db.session.commit()
+    session.discard()
+
+    if compressed == 'bz2':
+        # index the blocks once to get random access for all future reads
+        generate_artifact_index.delay(artifact.id)
+
+    return True
+
+
+@capp.task
+def delete_stale_upload_sessions(max_age_days=7):
+    """
+    Delete upload sessions which have not been committed within the given number of days,
+    and the chunks left over from sessions deleted together with their task.
+    """
+
+    # sessions currently being committed are locked, see commit_upload_session
+    sessions = (UploadSession.query
+                .filter(UploadSession.ctime < dt.datetime.now() - dt.timedelta(days=max_age_days))
+                .with_for_update(skip_locked=True)
+                .all())
+
+    for session in sessions:
+        db.session.delete(session)
+
+    db.session.commit()
+
+    for session in sessions:
+        session.discard()
+
+    # list the directories first: sessions created in between are then known
+    uploaddir = resultfiles.path('uploads')
+    dirnames = set(os.listdir(uploaddir)) if os.path.isdir(uploaddir) else set()
+    orphaned = dirnames - set(str(sid) for sid, in db.session.query(UploadSession.id))
+
+    for name in orphaned:
+        shutil.rmtree(os.path.join(uploaddir, name), ignore_errors=True)
+
+    logger.info("deleted %d stale upload sessions and %d orphaned chunk directories", len(sessions), len(orphaned))
+    return len(sessions) + len(orphaned)
 
 
 @capp.task(bind=True)
@@ -518,6 +1352,11 @@ def generate_test_result_deltatest(self, calc_id, update=False):
                 logger.error("total_energy missing for calculation %s to calculate deltatest value", calc.id)
                 return False
 
+            if calc.structure.volume is None:
+                logger.error("the cell of the structure of calculation %s does not span a volume"
+                             " to calculate deltatest value", calc.id)
+                return False
+
         energies = []
         volumes = []
         nodehours = {
@@ -527,10 +1366,9 @@ def generate_test_result_deltatest(self, calc_id, update=False):
             }
 
         for calc in calcs:
-            struct = json2atoms(calc.structure.ase_structure)
-
-            natoms_struct = len(struct.get_atomic_numbers())
-            volumes.append(struct.get_volume()/natoms_struct)  # the per-atom volume is independant of a MULTIPLE_UNIT_CELL
+            natoms_struct = calc.structure.natoms
+            # the per-atom volume is independant of a MULTIPLE_UNIT_CELL
+            volumes.append(calc.structure.volume/natoms_struct)
 
             # When normalizing the energy, we have to take the effect of a MULTIPLE_UNIT_CELL into account:
             # the parser extracts the final number of atoms per Kind from the ATOMIC KIND INFORMATION (AKI) section,
@@ -674,7 +1512,7 @@ def generate_test_result_GW100(calc_id, update=False):
             except (KeyError, AttributeError):
                 pass
 
-            gw_data = calc.results['GW_quasiparticle_energies']
+            gw_data = parsers.table_rows(calc.results['GW_quasiparticle_energies'])
 
             result_data['GW_quasiparticle_energies']['HOMO'] = max(
                 filter(lambda e: e['MO_type'] == 'occ', gw_data),
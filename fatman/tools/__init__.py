@@ -29,8 +29,8 @@ def atoms2json(structure, additional_information=None):
     return json.dumps(dct, sort_keys=True, cls=AseJsonEncoder)
 
 
-def json2atoms(jsonstring):
-    """Read a JSON string and return an Atoms object"""
+def _json2atoms_ase(jsonstring):
+    """Read a JSON string and return an Atoms object, using the ASE database row"""
 
     from ase.io.jsonio import decode
     from ase.db.row import AtomsRow
@@ -38,7 +38,105 @@ def json2atoms(jsonstring):
     dct = decode(jsonstring)
     row = AtomsRow(dct)
 
-    return row.toatoms(attach_calculator=False, add_additional_information=True)
+    try:
+        return row.toatoms(attach_calculator=False, add_additional_information=True)
+    except TypeError:  # removed in newer ASE versions
+        return row.toatoms(add_additional_information=True)
+
+
+def _json_array(value, dtype):
+    """Convert an array as encoded by ASE ({'__ndarray__': [shape, dtype, flat list]} or nested lists)"""
+
+    if value is None:
+        return None
+
+    if isinstance(value, dict):
+        shape, dtype, flat = value['__ndarray__']
+        return np.array(flat, dtype=dtype).reshape(shape)
+
+    return np.array(value, dtype=dtype)
+
+
+# the per-atom arrays stored by the ASE database row and the corresponding Atoms arguments
+_ATOMS_ARRAYS = [
+    ('initial_magmoms', 'magmoms', float),
+    ('initial_charges', 'charges', float),
+    ('tags', 'tags', int),
+    ('masses', 'masses', float),
+    ('momenta', 'momenta', float),
+    ]
+
+
+def json2atoms(jsonstring):
+    """
+    Read a JSON string as written by atoms2json and return an Atoms object.
+
+    The arrays are converted directly instead of going through the ASE
+    database row, yielding the same Atoms object as AtomsRow.toatoms().
+    """
+
+    import json
+    from ase import Atoms
+    from ase.db.row import AtomsRow
+
+    dct = json.loads(jsonstring)
+
+    if 'constraints' in dct or 'data' in dct:
+        # not written by atoms2json, leave those to ASE
+        return _json2atoms_ase(jsonstring)
+
+    kvp = dct.get('key_value_pairs') or {}
+
+    if any(key in dct or hasattr(AtomsRow, key) for key in kvp):
+        # the columns and properties of the row (like charge or natoms) take precedence over
+        # key-value pairs of the same name, leave resolving those to ASE
+        return _json2atoms_ase(jsonstring)
+
+    cell = dct.get('cell')
+    if isinstance(cell, dict) and '__ase_objtype__' in cell:  # an encoded ase.cell.Cell
+        cell = cell['array']
+
+    kwargs = {name: _json_array(dct.get(key), dtype) for key, name, dtype in _ATOMS_ARRAYS}
+
+    atoms = Atoms(numbers=_json_array(dct['numbers'], int),
+                  positions=_json_array(dct['positions'], float),
+                  cell=_json_array(cell, float),
+                  pbc=_json_array(dct.get('pbc'), bool),
+                  **kwargs)
+
+    atoms.info = {'unique_id': dct.get('unique_id')}
+
+    if kvp:
+        from ase.io.jsonio import decode
+        # rarely used, decode them like ASE does (converting int keys and encoded objects)
+        atoms.info['key_value_pairs'] = decode(json.dumps(kvp))
+
+    return atoms
+
+
+def atoms_descriptors(atoms):
+    """
+    Get the structural descriptors of an Atoms object stored alongside a structure,
+    see models.Structure (the volume is None if the cell does not span a volume)
+    """
+
+    magmoms = atoms.get_initial_magnetic_moments()
+    magmom = magmoms.sum(axis=0)
+
+    if magmoms.ndim > 1:  # non-collinear
+        magmom = np.linalg.norm(magmom)
+
+    volume = abs(np.linalg.det(np.array(atoms.get_cell())))
+
+    return {
+        'chemical_formula': atoms.get_chemical_formula(),
+        'natoms': len(atoms),
+        'elements': sorted(set(atoms.get_chemical_symbols())),
+        'volume': float(volume) if volume > 0 else None,
+        'pbc': [bool(p) for p in atoms.get_pbc()],
+        'net_initial_charge': float(atoms.get_initial_charges().sum()),
+        'initial_magnetic_moment': float(magmom),
+        }
 
 
 def nodehours_from_job_data(jobdata):
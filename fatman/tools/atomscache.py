@@ -0,0 +1,88 @@
+"""
+A bounded LRU cache for decoded ASE Atoms objects.
+
+Decoding a structure from its JSON representation is expensive compared to copying
+the resulting Atoms object. Since structures are never modified (a change creates a new
+structure replacing the old one), their decoded form can be cached by their ID.
+The entry of a structure gets evicted if its content is assigned anyway (in this process).
+"""
+
+import copy
+import threading
+from collections import OrderedDict, namedtuple
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class AtomsCache:
+    """
+    Thread-safe LRU cache of Atoms objects handing out copies,
+    such that callers can modify the returned objects freely.
+    A maxsize of 0 disables the caching.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _copy(atoms):
+        """Copy the Atoms object, including nested values of the info (like the key_value_pairs)"""
+
+        atoms_copy = atoms.copy()
+        atoms_copy.info = copy.deepcopy(atoms.info)
+
+        return atoms_copy
+
+    def get(self, key, load):
+        """
+        Get a copy of the Atoms object for the given key,
+        calling load() to get it if not cached (yet)
+        """
+
+        with self._lock:
+            atoms = self._entries.get(key)
+
+            if atoms is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._copy(atoms)
+
+            self.misses += 1
+
+        # decode outside the lock, concurrent misses for the same key only cost an additional decoding
+        atoms = load()
+
+        if self.maxsize > 0:
+            with self._lock:
+                self._entries[key] = atoms
+                self._entries.move_to_end(key)
+
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+            return self._copy(atoms)
+
+        return atoms
+
+    def evict(self, key):
+        """Remove the entry for the given key if cached"""
+
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def info(self):
+        """The hit/miss counters and size of the cache, like functools.lru_cache"""
+
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+    def clear(self):
+        """Remove all entries and reset the counters"""
+
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
@@ -0,0 +1,299 @@
+"""
+Random access to bzip2 compressed files using an index of their compressed blocks.
+
+bzip2 compresses the data in independent blocks of at most 900k. The blocks are not byte-aligned,
+but each one starts with a 48bit magic number and can be decompressed on its own by wrapping it
+in a new bzip2 stream with a matching header and trailer.
+"""
+
+import bz2
+import io
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+BLOCK_MAGIC = 0x314159265359  # BCD of pi
+EOS_MAGIC = 0x177245385090  # BCD of sqrt(pi), marks the end of a stream
+STREAM_HEADER = int.from_bytes(b'BZh9', 'big')  # the largest block size, can decompress blocks of any level
+
+SCAN_CHUNK_SIZE = 16*1024*1024
+
+
+def _magic_patterns(magic):
+    """
+    Generate the byte pattern, mask and the fully covered bytes (the needle)
+    for the 48bit magic starting at each of the 8 possible bit offsets.
+    """
+
+    patterns = []
+
+    for shift in range(8):
+        nbytes = (shift + 48 + 7) // 8
+        lshift = nbytes*8 - shift - 48
+        pattern = (magic << lshift).to_bytes(nbytes, 'big')
+        mask = (((1 << 48) - 1) << lshift).to_bytes(nbytes, 'big')
+        first = 1 if shift else 0
+        last = nbytes - 1 if lshift else nbytes
+        patterns.append((shift, pattern, mask, pattern[first:last], first))
+
+    return patterns
+
+
+MAGIC_PATTERNS = {
+    BLOCK_MAGIC: _magic_patterns(BLOCK_MAGIC),
+    EOS_MAGIC: _magic_patterns(EOS_MAGIC),
+    }
+
+
+def _find_magic(buf, magic):
+    """Yield the bit offsets of all occurrences of the given magic in the buffer"""
+
+    for shift, pattern, mask, needle, first in MAGIC_PATTERNS[magic]:
+        pos = buf.find(needle)
+
+        while pos >= 0:
+            start = pos - first
+
+            if start >= 0 and start + len(pattern) <= len(buf) and all(
+                    buf[start+i] & mask[i] == pattern[i] for i in range(len(pattern))):
+                yield start*8 + shift
+
+            pos = buf.find(needle, pos + 1)
+
+
+def scan(fhandle):
+    """
+    Scan a bzip2 file for block and end-of-stream markers.
+
+    Returns:
+        a tuple of sorted lists with the bit offsets of the blocks and the stream ends
+    """
+
+    blocks = set()
+    ends = set()
+
+    tail = b''
+    offset = 0  # file offset of the current chunk
+
+    while True:
+        chunk = fhandle.read(SCAN_CHUNK_SIZE)
+
+        if not chunk:
+            break
+
+        # keep enough of the previous chunk to find markers crossing the chunk boundary
+        buf = tail + chunk
+        base = (offset - len(tail))*8
+
+        blocks.update(base + b for b in _find_magic(buf, BLOCK_MAGIC))
+        ends.update(base + e for e in _find_magic(buf, EOS_MAGIC))
+
+        offset += len(chunk)
+        tail = buf[-6:]
+
+    return sorted(blocks), sorted(ends)
+
+
+def read_block(fhandle, start, end):
+    """Read the compressed data containing the bits [start, end)"""
+
+    fhandle.seek(start // 8)
+    return fhandle.read((end + 7) // 8 - start // 8)
+
+
+def decompress_block(data, start, end):
+    """
+    Decompress a single block given the compressed data returned by read_block().
+
+    Releases the GIL while decompressing, making it suitable for use in a thread pool.
+    """
+
+    nbits = end - start
+    value = (int.from_bytes(data, 'big') >> (len(data)*8 - start % 8 - nbits)) & ((1 << nbits) - 1)
+
+    # the block CRC follows the block magic, for a single-block stream it is also the stream CRC
+    crc = (value >> (nbits - 80)) & 0xffffffff
+
+    stream = (((STREAM_HEADER << nbits | value) << 48 | EOS_MAGIC) << 32) | crc
+    stream_nbits = 32 + nbits + 80
+    padding = -stream_nbits % 8
+
+    return bz2.decompress((stream << padding).to_bytes((stream_nbits + padding) // 8, 'big'))
+
+
+def build_index(fhandle, workers=None):
+    """
+    Build the block index of a bzip2 file, decompressing each block once to validate it
+    and to get the offsets of the blocks in the decompressed data.
+
+    Args:
+        fhandle: a seekable binary file object
+        workers: number of threads to use for decompression
+
+    Returns:
+        a JSON-serializable dict with the list of blocks, each being a list of
+        the start and end bit and the offset in the decompressed data,
+        and the total size of the decompressed data
+    """
+
+    blocks, ends = scan(fhandle)
+    markers = sorted([(b, True) for b in blocks] + [(e, False) for e in ends])
+
+    spans = [(start, markers[idx+1][0])
+             for idx, (start, is_block) in enumerate(markers[:-1]) if is_block]
+
+    def block_size(span):
+        try:
+            return len(decompress_block(*span))
+        except (OSError, ValueError):
+            return None
+
+    if workers:
+        sizes = []
+        pending = deque()
+
+        with ThreadPoolExecutor(workers) as executor:
+            # read ahead only a bounded number of blocks instead of submitting (and reading) all of them
+            for start, end in spans:
+                if len(pending) >= 2*workers:
+                    sizes.append(pending.popleft().result())
+
+                pending.append(executor.submit(block_size, (read_block(fhandle, start, end), start, end)))
+
+            sizes.extend(future.result() for future in pending)
+    else:
+        sizes = [block_size((read_block(fhandle, start, end), start, end)) for start, end in spans]
+
+    index = []
+    offset = 0
+    idx = 0
+
+    while idx < len(spans):
+        start, end = spans[idx]
+        size = sizes[idx]
+
+        # the block magic may appear by chance in the compressed data,
+        # in which case the block has to be merged with the following one
+        while size is None:
+            idx += 1
+
+            if idx == len(spans) or spans[idx][0] != end:
+                raise ValueError("invalid bzip2 block found at bit {}".format(start))
+
+            end = spans[idx][1]
+            size = block_size((read_block(fhandle, start, end), start, end))
+
+        index.append([start, end, offset])
+        offset += size
+        idx += 1
+
+    return {'blocks': index, 'size': offset}
+
+
+class IndexedBZ2File(io.RawIOBase):
+    """
+    Seekable reader for the decompressed content of a bzip2 file with a block index.
+
+    Only the blocks containing the requested data are decompressed.
+    When reading sequentially with workers, the following blocks are
+    decompressed in parallel in a thread pool.
+    """
+
+    def __init__(self, filename, index, workers=None):
+        super().__init__()
+
+        if isinstance(filename, (str, bytes)):
+            self._fhandle = open(filename, 'rb')
+            self._closefd = True
+        else:
+            self._fhandle = filename
+            self._closefd = False
+
+        self._blocks = index['blocks']
+        self._offsets = [b[2] for b in self._blocks]
+        self._size = index['size']
+        self._pos = 0
+        self._current = (None, b'')
+
+        self._executor = ThreadPoolExecutor(workers) if workers else None
+        self._depth = 2*workers if workers else 0
+        self._pending = deque()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+
+        self._pos = max(0, offset)
+        return self._pos
+
+    def readinto(self, buf):
+        if self._pos >= self._size:
+            return 0
+
+        num = bisect_right(self._offsets, self._pos) - 1
+        data = self._block(num)
+
+        rel = self._pos - self._offsets[num]
+        count = min(len(buf), len(data) - rel)
+        buf[:count] = data[rel:rel+count]
+        self._pos += count
+
+        return count
+
+    def close(self):
+        if self.closed:
+            return
+
+        if self._executor:
+            for _, future in self._pending:
+                future.cancel()
+            self._executor.shutdown()
+
+        if self._closefd:
+            self._fhandle.close()
+
+        super().close()
+
+    def _block(self, num):
+        if self._current[0] == num:
+            return self._current[1]
+
+        # drop prefetched blocks we jumped over
+        while self._pending and self._pending[0][0] != num:
+            self._pending.popleft()[1].cancel()
+
+        if self._pending:
+            data = self._pending.popleft()[1].result()
+        else:
+            start, end, _ = self._blocks[num]
+            data = decompress_block(read_block(self._fhandle, start, end), start, end)
+
+        self._current = (num, data)
+        self._prefetch(num + 1)
+
+        return data
+
+    def _prefetch(self, num):
+        if not self._executor:
+            return
+
+        if self._pending:
+            num = self._pending[-1][0] + 1
+
+        # the compressed data is read here, only the decompression runs in the pool
+        while len(self._pending) < self._depth and num < len(self._blocks):
+            start, end, _ = self._blocks[num]
+            data = read_block(self._fhandle, start, end)
+            self._pending.append((num, self._executor.submit(decompress_block, data, start, end)))
+            num += 1
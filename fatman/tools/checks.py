@@ -4,6 +4,8 @@ Functions to run checks on data.
 
 import numpy as np
 
+from .parsers import table_column
+
 def generate_checks_dict(data, code, test=""):
     """
     Generate a possibly nested dictionary with key-value pairs,
@@ -23,7 +25,7 @@ def generate_checks_dict(data, code, test=""):
             }
 
         if test.startswith('deltatest'):
-            charges = [e['charge'] for e in data['mulliken_population_analysis']['per-atom']]
+            charges = table_column(data['mulliken_population_analysis']['per-atom'], 'charge')
 
             checks['deltatest'] = {
                 # For the mono-crystals in the deltatest we expect all charges to be equal,
@@ -0,0 +1,170 @@
+"""
+Compression codecs for artifacts.
+
+Each codec provides a reader for the decompressed content of a file, an incremental
+compressor (with compress() and flush(), like bz2.BZ2Compressor) and the HTTP content
+encoding to pass the compressed data through unchanged (None if there is no common one).
+zstd is only available if the zstandard module is installed.
+"""
+
+import bz2
+import gzip
+import io
+import lzma
+import zlib
+from collections import namedtuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# open() takes a filename or a binary file object
+Codec = namedtuple('Codec', ['open', 'compressor', 'content_encoding', 'extensions'])
+
+CODECS = {
+    'bz2': Codec(
+        open=lambda source: bz2.open(source, 'rb'),
+        compressor=bz2.BZ2Compressor,
+        content_encoding=None,  # bzip2 is not a registered HTTP content-coding
+        extensions=('.bz2', '.tbz2'),
+        ),
+    'gzip': Codec(
+        open=lambda source: gzip.open(source, 'rb'),
+        compressor=lambda: zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS),  # with gzip header
+        content_encoding='gzip',
+        extensions=('.gz', '.tgz'),
+        ),
+    'xz': Codec(
+        open=lambda source: lzma.open(source, 'rb'),
+        compressor=lzma.LZMACompressor,
+        content_encoding=None,
+        extensions=('.xz', '.txz', '.lzma'),
+        ),
+    }
+
+
+def _open_zstd(source):
+    if isinstance(source, str):
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(source, 'rb'), closefd=True))
+
+    return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(source, closefd=False))
+
+
+if zstandard is not None:
+    CODECS['zstd'] = Codec(
+        open=_open_zstd,
+        compressor=lambda: zstandard.ZstdCompressor(level=3).compressobj(),
+        content_encoding='zstd',
+        extensions=('.zst',),
+        )
+
+# extensions of files which are compressed already (also if uploaded uncompressed from our point of view)
+COMPRESSED_EXTENSIONS = tuple(ext for codec in CODECS.values() for ext in codec.extensions) + (
+    '.zip', '.7z', '.png', '.jpg', '.jpeg', '.h5')
+
+CHUNK_SIZE = 1024*1024
+
+
+def get_codec(name):
+    """Get the codec for the given compression scheme, raises a RuntimeError for unknown or unavailable ones"""
+
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise RuntimeError("unknown or unavailable compression scheme '{}'".format(name)) from None
+
+
+def open_compressed(source, name):
+    """
+    Open the decompressed content of a file compressed with the given codec for binary reading,
+    given its filename or a binary file object (which is not closed when closing the returned one)
+    """
+
+    return get_codec(name).open(source)
+
+
+def read_range(fhandle, start=0, stop=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield the content of a binary file object from start up to stop (the end if None) in chunks.
+
+    Streams without random access (like the decompressed content of a file without index)
+    are read sequentially from the current position, discarding the data before start.
+    """
+
+    if fhandle.seekable():
+        fhandle.seek(start)
+    else:
+        remaining = start
+
+        while remaining > 0:
+            chunk = fhandle.read(min(remaining, chunk_size))
+
+            if not chunk:
+                return
+
+            remaining -= len(chunk)
+
+    remaining = stop - start if stop is not None else None
+
+    while remaining is None or remaining > 0:
+        chunk = fhandle.read(chunk_size if remaining is None else min(remaining, chunk_size))
+
+        if not chunk:
+            break
+
+        if remaining is not None:
+            remaining -= len(chunk)
+
+        yield chunk
+
+
+class CompressingReader(io.RawIOBase):
+    """
+    Read-only file object returning the compressed content of another (binary) file object.
+
+    The data is compressed while being read, permitting to store a compressed
+    version of a stream without holding it in memory or in a temporary file.
+    Closing it also closes the wrapped file object.
+    The size of the uncompressed data read so far is available as the attribute size.
+    """
+
+    def __init__(self, fhandle, name, chunk_size=CHUNK_SIZE):
+        super().__init__()
+
+        self._fhandle = fhandle
+        self._compressor = get_codec(name).compressor()
+        self._chunk_size = chunk_size
+        self._buffer = b''
+        self._pos = 0
+        self._eof = False
+        self.size = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        # the compressor may not return any data for a chunk
+        while self._pos == len(self._buffer) and not self._eof:
+            chunk = self._fhandle.read(self._chunk_size)
+
+            if chunk:
+                self.size += len(chunk)
+                self._buffer = self._compressor.compress(chunk)
+            else:
+                self._buffer = self._compressor.flush()
+                self._eof = True
+
+            self._pos = 0
+
+        count = min(len(buf), len(self._buffer) - self._pos)
+        buf[:count] = self._buffer[self._pos:self._pos+count]
+        self._pos += count
+
+        return count
+
+    def close(self):
+        if not self.closed:
+            self._fhandle.close()
+
+        super().close()
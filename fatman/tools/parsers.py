@@ -2,6 +2,12 @@
 Functions to parse inputs & outputs
 """
 
+from collections import OrderedDict
+import io
+import mmap
+import re as stdlib_re
+
+import numpy as np
 import regex as re
 
 
@@ -159,159 +165,617 @@ CP2K_FOOTER_MATCH = re.compile(r'''
 ''', re.MULTILINE | re.VERBOSE)
 
 
-def parse_cp2k_output(fhandle):
+# Line-wise counterparts of the multi-line tables above, used by the streaming
+# parser to find out where a table starts and ends and to validate its rows
+
+CP2K_GW_HEADER_LINE_MATCH = re.compile(r'''
+^[ \t]* MO [ \t]* E_SCF [ \t]* Sigc [ \t]* Sigc_fit [ \t]* Sigx-vxc [ \t]* Z [ \t]* E_GW \n
+''', re.VERBOSE)
+
+CP2K_GW_ROW_LINE_MATCH = re.compile(r'''
+^[ \t]+ \d+ [ \t]+ \(\ (occ|vir)\ \)
+([ \t]+ [\+\-]?(\d*[\.]\d+|\d+[\.]?\d*)([Ee][\+\-]?\d+)?){6}
+\n
+''', re.VERBOSE)
+
+CP2K_MULLIKEN_START_LINE_MATCH = re.compile(r'''
+^[ \t]* Mulliken\ Population\ Analysis [ \t]* \n
+''', re.VERBOSE)
+
+CP2K_MULLIKEN_PREAMBLE_LINE_MATCHES = [
+    re.compile(r'^[ \t]*\n'),
+    re.compile(r'^[ \t]*\#[\w \t\,\(\)]+\n'),
+    ]
+
+CP2K_MULLIKEN_ROW_LINE_MATCH = re.compile(r'''
+^[ \t]* \d+ [ \t]+ \w+ [ \t]+ \d+ [ \t]+
+(
+  ([\+\-]?(\d*[\.]\d+|\d+[\.]?\d*)([Ee][\+\-]?\d+)?) ([ \t]+ [\+\-]?(\d*[\.]\d+|\d+[\.]?\d*)([Ee][\+\-]?\d+)?){3}
+  |
+  ([\+\-]?(\d*[\.]\d+|\d+[\.]?\d*)([Ee][\+\-]?\d+)?) ([ \t]+ [\+\-]?(\d*[\.]\d+|\d+[\.]?\d*)([Ee][\+\-]?\d+)?)
+) [ \t]* \n
+''', re.VERBOSE)
+
+CP2K_MULLIKEN_TOTAL_LINE_MATCH = re.compile(r'''
+^[ \t]* \#\ Total\ charge (\ and\ spin)? [ \t]+
+(
+  ([\+\-]?(\d*[\.]\d+|\d+[\.]?\d*)([Ee][\+\-]?\d+)?) ([ \t]+ [\+\-]?(\d*[\.]\d+|\d+[\.]?\d*)([Ee][\+\-]?\d+)?){3}
+  |
+  ([\+\-]?(\d*[\.]\d+|\d+[\.]?\d*)([Ee][\+\-]?\d+)?) ([ \t]+ [\+\-]?(\d*[\.]\d+|\d+[\.]?\d*)([Ee][\+\-]?\d+)?)
+) [ \t]* \n
+''', re.VERBOSE)
+
+CP2K_WARNING_START_LINE_MATCH = re.compile(r'''
+^[ \t] \*{3} [ \t]+ WARNING [ \t]+ (in [ \t]+ .+ [ \t]+ :: [ \t]+ .+) [ \t]+ \*{3} [ \t]* \n
+''', re.VERBOSE)
+
+CP2K_WARNING_CONTINUATION_LINE_MATCH = re.compile(r'''
+^[ \t] \*{3} [ \t]+ (.+?) [ \t]+ \*{3} \n
+''', re.VERBOSE)
+
+
+class _LineMatcher(object):
     """
-    Parse output from CP2K.
+    Base class for the state machines of the streaming CP2K output parser.
 
-    Some basic info must be present in the input file.
-    Others are purely optional
+    Lines are only passed to feed() if they contain the trigger string
+    or if the matcher is busy (in the middle of a multi-line block).
+    A matcher which is done will not receive any further lines.
     """
 
-    content = fhandle.read()
-    data = {}
+    trigger = None
+    busy = False
+    done = False
+
+    def feed(self, line):
+        raise NotImplementedError
 
-    def key_value_match(key, value_type=str):
-        """
-        Key-Value matching for specified strings on the content,
-        with type conversion.
-        """
+    def finish(self):
+        """Called when the end of the output is reached"""
+        pass
 
+
+class _KeyValueMatcher(_LineMatcher):
+    """
+    Key-Value matching for the first line containing the specified string,
+    with type conversion.
+    """
+
+    def __init__(self, key, value_type=str):
         if value_type == float:
             value = r'[\+\-]?((\d*[\.]\d+)|(\d+[\.]?\d*))([Ee][\+\-]?\d+)?'
         elif value_type == int:
-            value = r'[\+\-]?\d+' # for ints we don't allow scientific notation since python doesn't accept it
+            value = r'[\+\-]?\d+'  # for ints we don't allow scientific notation since python doesn't accept it
         else:
-            value = r'.+' # this will match everthing except a newline
-
-        # value now contains the regex corresponding to a type
+            value = r'.+'  # this will match everthing except a newline
 
-        # complete the parametrized regex and search for the given key
+        # complete the parametrized regex for the given key
         # and specified value format, capture the value
-        match = re.search(r'^[ \t]*{key}[ \t]+(?P<value>{value})$'.format(
-            key=re.escape(key), # make sure we match key as it is (no regex interpretation)
+        self.regex = re.compile(r'^[ \t]*{key}[ \t]+(?P<value>{value})$'.format(
+            key=re.escape(key),  # make sure we match key as it is (no regex interpretation)
             value=value
-            ), content, re.MULTILINE)
+            ))
 
-        if not match:
-            return None
+        self.trigger = key
+        self.value_type = value_type
+        self.value = None
 
-        # convert the captured value string to the requested python type
-        return value_type(match.group('value'))
+    def feed(self, line):
+        if not line.lstrip(' \t').startswith(self.trigger):
+            return
 
-    match = CP2K_HEADER_MATCH.search(content)
-    if not match:
-        raise OutputParseError("Invalid CP2K output file, header not found")
-    data.update(match.groupdict())
+        match = self.regex.match(line)
 
-    match = CP2K_FOOTER_MATCH.search(content)
-    if not match:
-        raise OutputParseError("Invalid CP2K output file, footer not found")
-    data.update(match.groupdict())
+        if match:
+            # convert the captured value string to the requested python type
+            self.value = self.value_type(match.group('value'))
+            self.done = True
 
-    data.update({
-        'version': key_value_match('CP2K| source code revision number:'),
-        'mpiranks': key_value_match('GLOBAL| Total number of message passing processes', int),
-        'threads': key_value_match('GLOBAL| Number of threads for this process', int),
-        'username': key_value_match('**    ****   ******    PROGRAM STARTED BY'),
-        'total_energy': key_value_match('ENERGY| Total FORCE_EVAL ( QS ) energy (a.u.):', float),
-        'warnings_count': key_value_match('The number of warnings for this run is :', int),
-        'warnings': [" ".join(g for g in warning_match.groups() if g is not None)
-                     for warning_match in CP2K_WARNINGS_MATCH.finditer(content)],
-        })
 
-    # only when doing calculations with kpoints
-    nkpoints = key_value_match('BRILLOUIN| List of Kpoints [2 Pi/Bohr]', int)
-    if nkpoints is not None:
-        data['nkpoints'] = nkpoints
+class _BlockMatcher(_LineMatcher):
+    """
+    Matches the first block of a fixed number of lines,
+    with the first line containing the trigger string.
+    """
 
-    match = CP2K_GW_MATCH.search(content)
-    if match:
-        gw_raw_data = match.capturesdict()
-        gw_data = []
+    def __init__(self, regex, nlines, trigger):
+        self.regex = regex
+        self.nlines = nlines
+        self.trigger = trigger
+        self.lines = []
+        self.match = None
 
-        gw_data = [dict(zip(gw_raw_data.keys(), l)) for l in zip(*gw_raw_data.values())]
+    def feed(self, line):
+        if not self.lines and self.trigger not in line:
+            return
 
-        for entry in gw_data:
-            for keyword in entry:
-                if keyword == 'MO_type':
-                    continue
+        self.lines.append(line)
 
-                if keyword == 'MO_nr':
-                    entry[keyword] = int(entry[keyword])
-                else:
-                    entry[keyword] = float(entry[keyword])
+        if len(self.lines) < self.nlines:
+            self.busy = True
+            return
 
-        data['GW_quasiparticle_energies'] = gw_data
+        self.busy = False
+        lines, self.lines = self.lines, []
+        self.match = self.regex.search("".join(lines))
 
-    data['atomic_kind_information'] = []
+        if self.match:
+            self.done = True
+            return
 
-    for atomic_kind_match in CP2K_ATOMIC_KIND_NATOMS_MATCH.finditer(content):
-        data['atomic_kind_information'].append({
-            'kind': atomic_kind_match.group('kind'),
-            'natoms': int(atomic_kind_match.group('natoms')),
-            })
+        # the block may still start on one of the following lines
+        for line in lines[1:]:
+            self.feed(line)
+            if self.done:
+                break
 
-    match = CP2K_MULLIKEN_MATCH.search(content)
-    # for this one we needed the extended regex library https://pypi.python.org/pypi/regex
-    if match:
-        captures = match.capturesdict()
-        per_atom = []
-
-        if captures.get('population_alpha'):
-            for idx in range(len(captures['atom'])):
-                per_atom.append({
-                    'element': captures['element'][idx],
-                    'kind': int(captures['kind'][idx]),
-                    'population_alpha': float(captures['population_alpha'][idx]),
-                    'population_beta': float(captures['population_beta'][idx]),
-                    'charge': float(captures['charge'][idx]),
-                    'spin': float(captures['spin'][idx]),
-                    })
 
-            data['mulliken_population_analysis'] = {
-                'per-atom': per_atom,
-                'total': {
-                    'population_alpha': float(match.group('total_population_alpha')),
-                    'population_beta': float(match.group('total_population_beta')),
-                    'charge': float(match.group('total_charge')),
-                    'spin': float(match.group('total_spin')),
-                    },
-                }
+class _TableMatcher(_LineMatcher):
+    """
+    Matches the first table consisting of a start line, a fixed number of preamble lines,
+    a variable number (but at least one) of rows and an optional end line.
+
+    Since every line is validated on its own, the rows and the end line
+    can be split into columns without running the full table regex on them.
+    """
+
+    def __init__(self, trigger, start, row, preamble=(), end=None):
+        self.trigger = trigger
+        self.start = start
+        self.row = row
+        self.preamble = preamble
+        self.end = end
+        self.lines = []
+        self.nrows = 0
+        self.rows = None
+        self.end_line = None
+
+    def feed(self, line):
+        if self.busy:
+            if self._feed_block(line) or self.done:
+                return
+
+            # the current line is not part of the table, but may start a new one
+            self.busy = False
+
+        if self.trigger in line and self.start.match(line):
+            self.busy = True
+            self.lines = [line]
+            self.nrows = 0
+
+    def finish(self):
+        if self.busy and self.end is None and self.nrows:
+            self._complete()
+
+    def _feed_block(self, line):
+        if len(self.lines) <= len(self.preamble):
+            if self.preamble[len(self.lines)-1].match(line):
+                self.lines.append(line)
+                return True
+            return False
+
+        if self.row.match(line):
+            self.lines.append(line)
+            self.nrows += 1
+            return True
+
+        if not self.nrows:
+            return False
+
+        if self.end is None:
+            self._complete()
+            return False
+
+        if self.end.match(line):
+            self.lines.append(line)
+            self._complete()
+            return True
+
+        return False
+
+    def _complete(self):
+        self.busy = False
+        lines, self.lines = self.lines, []
+
+        start = 1 + len(self.preamble)
+        self.rows = lines[start:start+self.nrows]
+        if self.end is not None:
+            self.end_line = lines[-1]
+
+        self.done = True
+
+
+class _FindAllMatcher(_LineMatcher):
+    """
+    Matches all single line occurrences of the given regex.
+    """
+
+    def __init__(self, regex, trigger):
+        self.regex = regex
+        self.trigger = trigger
+        self.matches = []
+
+    def feed(self, line):
+        match = self.regex.search(line)
+
+        if match:
+            self.matches.append(match)
+
+
+class _WarningsMatcher(_LineMatcher):
+    """
+    Matches all warnings, including their continuation lines.
+    """
+
+    trigger = 'WARNING'
+
+    def __init__(self):
+        self.lines = []
+        self.warnings = []
+
+    def feed(self, line):
+        if self.busy:
+            if CP2K_WARNING_CONTINUATION_LINE_MATCH.match(line):
+                self.lines.append(line)
+                return
+
+            self.finish()
+
+        if self.trigger in line and CP2K_WARNING_START_LINE_MATCH.match(line):
+            self.busy = True
+            self.lines = [line]
+
+    def finish(self):
+        if not self.busy:
+            return
+
+        self.busy = False
+        lines, self.lines = self.lines, []
+        match = CP2K_WARNINGS_MATCH.match("".join(lines))
+
+        if match is None:  # truncated or unknown format, skipped like the regex-based parser did
+            return
+
+        self.warnings.append(" ".join(g for g in match.groups() if g is not None))
+
+
+CP2K_GW_COLUMNS = ('E_SCF', 'Sigc', 'Sigc_fit', 'Sigx_vxc', 'Z', 'E_GW')
+CP2K_MULLIKEN_COLUMNS = ('population', 'charge')
+CP2K_MULLIKEN_UKS_COLUMNS = ('population_alpha', 'population_beta', 'charge', 'spin')
+
+
+def _split_columns(rows, ncolumns):
+    """
+    Split the whitespace-separated rows of a table into a 2D array of strings.
+    Returns None if not all rows have the given number of columns.
+    """
+
+    fields = "".join(rows).split()
+
+    if len(fields) != len(rows)*ncolumns:
+        return None
+
+    return np.array(fields).reshape(len(rows), ncolumns)
+
+
+def table_rows(table):
+    """
+    Materialize the rows of a table stored in columnar form (a dict of lists), like the per-atom
+    Mulliken data, the GW quasiparticle energies or the components of the moments, as a list of dicts.
+    Tables already stored as a list of dicts (older results) are returned as they are.
+    """
+
+    if isinstance(table, dict):
+        return [dict(zip(table.keys(), row)) for row in zip(*table.values())]
+
+    return table
+
+
+def table_column(table, name):
+    """Get a single column of a table stored in columnar or row form as a list"""
+
+    if isinstance(table, dict):
+        return table[name]
+
+    return [row[name] for row in table]
+
+
+# The sections which can be selected when parsing CP2K output, named after the keys in the parsed data,
+# with their version. Bump the version of a section whenever its extraction or data format changes
+# to get it re-extracted in incremental updates of the calculation results.
+CP2K_SECTION_VERSIONS = OrderedDict([
+    ('version', 1),
+    ('mpiranks', 1),
+    ('threads', 1),
+    ('username', 1),
+    ('total_energy', 1),
+    ('warnings_count', 1),
+    ('warnings', 1),
+    ('nkpoints', 1),
+    ('GW_quasiparticle_energies', 2),
+    ('atomic_kind_information', 1),
+    ('mulliken_population_analysis', 2),
+    ('electric_magnetic_moments', 2),
+    ('overlap_matrix_condition_number', 1),
+    ])
+
+CP2K_SECTIONS = tuple(CP2K_SECTION_VERSIONS)
+
+
+def _cp2k_matchers(sections=None):
+    """
+    Returns a new set of matchers for the CP2K output parser,
+    restricted to the given sections plus header and footer.
+    """
+
+    matchers = OrderedDict([
+        ('header', _BlockMatcher(CP2K_HEADER_MATCH, 5, 'PROGRAM STARTED AT')),
+        ('footer', _BlockMatcher(CP2K_FOOTER_MATCH, 5, 'PROGRAM ENDED AT')),
+        ('version', _KeyValueMatcher('CP2K| source code revision number:')),
+        ('mpiranks', _KeyValueMatcher('GLOBAL| Total number of message passing processes', int)),
+        ('threads', _KeyValueMatcher('GLOBAL| Number of threads for this process', int)),
+        ('username', _KeyValueMatcher('**    ****   ******    PROGRAM STARTED BY')),
+        ('total_energy', _KeyValueMatcher('ENERGY| Total FORCE_EVAL ( QS ) energy (a.u.):', float)),
+        ('warnings_count', _KeyValueMatcher('The number of warnings for this run is :', int)),
+        ('warnings', _WarningsMatcher()),
+        ('nkpoints', _KeyValueMatcher('BRILLOUIN| List of Kpoints [2 Pi/Bohr]', int)),
+        ('GW_quasiparticle_energies', _TableMatcher(
+            'E_GW', CP2K_GW_HEADER_LINE_MATCH, CP2K_GW_ROW_LINE_MATCH)),
+        ('atomic_kind_information', _FindAllMatcher(CP2K_ATOMIC_KIND_NATOMS_MATCH, 'Atomic kind:')),
+        ('mulliken_population_analysis', _TableMatcher(
+            'Mulliken Population Analysis',
+            CP2K_MULLIKEN_START_LINE_MATCH, CP2K_MULLIKEN_ROW_LINE_MATCH,
+            CP2K_MULLIKEN_PREAMBLE_LINE_MATCHES, CP2K_MULLIKEN_TOTAL_LINE_MATCH)),
+        ('electric_magnetic_moments', _BlockMatcher(CP2K_MOMENTS_MATCH, 7, 'ELECTRIC/MAGNETIC MOMENTS')),
+        ('overlap_matrix_condition_number', _BlockMatcher(
+            CP2K_CONDITION_NUMBER_MATCH, 6, 'OVERLAP MATRIX CONDITION NUMBER AT GAMMA POINT')),
+        ])
+
+    if sections is None:
+        return matchers
+
+    unknown = set(sections) - set(CP2K_SECTIONS)
+    if unknown:
+        raise ValueError("unknown CP2K output sections: {}".format(", ".join(sorted(unknown))))
+
+    return OrderedDict((k, m) for k, m in matchers.items() if k in ('header', 'footer') or k in sections)
+
+
+class _Dispatcher(object):
+    """
+    Passes lines to the matchers interested in them and keeps track
+    of the combined trigger regex of the matchers which are not done yet.
+    """
+
+    def __init__(self, matchers, binary=False):
+        self.active = list(matchers)
+        self.busy = False
+        self.binary = binary
+        self._compile_trigger()
+
+    def _compile_trigger(self):
+        # the stdlib regex engine is considerably faster at searching for a set of literals
+        pattern = "|".join(stdlib_re.escape(m.trigger) for m in self.active)
+        self.trigger = stdlib_re.compile(pattern.encode('ascii') if self.binary else pattern)
+
+    def feed(self, line):
+        """Feed a line to the matchers, returns False if all matchers are done"""
+
+        for matcher in self.active:
+            if matcher.busy or matcher.trigger in line:
+                matcher.feed(line)
+
+        if any(m.done for m in self.active):
+            self.active = [m for m in self.active if not m.done]
+
+            if not self.active:
+                return False
+
+            self._compile_trigger()
+
+        self.busy = any(m.busy for m in self.active)
+        return True
+
+    def finish(self):
+        for matcher in self.active:
+            matcher.finish()
+
+
+def _feed_lines(lines, matchers):
+    """
+    Pass each line to the matchers interested in it, in a single pass.
+    Stops early if all matchers are done.
+    """
+
+    dispatcher = _Dispatcher(matchers)
+
+    for line in lines:
+        # the combined trigger regex lets us skip the vast majority of lines with a single call
+        if not dispatcher.busy and not dispatcher.trigger.search(line):
+            continue
+
+        if not dispatcher.feed(line):
+            return
+
+    dispatcher.finish()
+
+
+def _feed_buffer(buf, matchers, encoding='utf-8'):
+    """
+    Same as _feed_lines() but for a bytes-like object (like an mmap of the output file).
+
+    The buffer is searched directly for the next trigger, only the lines
+    passed to the matchers are sliced from the buffer and decoded.
+    """
+
+    dispatcher = _Dispatcher(matchers, binary=True)
+    size = len(buf)
+    pos = 0
+
+    while pos < size:
+        if not dispatcher.busy:
+            match = dispatcher.trigger.search(buf, pos)
+
+            if match is None:
+                break
+
+            # continue at the beginning of the line containing the trigger
+            pos = buf.rfind(b'\n', pos, match.start()) + 1 or pos
+
+        end = buf.find(b'\n', pos)
+        end = size if end < 0 else end + 1
+
+        line = buf[pos:end].decode(encoding)
+        pos = end
+
+        if line.endswith('\r\n'):
+            line = line[:-2] + '\n'
+
+        if not dispatcher.feed(line):
+            return
+
+    dispatcher.finish()
+
+
+def _mmap_file(fhandle):
+    """
+    Map the file behind a file object into memory if it is a plain, uncompressed file
+    which has not been read from yet. Returns None otherwise.
+    """
+
+    # get down to the raw file object for text and buffered file objects
+    raw = getattr(getattr(fhandle, 'buffer', fhandle), 'raw', fhandle)
+
+    # explicitly check for a plain file: compressed file objects also have a fileno()
+    if not isinstance(raw, io.FileIO):
+        return None
+
+    try:
+        if fhandle.tell() != 0:
+            return None
+
+        return mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # for example not seekable or empty files
+        return None
+
+
+def parse_cp2k_output(fhandle, sections=None):
+    """
+    Parse output from CP2K.
+
+    Some basic info must be present in the input file.
+    Others are purely optional
+
+    The output is consumed line by line in a single pass,
+    only the tables found are kept in memory.
+
+    If a list of sections (see CP2K_SECTIONS) is given, only those are extracted
+    in addition to the header and footer data which are always required.
+
+    Plain files are memory-mapped and searched as bytes, without reading
+    and decoding all of the output. A bytes-like object or an mmap can also
+    be passed directly instead of a file object.
+    """
+
+    matchers = _cp2k_matchers(sections)
+
+    if isinstance(fhandle, (bytes, bytearray, mmap.mmap)):
+        _feed_buffer(fhandle, matchers.values())
+    else:
+        buf = _mmap_file(fhandle)
+
+        if buf is None:
+            _feed_lines(fhandle, matchers.values())
         else:
-            for idx in range(len(captures['atom'])):
-                per_atom.append({
-                    'element': captures['element'][idx],
-                    'kind': int(captures['kind'][idx]),
-                    'population': float(captures['population'][idx]),
-                    'charge': float(captures['charge'][idx]),
-                    })
+            with buf:
+                _feed_buffer(buf, matchers.values(), getattr(fhandle, 'encoding', None) or 'utf-8')
+
+    data = {}
+
+    match = matchers['header'].match
+    if not match:
+        raise OutputParseError("Invalid CP2K output file, header not found")
+    data.update(match.groupdict())
+
+    match = matchers['footer'].match
+    if not match:
+        raise OutputParseError("Invalid CP2K output file, footer not found")
+    data.update(match.groupdict())
+
+    for key in ('version', 'mpiranks', 'threads', 'username', 'total_energy', 'warnings_count'):
+        if key in matchers:
+            data[key] = matchers[key].value
 
+    if 'warnings' in matchers:
+        data['warnings'] = matchers['warnings'].warnings
+
+    # only when doing calculations with kpoints
+    if 'nkpoints' in matchers and matchers['nkpoints'].value is not None:
+        data['nkpoints'] = matchers['nkpoints'].value
+
+    table = matchers.get('GW_quasiparticle_energies')
+    if table and table.rows:
+        # the MO type is enclosed in separate parentheses: 1 ( occ ) ...
+        columns = _split_columns(table.rows, 10)
+
+        if columns is not None:
+            data['GW_quasiparticle_energies'] = OrderedDict([
+                ('MO_nr', columns[:, 0].astype(int).tolist()),
+                ('MO_type', columns[:, 2].tolist()),
+                ] + [(name, columns[:, idx].astype(float).tolist())
+                     for idx, name in enumerate(CP2K_GW_COLUMNS, 4)])
+
+    if 'atomic_kind_information' in matchers:
+        data['atomic_kind_information'] = []
+
+        for atomic_kind_match in matchers['atomic_kind_information'].matches:
+            data['atomic_kind_information'].append({
+                'kind': atomic_kind_match.group('kind'),
+                'natoms': int(atomic_kind_match.group('natoms')),
+                })
+
+    table = matchers.get('mulliken_population_analysis')
+    if table and table.rows:
+        # atom, element, kind, followed by either the alpha & beta populations, charge and spin
+        # for the spin unrestricted case or the population and charge otherwise
+        ncolumns = len(table.rows[0].split())
+        names = CP2K_MULLIKEN_UKS_COLUMNS if ncolumns == 7 else CP2K_MULLIKEN_COLUMNS
+
+        columns = _split_columns(table.rows, ncolumns)
+        totals = table.end_line.split()[-len(names):]
+
+        if columns is not None:
             data['mulliken_population_analysis'] = {
-                'per-atom': per_atom,
-                'total': {
-                    'population': float(match.group('total_population')),
-                    'charge': float(match.group('total_charge')),
-                    },
+                'per-atom': OrderedDict([
+                    ('element', columns[:, 1].tolist()),
+                    ('kind', columns[:, 2].astype(int).tolist()),
+                    ] + [(name, columns[:, idx].astype(float).tolist())
+                         for idx, name in enumerate(names, 3)]),
+                'total': {name: float(value) for name, value in zip(names, totals)},
                 }
 
-    match = CP2K_MOMENTS_MATCH.search(content)
+    match = 'electric_magnetic_moments' in matchers and matchers['electric_magnetic_moments'].match
     if match:
         captures = match.capturesdict()
-        print(captures)
         data['electric_magnetic_moments'] = {
             'reference_point_unit': captures['ref_point_unit'][0],
-            'reference_point': [float(c) for c in captures['ref_point']],
             'charges': {
               'electronic': float(captures['charge_electronic'][0]),
               'core': float(captures['charge_core'][0]),
               'total': float(captures['charge_total'][0]),
               },
             'dipole_moment_unit': captures['dipole_moment_unit'][0],
-            'dipole_moment': [float(c) for c in captures['dipole_moment']],
             'dipole_moment_total': float(captures['dipole_moment_total'][0]),
+            # the vectors as a table with a row per Cartesian component
+            'components': OrderedDict([
+                ('axis', ['X', 'Y', 'Z']),
+                ('reference_point', np.array(captures['ref_point']).astype(float).tolist()),
+                ('dipole_moment', np.array(captures['dipole_moment']).astype(float).tolist()),
+                ]),
             }
 
-    match = CP2K_CONDITION_NUMBER_MATCH.search(content)
+    match = 'overlap_matrix_condition_number' in matchers and matchers['overlap_matrix_condition_number'].match
     if match:
         captures = match.groupdict()
         data['overlap_matrix_condition_number'] = {
@@ -340,14 +804,33 @@ def parse_cp2k_output(fhandle):
     return data
 
 
-def get_data_from_output(fhandle, code):
+# The section versions for each code, codes without sections can only be parsed completely
+SECTION_VERSIONS = {
+    'CP2K': CP2K_SECTION_VERSIONS,
+    'espresso': {},
+    }
+
+# Bump the version of a parser whenever its output changes (including any change of a section version)
+# to get outputs parsed again instead of taking the cached data.
+# The CP2K versions up to 16 have been used already.
+PARSER_VERSIONS = {
+    'CP2K': 17,
+    'espresso': 1,
+    }
+
+
+def get_data_from_output(fhandle, code, sections=None):
     """
     Parse code output data.
     Currently only implemented for QE & CP2K
+
+    Args:
+        sections: extract only the given sections (keys in the data),
+                  skipping the work for all other sections
     """
 
     if code == 'CP2K':
-        return parse_cp2k_output(fhandle)
+        return parse_cp2k_output(fhandle, sections)
 
     elif code == 'espresso':
         data = {}
@@ -367,6 +850,9 @@ def get_data_from_output(fhandle, code):
                 # extract the total energy and convert from Ry to eV
                 data['total_energy'] = float(line.split()[-2])*13.605697827758654
 
+        if sections is not None:
+            return {k: v for k, v in data.items() if k in sections}
+
         return data
 
     raise OutputParseError("Unknown code: %s" % code)
@@ -382,10 +868,12 @@ def main():
                         help="Use a parser for the given code (currently supported: CP2K, espress)")
     parser.add_argument('finput', metavar='FILE', type=str,
                         help="The output file to parse")
+    parser.add_argument('--section', dest='sections', metavar='SECTION', type=str, action='append',
+                        help="Extract only the given section (can be specified multiple times)")
     args = parser.parse_args()
 
     with open(args.finput, 'r') as fhandle:
-        print(json.dumps(get_data_from_output(fhandle, args.code), sort_keys=True, indent=4))
+        print(json.dumps(get_data_from_output(fhandle, args.code, args.sections), sort_keys=True, indent=4))
 
 if __name__ == '__main__':
     main()
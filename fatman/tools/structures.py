@@ -0,0 +1,111 @@
+"""
+Reading uploaded geometries: the frames of (extended) XYZ files or tar archives of geometry files,
+and the generation of a cell for structures without one.
+"""
+
+import codecs
+import json
+import os
+import tarfile
+from io import StringIO
+from os.path import basename
+
+import numpy as np
+from ase import io as ase_io, data as ase_data
+
+# the per-frame options, given as info (comment line) keys in extended XYZ
+# frames or in an options.json mapping the structure names to them in tar archives
+FRAME_OPTIONS = ('name', 'sets', 'cubic_cell', 'center')
+
+# files in tar archives are read according to their extension
+EXTENSION_FORMATS = {
+    '.xyz': 'extxyz',
+    '.cif': 'cif',
+    '.pdb': 'proteindatabank',
+    }
+
+
+def _atomic_radii():
+    """The VdW radius if available, otherwise the covalent radius, indexed by atomic number"""
+
+    radii = np.array(ase_data.covalent_radii)
+    vdw_radii = np.asarray(ase_data.vdw_radii)  # not defined for the heaviest elements
+    radii[:len(vdw_radii)] = np.where(np.isnan(vdw_radii), radii[:len(vdw_radii)], vdw_radii)
+
+    return radii
+
+
+ATOMIC_RADII = _atomic_radii()
+
+
+def bounding_box_cell(struct, buf_size, cubic=False):
+    """
+    The orthorhombic cell enclosing the molecule boundary box, defined as the minimal/maximal
+    coordinates over all atoms minus/plus their respective VdW radii plus the given buffer,
+    rounded up to the nearest full Angstrom (a cubic one using the longest side if requested)
+    """
+
+    radii = ATOMIC_RADII[struct.get_atomic_numbers()][:, np.newaxis]
+    positions = struct.get_positions()
+
+    cell = np.ceil((positions + radii).max(axis=0) - (positions - radii).min(axis=0) + buf_size)
+
+    if cubic:
+        cell = np.full(3, cell.max())
+
+    return cell
+
+
+def read_frames(geometries, gformat):
+    """
+    Yield the frame number, the structure (or the exception raised while reading it)
+    and the per-frame options for each frame of the given binary file object.
+
+    With the format 'tar' each file in the archive is a frame named after the file.
+    Other formats are read with ASE, the reading stops at the first malformed frame.
+
+    Raises:
+        tarfile.TarError: if the archive can not be read
+        ValueError: if the options.json of the archive is not valid JSON
+    """
+
+    if gformat != 'tar':
+        num = 0
+
+        try:
+            # the readers for multiple frames need a seekable stream
+            content = StringIO(geometries.read().decode('utf-8'))
+
+            for struct in ase_io.iread(content, format=gformat):
+                yield num, struct, {k: struct.info.pop(k) for k in FRAME_OPTIONS if k in struct.info}
+                num += 1
+        except Exception as exc:  # ASE raises all kinds of exceptions for malformed files
+            # the reader can not continue after a malformed frame
+            yield num, exc, {}
+
+        return
+
+    with tarfile.open(fileobj=geometries, mode='r:*') as archive:
+        members = [m for m in archive.getmembers() if m.isfile()]
+        options = {}
+
+        for member in members:
+            if basename(member.name) == 'options.json':
+                options = json.load(codecs.getreader('utf-8')(archive.extractfile(member)))
+                members.remove(member)
+                break
+
+        for num, member in enumerate(members):
+            name, ext = os.path.splitext(basename(member.name))
+            frame_options = dict(options.get(name, {}), name=name)
+
+            try:
+                if ext not in EXTENSION_FORMATS:
+                    raise ValueError("unsupported file extension '{}'".format(ext))
+
+                content = archive.extractfile(member).read().decode('utf-8')
+                struct = ase_io.read(StringIO(content), format=EXTENSION_FORMATS[ext])
+            except Exception as exc:
+                struct = exc
+
+            yield num, struct, frame_options
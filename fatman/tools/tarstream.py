@@ -0,0 +1,95 @@
+"""
+Generate tar archives on the fly, with constant memory and a size known in advance.
+
+In contrast to tarfile, the content of a member does not have to be written as a whole,
+permitting to stream an archive of large files chunk by chunk in an HTTP response.
+"""
+
+import contextlib
+import shutil
+import tarfile
+import tempfile
+from collections import namedtuple
+
+CHUNK_SIZE = 1024*1024
+
+# contents of unknown size are kept in memory up to this size while generating, on disk otherwise
+SPOOL_MAX_SIZE = 16*1024*1024
+
+# the content is read from the file object returned by open(), which must deliver exactly size bytes,
+# a size of None means unknown in advance (the content is then read once to determine it)
+TarMember = namedtuple('TarMember', ['name', 'size', 'mtime', 'open'])
+
+
+def _header(member):
+    tarinfo = tarfile.TarInfo(member.name)
+    tarinfo.size = member.size
+    tarinfo.mtime = member.mtime
+    tarinfo.mode = 0o644
+
+    # the PAX format supports long names and large files
+    return tarinfo.tobuf(tarfile.PAX_FORMAT)
+
+
+def _padding(size, blocksize):
+    return -size % blocksize
+
+
+def tar_size(members):
+    """The size of the archive generated by generate_tar() for the given members, None if a member size is unknown"""
+
+    if any(m.size is None for m in members):
+        return None
+
+    size = sum(len(_header(m)) + m.size + _padding(m.size, tarfile.BLOCKSIZE) for m in members)
+    size += 2*tarfile.BLOCKSIZE  # end-of-archive marker
+
+    return size + _padding(size, tarfile.RECORDSIZE)
+
+
+def generate_tar(members, chunk_size=CHUNK_SIZE):
+    """
+    Generate an uncompressed tar archive of the given members.
+
+    Args:
+        members: iterable of TarMember, the files are opened one at a time while generating
+        chunk_size: the maximum size of the content chunks
+
+    Yields:
+        the data of the archive
+    """
+
+    size = 0
+
+    for member in members:
+        with contextlib.ExitStack() as stack:
+            fhandle = stack.enter_context(member.open())
+
+            if member.size is None:
+                # the header comes first: read the content once into a temporary file to get the size
+                spool = stack.enter_context(tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE))
+                shutil.copyfileobj(fhandle, spool, chunk_size)
+                member = member._replace(size=spool.tell())
+                spool.seek(0)
+                fhandle = spool
+
+            header = _header(member)
+            yield header
+
+            remaining = member.size
+
+            while remaining > 0:
+                chunk = fhandle.read(min(remaining, chunk_size))
+
+                if not chunk:
+                    raise RuntimeError("content of '{}' is shorter than the announced {} bytes".format(
+                        member.name, member.size))
+
+                remaining -= len(chunk)
+                yield chunk
+
+        yield bytes(_padding(member.size, tarfile.BLOCKSIZE))
+        size += len(header) + member.size + _padding(member.size, tarfile.BLOCKSIZE)
+
+    size += 2*tarfile.BLOCKSIZE
+    yield bytes(2*tarfile.BLOCKSIZE + _padding(size, tarfile.RECORDSIZE))
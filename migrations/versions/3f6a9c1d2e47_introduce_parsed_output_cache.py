@@ -0,0 +1,30 @@
+"""introduce parsed output cache
+
+Revision ID: 3f6a9c1d2e47
+Revises: cbbe8d742100
+Create Date: 2026-10-16 10:12:31.540211
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3f6a9c1d2e47'
+down_revision = 'cbbe8d742100'
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+def upgrade():
+    op.create_table('parsed_output',
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('code_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('parser_version', sa.Integer(), nullable=False),
+    sa.Column('data', postgresql.JSONB(), nullable=False),
+    sa.Column('ctime', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['code_id'], ['code.id'], ),
+    sa.PrimaryKeyConstraint('content_hash', 'code_id', 'parser_version')
+    )
+
+
+def downgrade():
+    op.drop_table('parsed_output')
@@ -0,0 +1,116 @@
+"""introduce structure descriptors
+
+Revision ID: 4a8d6e2f1c09
+Revises: c7f3d2a1b8e6
+Create Date: 2026-10-16 19:24:07.318552
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4a8d6e2f1c09'
+down_revision = 'c7f3d2a1b8e6'
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from sqlalchemy.sql import table, column
+from sqlalchemy.orm import sessionmaker
+
+import numpy as np
+from ase import Atoms
+from ase.io.jsonio import decode
+
+Session = sessionmaker()
+
+BATCH_SIZE = 500
+
+DESCRIPTORS = [
+    ('chemical_formula', sa.String()),
+    ('natoms', sa.Integer()),
+    ('elements', postgresql.ARRAY(sa.String())),
+    ('volume', sa.Float()),
+    ('pbc', postgresql.ARRAY(sa.Boolean())),
+    ('net_initial_charge', sa.Float()),
+    ('initial_magnetic_moment', sa.Float()),
+    ]
+
+
+def structure_descriptors(ase_structure):
+    """
+    The descriptors of a structure stored by atoms2json, a frozen copy of
+    fatman.tools.json2atoms and fatman.tools.atoms_descriptors at this revision
+    """
+
+    dct = decode(ase_structure)
+
+    # only the arrays the descriptors depend on
+    atoms = Atoms(numbers=dct['numbers'],
+                  cell=np.array(dct.get('cell'), dtype=float) if dct.get('cell') is not None else None,
+                  pbc=dct.get('pbc'),
+                  magmoms=dct.get('initial_magmoms'),
+                  charges=dct.get('initial_charges'))
+
+    magmoms = atoms.get_initial_magnetic_moments()
+    magmom = magmoms.sum(axis=0)
+
+    if magmoms.ndim > 1:  # non-collinear
+        magmom = np.linalg.norm(magmom)
+
+    volume = abs(np.linalg.det(np.array(atoms.get_cell())))
+
+    return {
+        'chemical_formula': atoms.get_chemical_formula(),
+        'natoms': len(atoms),
+        'elements': sorted(set(atoms.get_chemical_symbols())),
+        'volume': float(volume) if volume > 0 else None,
+        'pbc': [bool(p) for p in atoms.get_pbc()],
+        'net_initial_charge': float(atoms.get_initial_charges().sum()),
+        'initial_magnetic_moment': float(magmom),
+        }
+
+
+def upgrade():
+    for name, coltype in DESCRIPTORS:
+        op.add_column('structure', sa.Column(name, coltype, nullable=True))
+
+    structure_table = table(
+        'structure',
+        column('id', postgresql.UUID(as_uuid=True)),
+        column('ase_structure', sa.Text),
+        *[column(name, coltype) for name, coltype in DESCRIPTORS]
+    )
+
+    sess = Session(bind=op.get_bind())
+
+    # keyset pagination over the id to decode only one batch of structures at a time
+    last_id = None
+
+    while True:
+        query = (sess.query(structure_table.c.id, structure_table.c.ase_structure)
+                 .order_by(structure_table.c.id)
+                 .limit(BATCH_SIZE))
+
+        if last_id is not None:
+            query = query.filter(structure_table.c.id > last_id)
+
+        structures = query.all()
+
+        if not structures:
+            break
+
+        sess.execute(
+            structure_table.update()
+            .where(structure_table.c.id == sa.bindparam('sid')),
+            [dict(structure_descriptors(ase_structure), sid=sid) for sid, ase_structure in structures])
+
+        last_id = structures[-1].id
+
+    for name, coltype in DESCRIPTORS:
+        if name != 'volume':
+            op.alter_column('structure', name, existing_type=coltype, nullable=False)
+
+
+def downgrade():
+    for name, _ in reversed(DESCRIPTORS):
+        op.drop_column('structure', name)
@@ -0,0 +1,30 @@
+"""introduce upload sessions for resumable uploads
+
+Revision ID: 5d1c7e3a8f20
+Revises: 8b2e4f7a9c13
+Create Date: 2026-10-16 15:21:47.302159
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5d1c7e3a8f20'
+down_revision = '8b2e4f7a9c13'
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+def upgrade():
+    op.create_table('upload_session',
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('task_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('compressed', sa.String(length=16), nullable=True),
+    sa.Column('ctime', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['task_id'], ['task2.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('upload_session')
@@ -0,0 +1,28 @@
+"""introduce content-addressed blob storage
+
+Revision ID: 8b2e4f7a9c13
+Revises: 3f6a9c1d2e47
+Create Date: 2026-10-16 14:03:12.918274
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '8b2e4f7a9c13'
+down_revision = '3f6a9c1d2e47'
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+def upgrade():
+    op.create_table('blob',
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('refcount', sa.Integer(), nullable=False),
+    sa.Column('ctime', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('sha256')
+    )
+
+
+def downgrade():
+    op.drop_table('blob')
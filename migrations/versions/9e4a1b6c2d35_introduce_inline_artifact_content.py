@@ -0,0 +1,22 @@
+"""introduce inline artifact content
+
+Revision ID: 9e4a1b6c2d35
+Revises: 5d1c7e3a8f20
+Create Date: 2026-10-16 16:45:08.117392
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '9e4a1b6c2d35'
+down_revision = '5d1c7e3a8f20'
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+def upgrade():
+    op.add_column('artifact', sa.Column('content', sa.LargeBinary(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('artifact', 'content')
@@ -0,0 +1,29 @@
+"""introduce upload session state
+
+Revision ID: b3d7f1a9c5e2
+Revises: e1b5c9d3a7f4
+Create Date: 2026-10-17 10:42:18.214630
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'b3d7f1a9c5e2'
+down_revision = 'e1b5c9d3a7f4'
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+def upgrade():
+    op.add_column('upload_session', sa.Column('state', sa.String(length=16), nullable=False, server_default='receiving'))
+    op.alter_column('upload_session', 'state', server_default=None)
+    op.add_column('upload_session', sa.Column('message', sa.Text(), nullable=True))
+    op.add_column('upload_session', sa.Column('artifact_id', postgresql.UUID(as_uuid=True), nullable=True))
+    op.create_foreign_key('upload_session_artifact_id_fkey', 'upload_session', 'artifact', ['artifact_id'], ['id'], ondelete='SET NULL')
+
+
+def downgrade():
+    op.drop_constraint('upload_session_artifact_id_fkey', 'upload_session', type_='foreignkey')
+    op.drop_column('upload_session', 'artifact_id')
+    op.drop_column('upload_session', 'message')
+    op.drop_column('upload_session', 'state')
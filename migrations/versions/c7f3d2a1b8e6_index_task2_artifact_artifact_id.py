@@ -0,0 +1,22 @@
+"""index task2_artifact.artifact_id
+
+Revision ID: c7f3d2a1b8e6
+Revises: 9e4a1b6c2d35
+Create Date: 2026-10-16 18:02:55.640218
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c7f3d2a1b8e6'
+down_revision = '9e4a1b6c2d35'
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+def upgrade():
+    op.create_index(op.f('ix_task2_artifact_artifact_id'), 'task2_artifact', ['artifact_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_task2_artifact_artifact_id'), table_name='task2_artifact')
@@ -0,0 +1,22 @@
+"""index structure name, id
+
+Revision ID: e1b5c9d3a7f4
+Revises: 4a8d6e2f1c09
+Create Date: 2026-10-16 20:11:42.905317
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'e1b5c9d3a7f4'
+down_revision = '4a8d6e2f1c09'
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+def upgrade():
+    op.create_index('ix_structure_name_id', 'structure', ['name', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_structure_name_id', table_name='structure')
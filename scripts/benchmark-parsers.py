@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Benchmark the output parsers and data checks using synthetic CP2K outputs of scaled size.
+
+Reports the parse throughput (for parsing a file and a str), the peak memory
+and the cost of the single sections (relative to parsing only header & footer).
+"""
+
+import argparse
+import io
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from fatman.tools import parsers, checks
+
+HEADER = """\
+ DBCSR| Multiplication driver                                               XSMM
+
+  **** **** ******  **  PROGRAM STARTED AT               2017-06-21 12:41:38.123
+ ***** ** ***  *** **   PROGRAM STARTED ON                              nid01234
+ **    ****   ******    PROGRAM STARTED BY                                 fatman
+ ***** **    ** ** **   PROGRAM PROCESS ID                                   12345
+  **** **  *******  **  PROGRAM STARTED IN /scratch/fatman.calc
+
+ CP2K| version string:                                          CP2K version 5.0
+ CP2K| source code revision number:                                  svn:17462
+ GLOBAL| Total number of message passing processes                           288
+ GLOBAL| Number of threads for this process                                    2
+"""
+
+FOOTER = """
+  **** **** ******  **  PROGRAM ENDED AT                 2017-06-21 12:45:01.456
+ ***** ** ***  *** **   PROGRAM RAN ON                                  nid01234
+ **    ****   ******    PROGRAM RAN BY                                     fatman
+ ***** **    ** ** **   PROGRAM PROCESS ID                                   12345
+  **** **  *******  **  PROGRAM STOPPED IN /scratch/fatman.calc
+"""
+
+CONDITION_NUMBER = """
+ OVERLAP MATRIX CONDITION NUMBER AT GAMMA POINT
+ 1-Norm Condition Number (Estimate)
+   CN : |A|*|A^-1|:  1.234E+01 *  5.678E+02 =  7.006E+03 Log(1-CN):  3.8455
+ 1-Norm and 2-Norm Condition Numbers using Diagonalization
+   CN : |A|*|A^-1|:  1.234E+01 *  6.000E+02 =  7.404E+03 Log(1-CN):  3.8695
+   CN : max/min ev:  5.000E+00 /  1.000E-03 =  5.000E+03 Log(2-CN):  3.6990
+"""
+
+MOMENTS = """
+ ELECTRIC/MAGNETIC MOMENTS
+  Reference Point [Bohr]           0.00000000    0.00000000    0.00000000
+  Charges
+    Electronic=     16.00000000    Core=   -16.00000000    Total=     0.00000000
+  Dipoles are based on the traditional operator.
+  Dipole moment [Debye]
+    X=    0.00000001 Y=    0.00000002 Z=   -0.00000003     Total=      0.00000004
+"""
+
+# the optional features which can be enabled in the synthetic outputs
+VARIANTS = {
+    'minimal': {},
+    'uks': {'uks': True},
+    'gw': {'gw': True},
+    'kpoints': {'kpoints': True},
+    'moments': {'moments': True},
+    'warnings': {'nwarnings': 1000},
+    'all': {'uks': True, 'gw': True, 'kpoints': True, 'moments': True, 'nwarnings': 1000},
+    }
+
+
+def generate_cp2k_output(natoms, uks=False, gw=False, kpoints=False, moments=False, nwarnings=0, nscf=30):
+    """
+    Generate a synthetic CP2K output for the given number of atoms.
+
+    Besides the sections extracted by the parser it contains the atomic coordinates
+    and SCF iterations, which make up most of a real output and have to be skipped.
+    """
+
+    out = io.StringIO()
+    out.write(HEADER)
+
+    if kpoints:
+        out.write(" BRILLOUIN| List of Kpoints [2 Pi/Bohr]                                      64\n")
+
+    out.write("\n ATOMIC KIND INFORMATION\n\n")
+    out.write("  1. Atomic kind: Fe                                    Number of atoms: {:7d}\n".format(natoms))
+
+    out.write("\n MODULE QUICKSTEP:  ATOMIC COORDINATES IN angstrom\n\n")
+    out.write("  Atom  Kind  Element       X           Y           Z          Z(eff)       Mass\n\n")
+    for idx in range(1, natoms+1):
+        out.write("  {:6d}    1 Fe  26    {:10.6f}  {:10.6f}  {:10.6f}      16.00      55.8450\n".format(
+            idx, 0.1*idx, 0.2*idx, 0.3*idx))
+
+    for idx in range(nwarnings):
+        out.write("\n *** WARNING in qs_scf.F:542 :: SCF run NOT converged in iteration {:7d} ***\n".format(idx))
+        out.write(" ***                   To continue the calculation                   ***\n")
+
+    out.write(CONDITION_NUMBER)
+
+    out.write("\n  Step     Update method      Time    Convergence         Total energy    Change\n")
+    out.write("  ------------------------------------------------------------------------------\n")
+    for idx in range(1, nscf*max(1, natoms//100)+1):
+        out.write("  {:6d} Pulay/Diag. 0.50E+00    0.5     0.00012345     -246.1234567890 -2.46E+02\n".format(idx))
+
+    out.write("\n Mulliken Population Analysis\n\n")
+    if uks:
+        out.write(" #  Atom  Element  Kind  Atomic population (alpha,beta) Net charge  Spin moment\n")
+        for idx in range(1, natoms+1):
+            out.write("  {:6d}     Fe       1          8.139170   5.860830     0.000000     2.278341\n".format(idx))
+        out.write(" # Total charge and spin  {:16.6f}  {:16.6f}     0.000000  {:16.6f}\n".format(
+            8.13917*natoms, 5.86083*natoms, 2.278341*natoms))
+    else:
+        out.write(" #  Atom  Element  Kind  Atomic population  Net charge\n")
+        for idx in range(1, natoms+1):
+            out.write("  {:6d}     Fe       1          8.000000     0.000000\n".format(idx))
+        out.write(" # Total charge           {:16.6f}     0.000000\n".format(8.0*natoms))
+
+    if moments:
+        out.write(MOMENTS)
+
+    if gw:
+        # GW is only feasible for smaller systems, limit the number of orbitals accordingly
+        nmos = min(8*natoms, 4000)
+        out.write("\n  MO      E_SCF       Sigc   Sigc_fit   Sigx-vxc          Z       E_GW\n")
+        for idx in range(1, nmos+1):
+            out.write("  {:4d} ( {} )   -25.123     3.456      3.400     -5.678      0.789    -27.345\n".format(
+                idx, 'occ' if idx <= nmos//2 else 'vir'))
+
+    out.write("\n ENERGY| Total FORCE_EVAL ( QS ) energy (a.u.):             -246.123456789012\n")
+    out.write("\n The number of warnings for this run is : {}\n".format(nwarnings))
+    out.write(FOOTER)
+
+    return out.getvalue()
+
+
+def best_of(repeat, func, *args):
+    """The minimal runtime of repeat calls to func"""
+
+    timings = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+
+    return min(timings)
+
+
+def benchmark(content, repeat):
+    """Run all benchmarks on the given output"""
+
+    size = len(content.encode('utf-8'))
+    result = {'size_MB': size/1e6}
+
+    with tempfile.NamedTemporaryFile('w', suffix='.out', delete=False) as fhandle:
+        fhandle.write(content)
+
+    def parse_file(sections=None):
+        with open(fhandle.name, 'r') as infile:
+            return parsers.parse_cp2k_output(infile, sections)
+
+    try:
+        result['file_s'] = best_of(repeat, parse_file)
+        result['str_s'] = best_of(repeat, lambda: parsers.get_data_from_output(io.StringIO(content), 'CP2K'))
+        result['file_MB/s'] = result['size_MB']/result['file_s']
+        result['str_MB/s'] = result['size_MB']/result['str_s']
+
+        tracemalloc.start()
+        data = parse_file()
+        result['peak_memory_MB'] = tracemalloc.get_traced_memory()[1]/1e6
+        tracemalloc.stop()
+
+        result['checks_s'] = best_of(repeat, checks.generate_checks_dict, data, 'CP2K', 'deltatest_Fe')
+
+        # the cost of a section is the additional time compared to parsing only header & footer
+        baseline = best_of(repeat, parse_file, [])
+        result['sections_s'] = {'(header & footer)': baseline}
+
+        for section in parsers.CP2K_SECTIONS:
+            # clamp the timing noise for sections not present in the output
+            result['sections_s'][section] = max(0., best_of(repeat, parse_file, [section]) - baseline)
+
+    finally:
+        os.unlink(fhandle.name)
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--natoms', metavar='N', type=int, nargs='+', default=[2, 100, 1000, 10000, 50000],
+                        help="The system sizes to generate outputs for")
+    parser.add_argument('--variant', dest='variants', metavar='VARIANT', choices=sorted(VARIANTS),
+                        action='append', help="Run only the given variants (can be specified multiple times)")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Take the best time out of this many runs")
+    parser.add_argument('--sections', action='store_true',
+                        help="Print the cost per section")
+    parser.add_argument('--json', metavar='FILE', type=str,
+                        help="Write all results to the given JSON file (for comparing runs)")
+    args = parser.parse_args()
+
+    results = []
+
+    print("{:>6} {:>9} {:>8} {:>10} {:>10} {:>10} {:>10}".format(
+        "natoms", "variant", "size/MB", "file MB/s", "str MB/s", "peak/MB", "checks/ms"))
+
+    for natoms in args.natoms:
+        for variant in args.variants or sorted(VARIANTS):
+            result = benchmark(generate_cp2k_output(natoms, **VARIANTS[variant]), args.repeat)
+            result.update({'natoms': natoms, 'variant': variant})
+            results.append(result)
+
+            print("{natoms:6d} {variant:>9} {size_MB:8.2f} {file_MB/s:10.1f} {str_MB/s:10.1f}"
+                  " {peak_memory_MB:10.2f} {checks_ms:10.3f}".format(checks_ms=result['checks_s']*1e3, **result))
+
+            if args.sections:
+                for section, timing in result['sections_s'].items():
+                    print("{:>33}: {:8.2f} ms".format(section, timing*1e3))
+
+    if args.json:
+        with open(args.json, 'w') as fhandle:
+            json.dump(results, fhandle, indent=2)
+
+
+if __name__ == '__main__':
+    main()
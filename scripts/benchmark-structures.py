@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark decoding stored structures (as written by atoms2json) of scaled size,
+comparing json2atoms with decoding via the ASE database row.
+
+Reports the time per structure for both paths and checks that they yield the same Atoms objects.
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+from ase.build import bulk
+
+from fatman.tools import atoms2json, json2atoms, _json2atoms_ase
+
+
+def generate_structure(natoms):
+    """Generate a periodic structure with (about) the given number of atoms, magnetic moments and charges"""
+
+    atoms = bulk('Fe', cubic=True)
+    atoms = atoms.repeat(max(1, int(round((natoms/len(atoms))**(1/3)))))
+    atoms.rattle(1e-3)
+    atoms.set_initial_magnetic_moments(np.full(len(atoms), 2.2))
+    atoms.set_initial_charges(np.zeros(len(atoms)))
+
+    return atoms
+
+
+def best_of(repeat, number, func, *args):
+    """The minimal runtime of one call to func, out of repeat runs of number calls"""
+
+    timings = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func(*args)
+        timings.append((time.perf_counter() - start)/number)
+
+    return min(timings)
+
+
+def same_atoms(atoms1, atoms2):
+    """Whether two Atoms objects are bit-for-bit identical (arrays, cell, pbc and info)"""
+
+    return (atoms1 == atoms2
+            and atoms1.arrays.keys() == atoms2.arrays.keys()
+            and all(atoms1.arrays[k].dtype == atoms2.arrays[k].dtype
+                    and atoms1.arrays[k].tobytes() == atoms2.arrays[k].tobytes() for k in atoms1.arrays)
+            and np.array(atoms1.get_cell()).tobytes() == np.array(atoms2.get_cell()).tobytes()
+            and atoms1.info == atoms2.info)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--natoms', metavar='N', type=int, nargs='+', default=[2, 16, 128, 1024, 8192],
+                        help="The system sizes to generate structures for")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="Take the best time out of this many runs")
+    parser.add_argument('--number', type=int, default=200,
+                        help="Number of decodings per run (divided by the number of atoms for larger structures)")
+    parser.add_argument('--json', metavar='FILE', type=str,
+                        help="Write all results to the given JSON file (for comparing runs)")
+    args = parser.parse_args()
+
+    results = []
+
+    print("{:>6} {:>9} {:>10} {:>10} {:>8} {:>5}".format(
+        "natoms", "size/kB", "ase/ms", "fast/ms", "speedup", "same"))
+
+    for natoms in args.natoms:
+        atoms = generate_structure(natoms)
+        jsonstring = atoms2json(atoms)
+        number = max(1, args.number*16//max(16, len(atoms)))
+
+        result = {
+            'natoms': len(atoms),
+            'size_kB': len(jsonstring)/1e3,
+            'ase_s': best_of(args.repeat, number, _json2atoms_ase, jsonstring),
+            'fast_s': best_of(args.repeat, number, json2atoms, jsonstring),
+            'same': same_atoms(_json2atoms_ase(jsonstring), json2atoms(jsonstring)),
+            }
+        results.append(result)
+
+        print("{natoms:6d} {size_kB:9.1f} {ase_ms:10.3f} {fast_ms:10.3f} {speedup:8.2f} {same!s:>5}".format(
+            ase_ms=result['ase_s']*1e3, fast_ms=result['fast_s']*1e3,
+            speedup=result['ase_s']/result['fast_s'], **result))
+
+    if args.json:
+        with open(args.json, 'w') as fhandle:
+            json.dump(results, fhandle, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+import click
+import requests
+
+COLLECTIONS_URL = '{}/api/v2/calculationcollections'
+CHUNK_SIZE = 1024*1024
+
+
+@click.command()
+@click.argument('collection', type=str)
+@click.option('--artifact', '-a', 'artifacts', type=str, multiple=True,
+              help="Only export artifacts with this name, e.g. calc.out (can be specified multiple times)")
+@click.option('--output', '-o', type=click.File('wb'), default='-', show_default=True,
+              help="The tar file to write")
+@click.option('--url', type=str, default='https://tctdb.chem.uzh.ch/fatman',
+              show_default=True, help="The URL where FATMAN is running")
+def export_outputs(url, collection, artifacts, output):
+    """
+    Export the output artifacts of the current task of all calculations
+    in the given collection as a tar archive, with a directory per calculation.
+    """
+
+    sess = requests.Session()
+    # the certificate is signed by the inofficial TC-Chem CA
+    sess.verify = False
+
+    req = sess.get(COLLECTIONS_URL.format(url))
+    req.raise_for_status()
+
+    try:
+        coll = next(c for c in req.json() if c['name'] == collection)
+    except StopIteration:
+        raise click.BadParameter("collection '{}' not found".format(collection))
+
+    params = {'artifact': ','.join(artifacts)} if artifacts else {}
+
+    # the archive is generated while sending, stream it to the output as well
+    with sess.get(coll['_links']['outputs'], params=params, stream=True) as req:
+        req.raise_for_status()
+
+        size = 0
+        for chunk in req.iter_content(CHUNK_SIZE):
+            output.write(chunk)
+            size += len(chunk)
+
+    click.echo("Exported {:.1f} MB".format(size/1e6), err=True)
+
+
+if __name__ == "__main__":
+    export_outputs()
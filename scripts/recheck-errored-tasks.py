@@ -4,14 +4,14 @@ Check the output of (CP2K) calculation tasks with the error status
 for cases where the fdaemon reported an error due to missing accounting data.
 """
 
-import bz2
-from urllib.parse import urlsplit
-
-from fatman import app, resultfiles, db
+from fatman import app, db
 from fatman.models import Calculation, Code, TaskStatus
 from fatman.tools import parsers
 from fatman.tasks import generate_calculation_results, generate_test_result
 
+# the CP2K footer with the timings report is usually much smaller
+TAIL_SIZE = 64*1024
+
 with app.app_context():
     # can currently only check CP2K
     for calc in Calculation.query.join(Code).filter(Code.name == "CP2K"):
@@ -29,27 +29,24 @@ with app.app_context():
             print("skipping task {}: no {} file found".format(task.id, resultfile_name))
             continue
 
+        # CP2K writes the footer only when it finished, check it first: for uncompressed and
+        # indexed bz2 artifacts this requires only the last blocks to be read
         try:
-            scheme, nwloc, path, _, _ = urlsplit(artifact.path)
-
-            #print("... checking {}".format(path))
-
-            if scheme == 'fkup' and nwloc == 'results':
-                filepath = resultfiles.path(path[1:])
+            tail = artifact.read_tail(TAIL_SIZE).decode('utf-8', errors='replace')
+        except RuntimeError:
+            # ignore unknown storage schemes and compression formats
+            print("skipping task {}: invalid storage or compression format for {} found".format(
+                task.id, resultfile_name))
+            continue
 
-                # Artifact.name contains a full path, including possible subdirs
-                compressed = artifact.mdata.get('compressed', None)
+        if not parsers.CP2K_FOOTER_MATCH.search(tail):
+            print("skipping task {}: output {} not complete".format(task.id, resultfile_name))
+            continue
 
-                if compressed is None:
-                    with open(filepath, 'r') as fhandle:
-                        results = parsers.get_data_from_output(fhandle, calc.code.name)
-                elif compressed == 'bz2':
-                    with bz2.open(filepath, mode='rt') as fhandle:
-                        results = parsers.get_data_from_output(fhandle, calc.code.name)
-                else:
-                    # ignore unknown compression formats
-                    print("skipping task {}: invalid compression format for {} found".format(task.id, resultfile_name))
-                    continue
+        try:
+            with artifact.open('rt') as fhandle:
+                # only check whether the output is complete and valid
+                parsers.get_data_from_output(fhandle, calc.code.name, sections=[])
 
         except parsers.OutputParseError:
             # ignore tasks where the result is actually not parseable
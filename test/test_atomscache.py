@@ -0,0 +1,77 @@
+
+import unittest
+
+from ase import Atoms
+
+from fatman.tools.atomscache import AtomsCache
+
+
+class TestAtomsCache(unittest.TestCase):
+    """Tests for the LRU cache of Atoms objects"""
+
+    def setUp(self):
+        self.loaded = []
+
+    def load(self, symbol):
+        def _load():
+            self.loaded.append(symbol)
+            atoms = Atoms(symbol, positions=[(0., 0., 0.)], cell=[5., 5., 5.], pbc=True)
+            atoms.info['key_value_pairs'] = {'origin': 'test'}
+            return atoms
+        return _load
+
+    def test_hits_and_copies(self):
+        cache = AtomsCache(2)
+
+        first = cache.get('a', self.load('H'))
+        first.positions[0, 0] = 1.
+        first.info['cp2k_labels'] = ['H1']
+        first.info['key_value_pairs']['origin'] = 'modified'
+
+        second = cache.get('a', self.load('H'))
+
+        self.assertEqual(self.loaded, ['H'])
+        self.assertEqual(second.positions[0, 0], 0.)
+        self.assertNotIn('cp2k_labels', second.info)
+        self.assertEqual(second.info['key_value_pairs'], {'origin': 'test'})
+        self.assertEqual(cache.info(), (1, 1, 2, 1))
+
+    def test_eviction(self):
+        cache = AtomsCache(2)
+
+        cache.get('a', self.load('H'))
+        cache.get('b', self.load('He'))
+        cache.get('a', self.load('H'))  # b is now the least recently used
+        cache.get('c', self.load('Li'))
+        cache.get('a', self.load('H'))
+        cache.get('b', self.load('He'))
+
+        self.assertEqual(self.loaded, ['H', 'He', 'Li', 'He'])
+        self.assertEqual(cache.info().currsize, 2)
+
+    def test_evict(self):
+        cache = AtomsCache(2)
+
+        cache.get('a', self.load('H'))
+        cache.evict('a')
+        cache.evict('b')  # not cached
+        cache.get('a', self.load('He'))
+
+        self.assertEqual(self.loaded, ['H', 'He'])
+        self.assertEqual(cache.info(), (0, 2, 2, 1))
+
+    def test_disabled(self):
+        cache = AtomsCache(0)
+
+        cache.get('a', self.load('H'))
+        cache.get('a', self.load('H'))
+
+        self.assertEqual(self.loaded, ['H', 'H'])
+        self.assertEqual(cache.info(), (0, 2, 0, 0))
+
+        cache.clear()
+        self.assertEqual(cache.info().misses, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+
+import bz2
+import io
+import random
+import unittest
+
+from fatman.tools import bz2blocks
+
+
+class TestBZ2Blocks(unittest.TestCase):
+    """Tests for the indexed bzip2 reader"""
+
+    def setUp(self):
+        rnd = random.Random(42)
+        # incompressible data to get several blocks with the smallest block size
+        self.data = bytes(rnd.getrandbits(8) for _ in range(250000))
+        self.compressed = bz2.compress(self.data, 1) + bz2.compress(self.data[:1000], 1)
+        self.data += self.data[:1000]
+
+    def test_index(self):
+        index = bz2blocks.build_index(io.BytesIO(self.compressed))
+        self.assertEqual(len(index['blocks']), 4)
+        self.assertEqual(index['size'], len(self.data))
+
+    def test_index_bounded_read_ahead(self):
+        """building the index with workers reads only a few blocks ahead of the decompression"""
+        data = random.Random(1).getrandbits(8*4000000).to_bytes(4000000, 'little')
+        compressed = bz2.compress(data, 1)
+
+        read_block, decompress_block = bz2blocks.read_block, bz2blocks.decompress_block
+        reads, decompressed, ahead = [], [], []
+
+        def counting_read_block(*args):
+            reads.append(1)
+            ahead.append(len(reads) - len(decompressed))
+            return read_block(*args)
+
+        def counting_decompress_block(*args):
+            result = decompress_block(*args)
+            decompressed.append(1)
+            return result
+
+        bz2blocks.read_block, bz2blocks.decompress_block = counting_read_block, counting_decompress_block
+
+        try:
+            index = bz2blocks.build_index(io.BytesIO(compressed), workers=2)
+        finally:
+            bz2blocks.read_block, bz2blocks.decompress_block = read_block, decompress_block
+
+        self.assertEqual(index['size'], len(data))
+        self.assertGreater(len(index['blocks']), 30)
+        self.assertLessEqual(max(ahead), 2*2)
+
+    def test_read(self):
+        index = bz2blocks.build_index(io.BytesIO(self.compressed), workers=2)
+
+        for workers in [None, 2]:
+            with io.BufferedReader(bz2blocks.IndexedBZ2File(io.BytesIO(self.compressed), index, workers)) as fhandle:
+                self.assertEqual(fhandle.read(), self.data)
+
+                fhandle.seek(-1500, io.SEEK_END)
+                self.assertEqual(fhandle.read(), self.data[-1500:])
+
+                fhandle.seek(120000)
+                self.assertEqual(fhandle.read(1000), self.data[120000:121000])
@@ -0,0 +1,81 @@
+
+import io
+import os
+import tempfile
+import unittest
+
+from fatman.tools import compression
+
+
+class TestCompression(unittest.TestCase):
+    """Tests for the artifact compression codecs"""
+
+    def setUp(self):
+        self.data = b''.join(b"line %d of the output\n" % i for i in range(100000))
+
+    def test_roundtrip(self):
+        for name in compression.CODECS:
+            with self.subTest(codec=name):
+                # use a small chunk size to get multiple compressor calls
+                reader = compression.CompressingReader(io.BytesIO(self.data), name, chunk_size=4096)
+
+                with tempfile.NamedTemporaryFile(delete=False) as fhandle:
+                    fhandle.write(io.BufferedReader(reader).read())
+
+                try:
+                    self.assertEqual(reader.size, len(self.data))
+                    self.assertLess(os.path.getsize(fhandle.name), len(self.data))
+
+                    with compression.open_compressed(fhandle.name, name) as infile:
+                        self.assertEqual(infile.read(), self.data)
+                finally:
+                    os.unlink(fhandle.name)
+
+    def test_fileobj(self):
+        """the compressed content can also be read from a file object, e.g. for inline artifacts"""
+        for name in compression.CODECS:
+            with self.subTest(codec=name):
+                compressed = io.BufferedReader(compression.CompressingReader(io.BytesIO(self.data), name)).read()
+
+                with compression.open_compressed(io.BytesIO(compressed), name) as infile:
+                    self.assertEqual(infile.read(), self.data)
+
+    def test_read_range(self):
+        """suffix and other ranges of the decompressed content, also for bz2 files without index"""
+        size = len(self.data)
+
+        for name in compression.CODECS:
+            compressed = io.BufferedReader(compression.CompressingReader(io.BytesIO(self.data), name)).read()
+
+            for start, stop in [(size - 200, size), (1000, 5000), (0, None), (size, size)]:
+                with self.subTest(codec=name, start=start, stop=stop):
+                    with compression.open_compressed(io.BytesIO(compressed), name) as infile:
+                        content = b''.join(compression.read_range(infile, start, stop, chunk_size=4096))
+
+                    self.assertEqual(content, self.data[start:stop])
+
+    def test_read_range_unseekable(self):
+        """streams without random access are read sequentially up to the start"""
+
+        class Unseekable(io.RawIOBase):
+            def __init__(self, data):
+                self._data = io.BytesIO(data)
+
+            def readable(self):
+                return True
+
+            def readinto(self, buf):
+                return self._data.readinto(buf)
+
+        fhandle = io.BufferedReader(Unseekable(self.data))
+        self.assertFalse(fhandle.seekable())
+
+        content = b''.join(compression.read_range(fhandle, len(self.data) - 200, chunk_size=4096))
+        self.assertEqual(content, self.data[-200:])
+
+        fhandle = io.BufferedReader(Unseekable(self.data))
+        self.assertEqual(list(compression.read_range(fhandle, len(self.data) + 10)), [])
+
+    def test_unknown(self):
+        with self.assertRaises(RuntimeError):
+            compression.get_codec('rar')
@@ -0,0 +1,99 @@
+
+import json
+import unittest
+
+import numpy as np
+from ase.build import bulk, molecule
+
+from fatman.tools import atoms2json, json2atoms, _json2atoms_ase, atoms_descriptors
+
+
+class TestJson2Atoms(unittest.TestCase):
+    """Tests for decoding structures stored by atoms2json"""
+
+    def assertSameAtoms(self, atoms, decoded):
+        self.assertEqual(atoms, decoded)
+
+        for name, array in atoms.arrays.items():
+            # bit-for-bit equal, including the type
+            self.assertEqual(array.dtype, decoded.arrays[name].dtype, name)
+            self.assertEqual(array.tobytes(), decoded.arrays[name].tobytes(), name)
+
+        self.assertEqual(np.array(atoms.get_cell()).tobytes(), np.array(decoded.get_cell()).tobytes())
+
+    def assertDecodesLikeAse(self, jsonstring):
+        """json2atoms yields the same Atoms object as the decoding via the ASE database row"""
+
+        reference = _json2atoms_ase(jsonstring)
+        decoded = json2atoms(jsonstring)
+
+        self.assertSameAtoms(reference, decoded)
+        self.assertEqual(reference.info, decoded.info)
+
+        return decoded
+
+    def test_periodic(self):
+        atoms = bulk('Fe', cubic=True).repeat(2)
+        atoms.rattle(1e-3)
+        atoms.set_initial_magnetic_moments(np.linspace(-2., 2., len(atoms)))
+        atoms.set_initial_charges(np.linspace(0., 1., len(atoms)))
+
+        self.assertSameAtoms(atoms, self.assertDecodesLikeAse(atoms2json(atoms)))
+
+    def test_molecule(self):
+        atoms = molecule('H2O')
+        decoded = self.assertDecodesLikeAse(atoms2json(atoms, {'origin': 'g2', 'multiplicity': 1}))
+
+        self.assertSameAtoms(atoms, decoded)
+        self.assertEqual(decoded.info['key_value_pairs'], {'origin': 'g2', 'multiplicity': 1})
+        self.assertIn('unique_id', decoded.info)
+
+    def test_row_property_names(self):
+        """key-value pairs named like a property or column of the ASE row get its value, as with ASE"""
+
+        atoms = molecule('H2O')
+        decoded = self.assertDecodesLikeAse(atoms2json(atoms, {'origin': 'g2', 'charge': 1, 'natoms': 7}))
+
+        self.assertSameAtoms(atoms, decoded)
+        self.assertEqual(decoded.info['key_value_pairs'], {'origin': 'g2', 'charge': 0., 'natoms': 3})
+
+    def test_plain_lists(self):
+        """older ASE versions stored arrays as plain lists"""
+
+        atoms = bulk('NaCl', 'rocksalt', a=5.64)
+        dct = json.loads(atoms2json(atoms))
+        dct.update({
+            'numbers': atoms.get_atomic_numbers().tolist(),
+            'positions': atoms.get_positions().tolist(),
+            'cell': np.array(atoms.get_cell()).tolist(),
+            'pbc': atoms.get_pbc().tolist(),
+            })
+
+        self.assertSameAtoms(atoms, self.assertDecodesLikeAse(json.dumps(dct)))
+
+
+class TestAtomsDescriptors(unittest.TestCase):
+    """Tests for the structural descriptors stored alongside the structures"""
+
+    def test_bulk(self):
+        atoms = bulk('NaCl', 'rocksalt', a=5.64)
+        descriptors = atoms_descriptors(json2atoms(atoms2json(atoms)))
+
+        self.assertEqual(descriptors['chemical_formula'], 'ClNa')
+        self.assertEqual(descriptors['natoms'], 2)
+        self.assertEqual(descriptors['elements'], ['Cl', 'Na'])
+        self.assertAlmostEqual(descriptors['volume'], atoms.get_volume())
+        self.assertEqual(descriptors['pbc'], [True]*3)
+
+    def test_no_cell(self):
+        """the volume of a molecule without a cell is NULL, the deltatest and its plot skip those"""
+
+        descriptors = atoms_descriptors(json2atoms(atoms2json(molecule('H2O'))))
+
+        self.assertEqual(descriptors['natoms'], 3)
+        self.assertIsNone(descriptors['volume'])
+        self.assertEqual(descriptors['pbc'], [False]*3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+
+import unittest
+from io import StringIO
+from os import path
+
+from fatman.tools import parsers
+
+OUTPUTS_BASE = path.join(path.dirname(path.abspath(__file__)), 'outputs')
+
+
+def read_output(name):
+    with open(path.join(OUTPUTS_BASE, name), 'r') as fhandle:
+        return fhandle.read()
+
+
+class TestCP2KParser(unittest.TestCase):
+    """Tests for the CP2K output parser"""
+
+    def setUp(self):
+        self.content = read_output('cp2k_uks.out')
+
+    def test_parse(self):
+        """complete output"""
+        data = parsers.parse_cp2k_output(StringIO(self.content))
+
+        self.assertEqual(data['started_at'], '2017-06-21 12:41:38.123')
+        self.assertEqual(data['ended_at'], '2017-06-21 12:45:01.456')
+        self.assertEqual(data['machine'], 'nid01234')
+        self.assertEqual(data['version'], 'svn:17462')
+        self.assertEqual(data['mpiranks'], 36)
+        self.assertEqual(data['threads'], 2)
+        self.assertEqual(data['nkpoints'], 8)
+        self.assertEqual(data['total_energy'], -246.123456789012)
+        self.assertEqual(data['warnings_count'], 2)
+        self.assertEqual(data['warnings'], [
+            "in cryssym.F:163 :: Symmetry library SPGLIB not available",
+            "in qs_scf.F:542 :: SCF run NOT converged regardless, please set the keyword",
+            ])
+        self.assertEqual(data['atomic_kind_information'], [
+            {'kind': 'Fe', 'natoms': 2},
+            {'kind': 'Fe2', 'natoms': 2},
+            ])
+
+        gw_data = data['GW_quasiparticle_energies']
+        self.assertEqual(gw_data['MO_nr'], [1, 2, 3])
+        self.assertEqual(gw_data['MO_type'], ['occ', 'occ', 'vir'])
+        self.assertEqual(gw_data['E_GW'], [-27.345, -11.4, 1.65])
+
+        mulliken = data['mulliken_population_analysis']
+        self.assertEqual(mulliken['per-atom']['element'], ['Fe', 'Fe'])
+        self.assertEqual(mulliken['per-atom']['population_alpha'], [8.13917, 8.13917])
+        self.assertEqual(mulliken['total']['spin'], 4.556681)
+
+        moments = data['electric_magnetic_moments']
+        self.assertEqual(parsers.table_column(moments['components'], 'reference_point'), [0., 0., 0.])
+        self.assertEqual(parsers.table_rows(moments['components'])[2],
+                         {'axis': 'Z', 'reference_point': 0., 'dipole_moment': -3e-08})
+
+        cond = data['overlap_matrix_condition_number']
+        self.assertEqual(cond['2-norm (using diagonalization)']['CN'], 5000.)
+
+    def test_first_match(self):
+        """only the first occurrence of a value is used"""
+        content = self.content.replace(
+            " ENERGY| Total FORCE_EVAL",
+            " ENERGY| Total FORCE_EVAL ( QS ) energy (a.u.):   -1.0\n ENERGY| Total FORCE_EVAL")
+        data = parsers.parse_cp2k_output(StringIO(content))
+        self.assertEqual(data['total_energy'], -1.0)
+
+    def test_truncated_table(self):
+        """a Mulliken table without totals is ignored"""
+        content = self.content.replace(" # Total charge and spin", " # Truncated")
+        data = parsers.parse_cp2k_output(StringIO(content))
+        self.assertNotIn('mulliken_population_analysis', data)
+
+    def test_missing_footer(self):
+        """an output without footer is rejected"""
+        content = self.content.split("  **** **** ******  **  PROGRAM ENDED AT")[0]
+        with self.assertRaises(parsers.OutputParseError):
+            parsers.parse_cp2k_output(StringIO(content))
+
+    def test_sections(self):
+        """only the requested sections are extracted"""
+        data = parsers.parse_cp2k_output(StringIO(self.content), ['total_energy', 'atomic_kind_information'])
+
+        self.assertEqual(data['total_energy'], -246.123456789012)
+        self.assertEqual(len(data['atomic_kind_information']), 2)
+        self.assertEqual(data['ended_at'], '2017-06-21 12:45:01.456')
+        self.assertNotIn('mulliken_population_analysis', data)
+        self.assertNotIn('warnings', data)
+
+        with self.assertRaises(ValueError):
+            parsers.parse_cp2k_output(StringIO(self.content), ['unknown'])
+
+    def test_malformed_warning(self):
+        """a warnings block not matching the expected format is skipped"""
+        matcher = parsers._WarningsMatcher()
+        matcher.busy = True
+        matcher.lines = [" *** WARNING in qs_scf.F:542 :: SCF run NOT"]  # truncated output
+
+        matcher.finish()
+
+        self.assertEqual(matcher.warnings, [])
+        self.assertFalse(matcher.busy)
+
+    def test_mmap(self):
+        """parsing a plain file (memory-mapped) or bytes gives the same data"""
+        expected = parsers.parse_cp2k_output(StringIO(self.content))
+
+        with open(path.join(OUTPUTS_BASE, 'cp2k_uks.out'), 'r') as fhandle:
+            self.assertEqual(parsers.parse_cp2k_output(fhandle), expected)
+
+        self.assertEqual(parsers.parse_cp2k_output(self.content.encode('utf-8')), expected)
+
+
+class TestTables(unittest.TestCase):
+    """Tests for the helpers to access tables in columnar or row form"""
+
+    def test_rows(self):
+        rows = [{'element': 'H', 'charge': 0.1}, {'element': 'O', 'charge': -0.2}]
+        columns = {'element': ['H', 'O'], 'charge': [0.1, -0.2]}
+
+        self.assertEqual(parsers.table_rows(columns), rows)
+        self.assertEqual(parsers.table_rows(rows), rows)
+        self.assertEqual(parsers.table_column(columns, 'charge'), [0.1, -0.2])
+        self.assertEqual(parsers.table_column(rows, 'charge'), [0.1, -0.2])
@@ -0,0 +1,160 @@
+
+import io
+import json
+import tarfile
+import unittest
+
+import numpy as np
+from ase import Atoms, data as ase_data
+from ase.build import bulk, molecule
+
+from fatman.tools.structures import bounding_box_cell, read_frames
+
+
+def _bounding_box_cell_loop(struct, buf_size, cubic=False):
+    """The per-atom computation of the boundary box cell, as used before bounding_box_cell"""
+
+    radii = [ase_data.vdw_radii[n]
+             if not np.isnan(ase_data.vdw_radii[n])
+             else ase_data.covalent_radii[n]
+             for n in struct.get_atomic_numbers()]
+
+    radii_pos = list(zip(radii, struct.get_positions()))
+
+    cell = [
+        max(pos[i] + rad for rad, pos in radii_pos)
+        - min(pos[i] - rad for rad, pos in radii_pos)
+        + buf_size
+        for i in range(3)
+        ]
+
+    cell = [np.ceil(c) for c in cell]
+
+    if cubic:
+        cell = [max(cell)]*3
+
+    return cell
+
+
+class TestBoundingBoxCell(unittest.TestCase):
+    """Tests for the generated cell of structures without one"""
+
+    def test_same_as_loop(self):
+        rng = np.random.RandomState(42)
+
+        # elements without a VdW radius (like Ti) use their covalent radius
+        structures = [molecule('H2O'), molecule('C6H6'), Atoms('TiO2U', positions=rng.uniform(-3., 3., (4, 3)))]
+
+        for struct in structures:
+            for buf_size in (5., 10.):
+                for cubic in (False, True):
+                    with self.subTest(formula=struct.get_chemical_formula(), buf_size=buf_size, cubic=cubic):
+                        self.assertEqual(bounding_box_cell(struct, buf_size, cubic).tolist(),
+                                         _bounding_box_cell_loop(struct, buf_size, cubic))
+
+    def test_single_atom(self):
+        struct = Atoms('Ar', positions=[(1., 2., 3.)])
+        self.assertEqual(bounding_box_cell(struct, 5.).tolist(), [9., 9., 9.])
+
+
+class TestReadFrames(unittest.TestCase):
+    """Tests for reading the frames of uploaded geometries"""
+
+    @staticmethod
+    def xyz(*structures):
+        fhandle = io.StringIO()
+
+        for struct in structures:
+            struct.write(fhandle, format='extxyz')
+
+        return fhandle.getvalue()
+
+    @staticmethod
+    def archive(files):
+        fhandle = io.BytesIO()
+
+        with tarfile.open(fileobj=fhandle, mode='w:gz') as archive:
+            for name, content in files.items():
+                data = content.encode('utf-8')
+                tarinfo = tarfile.TarInfo(name)
+                tarinfo.size = len(data)
+                archive.addfile(tarinfo, io.BytesIO(data))
+
+        fhandle.seek(0)
+        return fhandle
+
+    def test_extxyz(self):
+        first = molecule('H2O')
+        first.info.update({'name': 'water', 'sets': 'a,b', 'origin': 'g2'})
+        second = molecule('CH4')
+        second.info['name'] = 'methane'
+
+        frames = list(read_frames(io.BytesIO(self.xyz(first, second).encode('utf-8')), 'extxyz'))
+
+        self.assertEqual([num for num, _, _ in frames], [0, 1])
+        self.assertEqual([struct.get_chemical_formula() for _, struct, _ in frames], ['H2O', 'CH4'])
+        self.assertEqual(frames[0][2], {'name': 'water', 'sets': 'a,b'})
+        self.assertEqual(frames[1][2], {'name': 'methane'})
+
+        # only the frame options are removed from the info
+        self.assertNotIn('name', frames[0][1].info)
+        self.assertEqual(frames[0][1].info['origin'], 'g2')
+
+    def test_malformed_frame(self):
+        """the frames up to a malformed one are read, followed by the error"""
+
+        struct = molecule('H2O')
+        struct.info['name'] = 'water'
+        content = self.xyz(struct) + "3\nname=broken\nO 0.0 0.0\n"
+
+        frames = list(read_frames(io.BytesIO(content.encode('utf-8')), 'extxyz'))
+
+        self.assertEqual(len(frames), 2)
+        self.assertEqual(frames[0][2], {'name': 'water'})
+        self.assertEqual(frames[1][0], 1)
+        self.assertIsInstance(frames[1][1], Exception)
+        self.assertEqual(frames[1][2], {})
+
+    def test_undecodable(self):
+        frames = list(read_frames(io.BytesIO(b"\xff\xfe"), 'extxyz'))
+
+        self.assertEqual(len(frames), 1)
+        self.assertIsInstance(frames[0][1], UnicodeDecodeError)
+
+    def test_tar(self):
+        struct = bulk('NaCl', 'rocksalt', a=5.64)
+        geometries = self.archive({
+            'structures/nacl.xyz': self.xyz(struct),
+            'structures/water.txt': self.xyz(molecule('H2O')),
+            'structures/broken.cif': "not a cif",
+            'options.json': json.dumps({'nacl': {'sets': ['salts'], 'name': 'ignored'}}),
+            })
+
+        frames = {options['name']: (num, struct, options)
+                  for num, struct, options in read_frames(geometries, 'tar')}
+
+        self.assertEqual(sorted(frames), ['broken', 'nacl', 'water'])
+        self.assertEqual(sorted(num for num, _, _ in frames.values()), [0, 1, 2])
+
+        # the name is always the one of the file
+        self.assertEqual(frames['nacl'][2], {'name': 'nacl', 'sets': ['salts']})
+        self.assertEqual(frames['nacl'][1].get_chemical_formula(), 'ClNa')
+        self.assertIsInstance(frames['water'][1], ValueError)  # unsupported extension
+
+        # either an exception or an empty structure, depending on the ASE version
+        broken = frames['broken'][1]
+        self.assertTrue(isinstance(broken, Exception) or not len(broken))
+
+    def test_tar_invalid_options(self):
+        geometries = self.archive({'options.json': "{", 'water.xyz': self.xyz(molecule('H2O'))})
+
+        with self.assertRaises(ValueError):
+            list(read_frames(geometries, 'tar'))
+
+    def test_invalid_archive(self):
+        with self.assertRaises(tarfile.TarError):
+            list(read_frames(io.BytesIO(b"not an archive"), 'tar'))
+
+
+if __name__ == '__main__':
+    unittest.main()
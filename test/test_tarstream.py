@@ -0,0 +1,47 @@
+
+import io
+import tarfile
+import unittest
+
+from fatman.tools import tarstream
+
+
+class TestTarStream(unittest.TestCase):
+    """Tests for the streaming tar generator"""
+
+    def setUp(self):
+        self.files = {
+            'calc.inp': b"&GLOBAL\n&END GLOBAL\n",
+            'BASIS_SETS': b"x"*5000,
+            'empty': b"",
+            'sub/' + 'long'*50: b"y"*512,
+            }
+        self.members = [tarstream.TarMember(name, len(content), 1500000000, lambda c=content: io.BytesIO(c))
+                        for name, content in self.files.items()]
+
+    def test_archive(self):
+        data = b''.join(tarstream.generate_tar(self.members, chunk_size=1000))
+
+        self.assertEqual(len(data), tarstream.tar_size(self.members))
+
+        with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+            self.assertEqual(archive.getnames(), list(self.files))
+
+            for name, content in self.files.items():
+                self.assertEqual(archive.extractfile(name).read(), content)
+                self.assertEqual(archive.getmember(name).mtime, 1500000000)
+
+    def test_unknown_size(self):
+        members = [m._replace(size=None) if m.name == 'BASIS_SETS' else m for m in self.members]
+
+        self.assertIsNone(tarstream.tar_size(members))
+
+        # the same archive as with the sizes known in advance
+        data = b''.join(tarstream.generate_tar(members, chunk_size=1000))
+        self.assertEqual(data, b''.join(tarstream.generate_tar(self.members, chunk_size=1000)))
+
+    def test_short_content(self):
+        members = [tarstream.TarMember('short', 10, 0, lambda: io.BytesIO(b"abc"))]
+
+        with self.assertRaises(RuntimeError):
+            b''.join(tarstream.generate_tar(members))